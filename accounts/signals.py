@@ -4,7 +4,7 @@ from django.conf import settings
 from django.template.loader import render_to_string
 import logging
 logger = logging.getLogger(__name__)
-from mailer.utils import send_html_email
+from mailer.utils import send_html_email, send_html_fanout
 from accounts.models import CustomUser
 
 # Cache voor activatiecontrole
@@ -33,14 +33,13 @@ def notify_user_upon_activation(sender, instance, created, **kwargs):
         )
         super_emails = list(CustomUser.objects.filter(is_superuser=True).values_list('email', flat=True))
         if super_emails:
-            for email in super_emails:
-                send_html_email(
-                    subject=f"Account geactiveerd: {instance.initials}",
-                    to=email,
-                    template_name="emails/notify_admin_activated.html",
-                    text_template_name="emails/notify_admin_activated.txt",
-                    context={"user": instance},
-                )
+            send_html_fanout(
+                subject=f"Account geactiveerd: {instance.initials}",
+                template_name="emails/notify_admin_activated.html",
+                text_template_name="emails/notify_admin_activated.txt",
+                context={"user": instance},
+                recipients=[(email, None, {}) for email in super_emails],
+            )
         else:
             logger.warning(
                 "Geen superusers gevonden; admin-notificatie geactiveerd account %r overgeslagen",
@@ -74,14 +73,13 @@ def notify_user_upon_approval(sender, instance, **kwargs):
         )
         super_emails = list(CustomUser.objects.filter(is_superuser=True).values_list('email', flat=True))
         if super_emails:
-            for email in super_emails:
-                send_html_email(
-                    subject=f"Account goedgekeurd: {instance.initials}",
-                    to=email,
-                    template_name="emails/notify_admin_approved.html",
-                    text_template_name="emails/notify_admin_approved.txt",
-                    context={"user": instance},
-                )
+            send_html_fanout(
+                subject=f"Account goedgekeurd: {instance.initials}",
+                template_name="emails/notify_admin_approved.html",
+                text_template_name="emails/notify_admin_approved.txt",
+                context={"user": instance},
+                recipients=[(email, None, {}) for email in super_emails],
+            )
         else:
             logger.warning(
                 "Geen superusers gevonden; admin-notificatie goedgekeurd account %r overgeslagen",
@@ -0,0 +1,241 @@
+"""
+Module: approvals/bulk.py
+Beschrijving: Goedkeuringsverzoeken in bulk: aanvragen voor een reeks
+submissions en één beoordeling (goedkeuren of afwijzen, met één toelichting)
+voor een reeks verzoeken, elk in één transactie.
+
+`bulk_create_requests` maakt versies, verzoeken, groepsgoedkeuringen en
+logregels met bulk_create. Omdat bulk_create geen signalen verstuurt, werkt
+het zelf de taken, tellers en cache bij, en krijgt elke beoordelaar één
+e-mail met alle nieuwe verzoeken in plaats van één per verzoek.
+
+Bij `bulk_review` wordt het lidmaatschap voor alle verzoeken in één keer
+gecontroleerd via de openstaande taken van de gebruiker (ReviewerTask).
+Stemmen, tellers en logregels worden in bulk weggeschreven, net als de
+nieuwe status van verzoeken die daarmee beslist zijn. Wat de signalen bij een
+gewone save doen (e-mail aan de aanvrager, tellers, taken, cache) gebeurt dan
+hier, één keer voor alle beslissingen samen.
+
+`bulk_review` geeft per verzoek een resultaat terug, in de volgorde van de
+invoer: {"pk", "request" (of None), "ok", "message"}.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from instrument_generator import cache
+
+from instruments.models import InstrumentSubmission, InstrumentVersion
+
+from .counters import adjust_pending_count
+from .inbox import close_tasks, sync_reviewer_tasks
+from .models import ApprovalLog, ApprovalRequest, GroupApproval, ReviewerTask
+from .signals import notify_decided_requests, notify_new_requests
+
+# Maximaal aantal verzoeken per bulkbeoordeling of bulkaanvraag
+MAX_BULK_REVIEW = 100
+
+
+def bulk_create_requests(user, submissions, groups, comment=''):
+    """
+    Vraag goedkeuring aan voor alle `submissions` bij de groepen `groups`.
+    Geeft de nieuwe verzoeken terug, in de volgorde van de submissions.
+    """
+    submissions = list(submissions)
+    if not submissions:
+        return []
+    with transaction.atomic():
+        versions = InstrumentVersion.bulk_create_from_submissions(submissions)
+        requests = ApprovalRequest.objects.bulk_create(
+            ApprovalRequest(
+                submission=submission,
+                version=versions[submission.pk],
+                requester=user,
+                status='PENDING',
+                request_comment=comment,
+            )
+            for submission in submissions
+        )
+
+        # De aanvrager is voor alle verzoeken dezelfde, dus één telling per groep
+        groups = list(groups.annotate(eligible=Count('members', filter=~Q(members=user.pk))))
+        RequiredGroup = ApprovalRequest.required_groups.through
+        RequiredGroup.objects.bulk_create(
+            RequiredGroup(approvalrequest_id=request.pk, approvalgroup_id=group.pk)
+            for request in requests
+            for group in groups
+        )
+        group_approvals = GroupApproval.objects.bulk_create(
+            GroupApproval(approval_request=request, group=group, status='PENDING', eligible_count=group.eligible)
+            for request in requests
+            for group in groups
+        )
+        ApprovalLog.objects.bulk_create(
+            ApprovalLog(approval=request, user=user, action='submitted', comment=comment)
+            for request in requests
+        )
+
+        # Wat de signalen bij gewone saves doen
+        adjust_pending_count(len(requests))
+        sync_reviewer_tasks(group_approval.pk for group_approval in group_approvals)
+        cache.invalidate(
+            cache.namespace_for(ApprovalRequest),
+            cache.namespace_for(GroupApproval),
+            *(cache.namespace_for(InstrumentSubmission, submission.pk) for submission in submissions),
+            cache.namespace_for(InstrumentSubmission),
+        )
+        notify_new_requests(requests)
+    return requests
+
+
+def _request_statuses(request_ids):
+    """Status die volgt uit de groepsgoedkeuringen, per verzoek (None als er nog niets besloten is)."""
+    counts = {
+        row['approval_request']: row
+        for row in GroupApproval.objects.filter(approval_request__in=request_ids).values(
+            'approval_request'
+        ).annotate(
+            rejected=Count('pk', filter=Q(status='REJECTED')),
+            approved=Count('pk', filter=Q(status='APPROVED')),
+        ).order_by()
+    }
+    required = dict(
+        ApprovalRequest.required_groups.through.objects.filter(approvalrequest__in=request_ids).values(
+            'approvalrequest'
+        ).annotate(count=Count('pk')).order_by().values_list('approvalrequest', 'count')
+    )
+    return {
+        request_id: ApprovalRequest.status_for_group_counts(
+            counts.get(request_id, {}).get('rejected', 0),
+            counts.get(request_id, {}).get('approved', 0),
+            required.get(request_id, 0),
+        )
+        for request_id in request_ids
+    }
+
+
+def bulk_review(user, request_ids, approve, comment=''):
+    """
+    Keur de verzoeken goed of wijs ze af namens alle groepen waarin `user` nog
+    mag stemmen. Net als bij één verzoek geldt een afwijzing voor één groep.
+    """
+    request_ids = list(dict.fromkeys(request_ids))
+    now = timezone.now()
+    with transaction.atomic():
+        # Vergrendelen in pk-volgorde, zodat gelijktijdige bulkacties elkaar niet blokkeren
+        requests = {
+            approval_request.pk: approval_request
+            for approval_request in ApprovalRequest.objects.select_for_update(of=('self',)).select_related(
+                'submission', 'requester'
+            ).filter(pk__in=request_ids).order_by('pk')
+        }
+        pending_ids = [pk for pk, approval_request in requests.items() if approval_request.status == 'PENDING']
+
+        # Een openstaande taak betekent: lid van de groep, niet de aanvrager en nog niet gestemd
+        votes = defaultdict(list)
+        for request_id, group_approval_id in ReviewerTask.objects.filter(
+            user=user, approval_request__in=pending_ids
+        ).order_by('approval_request', 'group_approval').values_list('approval_request', 'group_approval'):
+            if approve or not votes[request_id]:
+                votes[request_id].append(group_approval_id)
+
+        group_approvals = list(GroupApproval.objects.select_for_update(of=('self',)).select_related(
+            'group'
+        ).filter(
+            pk__in=[pk for pks in votes.values() for pk in pks], status='PENDING'
+        ).order_by('pk'))
+
+        if group_approvals:
+            # Eén insert voor alle stemmen; m2m_changed werkt de taken bij
+            if approve:
+                user.approved_group_approvals.add(*group_approvals)
+            else:
+                user.rejected_group_approvals.add(*group_approvals)
+
+            # De rijen zijn vergrendeld, dus de gelezen tellers zijn actueel
+            counter = 'approved_count' if approve else 'rejected_count'
+            closed = []
+            for group_approval in group_approvals:
+                setattr(group_approval, counter, getattr(group_approval, counter) + 1)
+                group_approval.reviewer = user
+                group_approval.review_comment = comment
+                group_approval.reviewed_at = now
+                status = group_approval.decided_status()
+                if status != group_approval.status:
+                    group_approval.status = status
+                    closed.append(group_approval)
+            GroupApproval.objects.bulk_update(
+                group_approvals, [counter, 'status', 'reviewer', 'review_comment', 'reviewed_at']
+            )
+            # bulk_update verstuurt geen post_save: taken en cache hier zelf bijwerken
+            if closed:
+                close_tasks(group_approval__in=closed)
+            cache.invalidate(
+                *(cache.namespace_for(GroupApproval, group_approval.pk) for group_approval in group_approvals),
+                cache.namespace_for(GroupApproval),
+                *(cache.namespace_for(ApprovalRequest, group_approval.approval_request_id)
+                  for group_approval in group_approvals),
+                cache.namespace_for(ApprovalRequest),
+            )
+
+            action = 'approved' if approve else 'rejected'
+            ApprovalLog.objects.bulk_create(
+                ApprovalLog(
+                    approval_id=group_approval.approval_request_id,
+                    user=user,
+                    action=f'{action}_as_member_of_{group_approval.group.name}',
+                    comment=comment,
+                )
+                for group_approval in group_approvals
+            )
+
+        voted_ids = sorted({group_approval.approval_request_id for group_approval in group_approvals})
+        decided = []
+        for request_id, status in _request_statuses(voted_ids).items():
+            if status:
+                approval_request = requests[request_id]
+                approval_request.status = status
+                approval_request.reviewed_at = now
+                approval_request.updated_at = now
+                decided.append(approval_request)
+        if decided:
+            ApprovalRequest.objects.bulk_update(decided, ['status', 'reviewed_at', 'updated_at'])
+            # Wat de signalen bij gewone saves doen; alle besliste verzoeken waren PENDING
+            adjust_pending_count(-len(decided))
+            for approval_request in decided:
+                approval_request._counted_status = approval_request.status
+            close_tasks(approval_request__in=decided)
+            cache.invalidate(
+                *(cache.namespace_for(ApprovalRequest, approval_request.pk) for approval_request in decided),
+                cache.namespace_for(ApprovalRequest),
+                *(cache.namespace_for(InstrumentSubmission, approval_request.submission_id)
+                  for approval_request in decided),
+                cache.namespace_for(InstrumentSubmission),
+            )
+            notify_decided_requests(decided)
+
+    results = []
+    for pk in request_ids:
+        approval_request = requests.get(pk)
+        if approval_request is None:
+            message = 'Dit verzoek bestaat niet.'
+        elif pk not in pending_ids:
+            message = 'Dit verzoek kan niet meer worden beoordeeld.'
+        elif pk not in voted_ids:
+            message = 'Je kunt dit verzoek niet beoordelen. Mogelijk ben je de aanvrager of heb je al gestemd.'
+        elif approval_request.status == 'APPROVED':
+            message = 'Het verzoek is volledig goedgekeurd.'
+        elif approval_request.status == 'REJECTED':
+            message = 'Het verzoek is afgewezen op basis van jouw beoordeling.'
+        else:
+            message = 'Je goedkeuring is opgeslagen. Er zijn nog andere goedkeuringen nodig.'
+        results.append({
+            'pk': pk,
+            'request': approval_request,
+            'ok': pk in voted_ids,
+            'message': message,
+        })
+    return results
@@ -0,0 +1,84 @@
+"""
+Module: approvals/counters.py
+Beschrijving: Gecachte tellers voor openstaande goedkeuringsverzoeken.
+
+- Globaal: het aantal verzoeken met status PENDING. Dit staat als getal in de
+  gedeelde cache en wordt bij elke statusovergang met incr bijgewerkt (zie
+  approvals/signals.py), pas na de commit: een teruggedraaide transactie laat
+  de teller ongemoeid. Alleen na een cache-miss wordt opnieuw geteld.
+- Per beoordelaar: het aantal verzoeken in de inbox (ReviewerTask), in een
+  cache-namespace per gebruiker. approvals/inbox.py maakt die ongeldig zodra
+  de taken van die gebruiker veranderen.
+
+Met een warme cache kosten de navigatiebalk en de template-tags dus geen
+queries. Bulk-wijzigingen zonder signals (QuerySet.update) kunnen een teller
+laten afwijken; COUNTER_TIMEOUT begrenst hoe lang.
+"""
+
+from functools import partial
+
+from django.core.cache import caches
+from django.db import transaction
+
+from instrument_generator import cache
+
+PENDING_COUNT_KEY = "approvals:pending_count"
+COUNTER_TIMEOUT = 60 * 60
+
+
+def pending_count():
+    """Aantal openstaande verzoeken (alle beoordelaars samen)."""
+    from .models import ApprovalRequest
+
+    shared = caches[cache.SHARED_ALIAS]
+    value = shared.get(PENDING_COUNT_KEY)
+    if value is None:
+        value = ApprovalRequest.objects.filter(status='PENDING').count()
+        # add: een incr van een gelijktijdige statusovergang niet overschrijven
+        shared.add(PENDING_COUNT_KEY, value, COUNTER_TIMEOUT)
+    return value
+
+
+def _incr(delta):
+    try:
+        caches[cache.SHARED_ALIAS].incr(PENDING_COUNT_KEY, delta)
+    except ValueError:
+        # Geen gecachete waarde: de volgende pending_count() telt opnieuw
+        pass
+
+
+def adjust_pending_count(delta):
+    """Verhoog of verlaag de globale teller na de commit van de huidige transactie."""
+    transaction.on_commit(partial(_incr, delta))
+
+
+def reset_pending_count():
+    """Vergeet de globale teller na de commit, bijvoorbeeld als de vorige status onbekend is."""
+    transaction.on_commit(partial(caches[cache.SHARED_ALIAS].delete, PENDING_COUNT_KEY))
+
+
+def inbox_namespace(user_id):
+    """Cache-namespace met de inbox-teller van één gebruiker."""
+    return f"approvals.inbox:{user_id}"
+
+
+def inbox_count(user):
+    """Aantal verzoeken waarop de gebruiker nog kan stemmen."""
+    from .models import ReviewerTask
+
+    return cache.get_or_set(
+        (inbox_namespace(user.pk), cache.namespace_for(ReviewerTask)),
+        "count",
+        lambda: ReviewerTask.objects.filter(user_id=user.pk).values('approval_request').distinct().count(),
+        timeout=COUNTER_TIMEOUT,
+    )
+
+
+def invalidate_inbox_counts(user_ids=None):
+    """Maak de inbox-tellers van de gegeven gebruikers (of van iedereen) ongeldig."""
+    from .models import ReviewerTask
+
+    if user_ids is None:
+        cache.invalidate(cache.namespace_for(ReviewerTask))
+    else:
+        cache.invalidate(*(inbox_namespace(user_id) for user_id in user_ids))
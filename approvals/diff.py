@@ -0,0 +1,192 @@
+"""
+Module: approvals/diff.py
+Beschrijving: Vergelijking van twee versies van een instrument, per regel en
+binnen gewijzigde regels per woord.
+
+Het algoritme is dat van Myers (O((N+M)·D), met D het aantal verschillen):
+voor twee lange moties met een paar wijzigingen is dat vrijwel lineair, waar
+difflib.Differ kwadratisch is. Gemeenschappelijke begin- en eindregels worden
+vooraf afgesplitst. Bij extreem veel verschillen (meer dan MAX_EDIT_DISTANCE)
+wordt het middenstuk als één vervanging getoond in plaats van eindeloos te
+zoeken naar de kleinste diff.
+
+`diff_texts` geeft een lijst hunks:
+- {"tag": "equal", "lines": [regel, ...]}
+- {"tag": "change", "removed": [segmenten, ...], "added": [segmenten, ...]}
+  waarbij elke regel een lijst (soort, tekst)-segmenten is; soort is "equal",
+  "removed" of "added". Tegenover elkaar staande regels krijgen een diff per
+  woord, zodat alleen de gewijzigde woorden gemarkeerd worden.
+
+Versies veranderen niet, dus `version_diff` cachet het resultaat per paar
+versies zonder dat het ooit ongeldig hoeft te worden. De vergeleken teksten
+zijn wel gerenderde previews; de renderer-revisie staat daarom in de sleutel,
+zodat een deploy met andere templates geen oude diff oplevert.
+"""
+
+import re
+
+from instrument_generator import cache
+from instruments.previews import _renderer_revision
+
+# Verhogen bij een wijziging in het formaat of het algoritme
+DIFF_REVISION = 1
+DIFF_NAMESPACE = "approvals.diff"
+
+MAX_EDIT_DISTANCE = 2000
+
+_TOKEN_RE = re.compile(r"\w+|\s+|[^\w\s]", re.UNICODE)
+
+
+def _myers(a, b):
+    """
+    Kortste bewerkingsreeks van a naar b als lijst van ("equal" | "delete" |
+    "insert") stappen, of None als er meer dan MAX_EDIT_DISTANCE nodig zijn.
+    """
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    for d in range(min(n + m, MAX_EDIT_DISTANCE) + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return None
+
+
+def _backtrack(trace, x, y):
+    steps = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            steps.append("equal")
+            x -= 1
+            y -= 1
+        if d > 0:
+            steps.append("insert" if x == prev_x else "delete")
+        x, y = prev_x, prev_y
+    steps.reverse()
+    return steps
+
+
+def opcodes(a, b):
+    """Opcodes (tag, i1, i2, j1, j2) zoals difflib.SequenceMatcher.get_opcodes."""
+    # Regels naar getallen: vergelijken wordt goedkoop, ook voor lange regels
+    ids = {}
+    a = [ids.setdefault(item, len(ids)) for item in a]
+    b = [ids.setdefault(item, len(ids)) for item in b]
+
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < len(a) - prefix and suffix < len(b) - prefix
+           and a[-1 - suffix] == b[-1 - suffix]):
+        suffix += 1
+    middle_a = a[prefix:len(a) - suffix]
+    middle_b = b[prefix:len(b) - suffix]
+
+    steps = _myers(middle_a, middle_b)
+    if steps is None:
+        steps = ["delete"] * len(middle_a) + ["insert"] * len(middle_b)
+    steps = ["equal"] * prefix + steps + ["equal"] * suffix
+
+    codes = []
+    i = j = 0
+    index = 0
+    while index < len(steps):
+        i1, j1 = i, j
+        if steps[index] == "equal":
+            while index < len(steps) and steps[index] == "equal":
+                i += 1
+                j += 1
+                index += 1
+            codes.append(("equal", i1, i, j1, j))
+            continue
+        while index < len(steps) and steps[index] != "equal":
+            if steps[index] == "delete":
+                i += 1
+            else:
+                j += 1
+            index += 1
+        tag = "replace" if i > i1 and j > j1 else ("delete" if i > i1 else "insert")
+        codes.append((tag, i1, i, j1, j))
+    return codes
+
+
+def _segments(parts):
+    """Voeg opeenvolgende stukken van dezelfde soort samen."""
+    merged = []
+    for kind, text in parts:
+        if not text:
+            continue
+        if merged and merged[-1][0] == kind:
+            merged[-1] = (kind, merged[-1][1] + text)
+        else:
+            merged.append((kind, text))
+    return merged
+
+
+def word_diff(old, new):
+    """Diff per woord van twee regels: (segmenten oud, segmenten nieuw)."""
+    old_tokens = _TOKEN_RE.findall(old)
+    new_tokens = _TOKEN_RE.findall(new)
+    old_parts, new_parts = [], []
+    for tag, i1, i2, j1, j2 in opcodes(old_tokens, new_tokens):
+        old_text = "".join(old_tokens[i1:i2])
+        new_text = "".join(new_tokens[j1:j2])
+        if tag == "equal":
+            old_parts.append(("equal", old_text))
+            new_parts.append(("equal", new_text))
+        else:
+            old_parts.append(("removed", old_text))
+            new_parts.append(("added", new_text))
+    return _segments(old_parts), _segments(new_parts)
+
+
+def diff_texts(old, new):
+    """Vergelijk twee teksten per regel en binnen gewijzigde regels per woord."""
+    old_lines = old.splitlines() if old else []
+    new_lines = new.splitlines() if new else []
+    hunks = []
+    for tag, i1, i2, j1, j2 in opcodes(old_lines, new_lines):
+        if tag == "equal":
+            hunks.append({"tag": "equal", "lines": old_lines[i1:i2]})
+            continue
+        removed_lines = old_lines[i1:i2]
+        added_lines = new_lines[j1:j2]
+        removed, added = [], []
+        # Tegenover elkaar staande regels per woord; de rest geheel
+        for old_line, new_line in zip(removed_lines, added_lines):
+            old_segments, new_segments = word_diff(old_line, new_line)
+            removed.append(old_segments)
+            added.append(new_segments)
+        paired = min(len(removed_lines), len(added_lines))
+        removed.extend(_segments([("removed", line)]) or [("removed", "")] for line in removed_lines[paired:])
+        added.extend(_segments([("added", line)]) or [("added", "")] for line in added_lines[paired:])
+        hunks.append({"tag": "change", "removed": removed, "added": added})
+    return hunks
+
+
+def version_diff(old_version, new_version, old_text, new_text):
+    """Gecachte diff_texts voor een paar (onveranderlijke) versies."""
+    return cache.get_or_set(
+        DIFF_NAMESPACE,
+        f"{DIFF_REVISION}:{_renderer_revision()}:{old_version.pk}:{new_version.pk}",
+        lambda: diff_texts(old_text, new_text),
+    )
@@ -1,4 +1,6 @@
 from django import forms
+from instruments.models import InstrumentSubmission
+from .bulk import MAX_BULK_REVIEW
 from .models import ApprovalRequest, ApprovalLog, ApprovalGroup
 from django.utils.translation import gettext_lazy as _
 
@@ -73,4 +75,83 @@ class ReviewForm(forms.Form):
         required=False,
         label=_('Opmerkingen'),
         help_text=_('Optionele opmerkingen bij de beoordeling (verplicht bij afwijzing)')
-    )
\ No newline at end of file
+    )
+
+class RequestIdsField(forms.MultipleChoiceField):
+    """Lijst van verzoek-pk's; of een verzoek bestaat en beoordeeld mag worden, volgt per verzoek."""
+
+    def to_python(self, value):
+        try:
+            return [int(pk) for pk in super().to_python(value)]
+        except (TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_list'], code='invalid_list')
+
+    def valid_value(self, value):
+        return True
+
+
+class BulkReviewForm(ReviewForm):
+    """Eén beoordeling voor meerdere verzoeken (zie approvals/bulk.py)"""
+    requests = RequestIdsField(
+        label=_('Verzoeken'),
+        error_messages={'required': _('Selecteer ten minste één verzoek.')}
+    )
+    decision = forms.ChoiceField(
+        choices=[('approve', _('Goedkeuren')), ('reject', _('Afwijzen'))],
+        label=_('Beslissing')
+    )
+
+    def clean_requests(self):
+        requests = self.cleaned_data['requests']
+        if len(requests) > MAX_BULK_REVIEW:
+            raise forms.ValidationError(
+                _('Selecteer maximaal %(max)d verzoeken tegelijk.'), params={'max': MAX_BULK_REVIEW}
+            )
+        return requests
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('decision') == 'reject' and not cleaned_data.get('comment'):
+            raise forms.ValidationError(_('Een toelichting is verplicht bij het afwijzen van een verzoek.'))
+        return cleaned_data
+
+
+class BulkApprovalRequestForm(forms.Form):
+    """Goedkeuring aanvragen voor meerdere submissions tegelijk (zie approvals/bulk.py)"""
+    submissions = forms.ModelMultipleChoiceField(
+        queryset=InstrumentSubmission.objects.none(),
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input me-3'}),
+        label=_('Indieningen'),
+        help_text=_('Indieningen met een openstaand verzoek staan niet in de lijst')
+    )
+    required_groups = forms.ModelMultipleChoiceField(
+        queryset=ApprovalGroup.objects.all(),
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input me-3'}),
+        label=_('Goedkeuringsgroepen'),
+        help_text=_('Selecteer welke groepen deze verzoeken moeten goedkeuren'),
+        error_messages={'required': _('Selecteer ten minste één goedkeuringsgroep.')}
+    )
+    request_comment = forms.CharField(
+        widget=forms.Textarea(attrs={
+            'rows': 4,
+            'class': 'form-control',
+            'placeholder': 'Optionele toelichting bij deze goedkeuringsverzoeken'
+        }),
+        required=False,
+        label=_('Toelichting')
+    )
+
+    def __init__(self, *args, user, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Eigen indieningen zonder openstaand verzoek
+        self.fields['submissions'].queryset = InstrumentSubmission.objects.filter(owner=user).exclude(
+            approval_requests__status='PENDING'
+        ).order_by('-updated_at', '-pk')
+
+    def clean_submissions(self):
+        submissions = self.cleaned_data['submissions']
+        if len(submissions) > MAX_BULK_REVIEW:
+            raise forms.ValidationError(
+                _('Selecteer maximaal %(max)d indieningen tegelijk.'), params={'max': MAX_BULK_REVIEW}
+            )
+        return submissions
@@ -0,0 +1,113 @@
+"""
+Module: approvals/inbox.py
+Beschrijving: Onderhoud van de ReviewerTask-tabel (de inbox van beoordelaars).
+
+Een ReviewerTask bestaat voor elke combinatie van gebruiker en openstaande
+groepsgoedkeuring waarop die gebruiker nog mag stemmen. `sync_reviewer_tasks`
+herberekent de taken van een set groepsgoedkeuringen in een vast aantal
+queries, ongeacht het aantal groepen of leden; approvals/signals.py roept het
+aan na stemmen, statuswijzigingen en wijzigingen in groepslidmaatschap.
+`rebuild_reviewer_tasks` bouwt de hele tabel opnieuw op, bijvoorbeeld na een
+bulk-import die geen signals verstuurt.
+
+Alle wijzigingen aan de tabel lopen via deze module, zodat ook de gecachete
+inbox-tellers van de betrokken gebruikers ongeldig worden (approvals/counters.py).
+"""
+
+from django.db import transaction
+
+# Taken per insert. Drie kolommen per taak blijft binnen de 999 parameters
+# die SQLite per query toestaat, zodat elke database precies één insert per
+# BATCH_SIZE taken doet
+BATCH_SIZE = 300
+
+
+def desired_tasks(GroupApproval, ids=None):
+    """
+    Bepaal de taken die zouden moeten bestaan, als set van
+    (user_id, group_approval_id, approval_request_id). Migratie 0008 heeft een
+    eigen, bevroren kopie.
+    """
+    group_approvals = GroupApproval.objects.filter(status='PENDING', approval_request__status='PENDING')
+    if ids is not None:
+        group_approvals = group_approvals.filter(pk__in=ids)
+
+    candidates = group_approvals.filter(group__members__isnull=False).values_list(
+        'group__members', 'pk', 'approval_request_id', 'approval_request__requester_id'
+    )
+    voted = set(
+        group_approvals.filter(approved_members__isnull=False).values_list('approved_members', 'pk').union(
+            group_approvals.filter(rejected_members__isnull=False).values_list('rejected_members', 'pk')
+        )
+    )
+    return {
+        (user_id, group_approval_id, request_id)
+        for user_id, group_approval_id, request_id, requester_id in candidates
+        if user_id != requester_id and (user_id, group_approval_id) not in voted
+    }
+
+
+def sync_reviewer_tasks(group_approval_ids):
+    """Breng de taken van de gegeven groepsgoedkeuringen in overeenstemming met de stemstand."""
+    from .counters import invalidate_inbox_counts
+    from .models import GroupApproval, ReviewerTask
+
+    group_approval_ids = set(group_approval_ids)
+    if not group_approval_ids:
+        return
+    desired = desired_tasks(GroupApproval, group_approval_ids)
+    existing = {
+        (user_id, group_approval_id): pk
+        for pk, user_id, group_approval_id in ReviewerTask.objects.filter(
+            group_approval_id__in=group_approval_ids
+        ).values_list('pk', 'user_id', 'group_approval_id')
+    }
+    wanted = {(user_id, group_approval_id) for user_id, group_approval_id, _request_id in desired}
+
+    # Geen eigen transactie nodig: verwijderen en toevoegen zijn idempotent
+    stale = {key: pk for key, pk in existing.items() if key not in wanted}
+    if stale:
+        ReviewerTask.objects.filter(pk__in=stale.values()).delete()
+    missing = [
+        ReviewerTask(user_id=user_id, group_approval_id=group_approval_id, approval_request_id=request_id)
+        for user_id, group_approval_id, request_id in desired
+        if (user_id, group_approval_id) not in existing
+    ]
+    if missing:
+        # Een gelijktijdige sync kan dezelfde taak al hebben aangemaakt
+        ReviewerTask.objects.bulk_create(missing, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    if stale or missing:
+        invalidate_inbox_counts(
+            {user_id for user_id, _group_approval_id in stale} | {task.user_id for task in missing}
+        )
+
+
+def close_tasks(**filters):
+    """Verwijder de taken die aan `filters` voldoen, bijvoorbeeld van een afgerond verzoek."""
+    from .counters import invalidate_inbox_counts
+    from .models import ReviewerTask
+
+    tasks = ReviewerTask.objects.filter(**filters)
+    user_ids = set(tasks.values_list('user_id', flat=True))
+    if user_ids:
+        tasks.delete()
+        invalidate_inbox_counts(user_ids)
+
+
+def rebuild_reviewer_tasks():
+    """Bouw alle taken opnieuw op. Geeft het aantal taken terug."""
+    from .counters import invalidate_inbox_counts
+    from .models import GroupApproval, ReviewerTask
+
+    tasks = sorted(desired_tasks(GroupApproval))
+    with transaction.atomic():
+        ReviewerTask.objects.all().delete()
+        ReviewerTask.objects.bulk_create(
+            (
+                ReviewerTask(user_id=user_id, group_approval_id=group_approval_id, approval_request_id=request_id)
+                for user_id, group_approval_id, request_id in tasks
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    invalidate_inbox_counts()
+    return len(tasks)
@@ -0,0 +1,284 @@
+"""
+Management command die gelijktijdig stemmen in de goedkeuringsflow meet.
+
+Maakt goedkeuringsgroepen van een instelbare grootte en een aantal verzoeken
+aan, en laat daarna alle groepsleden tegelijk (vanuit meerdere threads)
+stemmen via ApproveRequestView en RejectRequestView. Rapporteert de latentie
+(percentielen), het aantal queries per stem, fouten, en elke inconsistentie
+tussen de tellers en statussen van GroupApproval en ApprovalRequest.
+
+Alle benchmarkdata (gebruikers, groepen, indieningen) wordt na afloop
+verwijderd, tenzij --keep is opgegeven. Tijdens de run wordt geen e-mail in
+de outbox gezet (zie mailer/outbox.py), dus echte beoordelaars krijgen niets.
+
+Let op: SQLite kent geen rijvergrendeling en laat maar één schrijver tegelijk
+toe. Met meerdere threads eindigen stemmen daar vaak in "database is locked"
+(die als fout gerapporteerd worden); gebruik op SQLite --threads 1 en meet
+echte gelijktijdigheid op PostgreSQL.
+
+Gebruik:
+python manage.py benchmark_voting [--group-size 20] [--groups 2] [--requests 5]
+                                  [--threads 8] [--reject-rate 0.0] [--seed 1] [--keep]
+"""
+
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from approvals import is_enabled
+from approvals.bulk import bulk_create_requests
+from approvals.models import ApprovalGroup, ApprovalRequest, GroupApproval, ReviewerTask
+from approvals.views import ApproveRequestView, RejectRequestView
+from instruments.models import InstrumentSubmission
+from mailer import outbox
+
+User = get_user_model()
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, p):
+    """Percentiel volgens de nearest-rank-methode van een gesorteerde lijst."""
+    if not values:
+        return None
+    rank = max(int(round(p / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def find_inconsistencies(request_ids):
+    """
+    Vergelijk tellers, stemmen, statussen en openstaande taken van de verzoeken.
+    Geeft een lijst met beschrijvingen (leeg als alles klopt).
+    """
+    problems = []
+    group_approvals = GroupApproval.objects.filter(approval_request__in=request_ids).annotate(
+        approvals=Count('approved_members', distinct=True),
+        rejections=Count('rejected_members', distinct=True),
+        open_tasks=Count('reviewer_tasks', distinct=True),
+    ).order_by('pk')
+    by_request = {}
+    for ga in group_approvals:
+        by_request.setdefault(ga.approval_request_id, []).append(ga)
+        label = f"groepsgoedkeuring {ga.pk} (verzoek {ga.approval_request_id})"
+        if (ga.approved_count, ga.rejected_count) != (ga.approvals, ga.rejections):
+            problems.append(
+                f"{label}: tellers {ga.approved_count}/{ga.rejected_count}, "
+                f"stemmen {ga.approvals}/{ga.rejections}"
+            )
+        if ga.rejected_count:
+            expected = 'REJECTED'
+        elif ga.check_all_members_approved():
+            expected = 'APPROVED'
+        else:
+            expected = 'PENDING'
+        if ga.status != expected:
+            problems.append(f"{label}: status {ga.status}, volgens de tellers {expected}")
+        if ga.status != 'PENDING' and ga.open_tasks:
+            problems.append(f"{label}: {ga.open_tasks} open taken na beslissing {ga.status}")
+
+    required = dict(
+        ApprovalRequest.objects.filter(pk__in=request_ids).annotate(
+            required=Count('required_groups')
+        ).values_list('pk', 'required')
+    )
+    for approval_request in ApprovalRequest.objects.filter(pk__in=request_ids).order_by('pk'):
+        gas = by_request.get(approval_request.pk, [])
+        expected = ApprovalRequest.status_for_group_counts(
+            sum(ga.status == 'REJECTED' for ga in gas),
+            sum(ga.status == 'APPROVED' for ga in gas),
+            required.get(approval_request.pk, 0),
+        ) or 'PENDING'
+        if approval_request.status != expected:
+            problems.append(
+                f"verzoek {approval_request.pk}: status {approval_request.status}, "
+                f"volgens de groepen {expected}"
+            )
+    stray = ReviewerTask.objects.filter(approval_request__in=request_ids).exclude(
+        approval_request__status='PENDING'
+    ).count()
+    if stray:
+        problems.append(f"{stray} open taken bij afgeronde verzoeken")
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Meet gelijktijdig stemmen via ApproveRequestView/RejectRequestView en controleert de consistentie."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--group-size", type=int, default=20, help="Aantal leden per groep (default 20).")
+        parser.add_argument("--groups", type=int, default=2, help="Aantal vereiste groepen per verzoek (default 2).")
+        parser.add_argument("--requests", type=int, default=5, help="Aantal verzoeken (default 5).")
+        parser.add_argument("--threads", type=int, default=8, help="Aantal gelijktijdige stemmers (default 8).")
+        parser.add_argument(
+            "--reject-rate", type=float, default=0.0,
+            help="Kans dat een stem een afwijzing is (default 0.0).",
+        )
+        parser.add_argument("--seed", type=int, default=1, help="Seed voor de volgorde van de stemmen.")
+        parser.add_argument("--keep", action="store_true", help="Benchmarkdata na afloop niet verwijderen.")
+
+    def handle(self, *args, **options):
+        for name in ("group_size", "groups", "requests", "threads"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} moet minstens 1 zijn.")
+        if not 0 <= options["reject_rate"] <= 1:
+            raise CommandError("--reject-rate moet tussen 0 en 1 liggen.")
+        if not is_enabled():
+            raise CommandError("De goedkeuringsfunctionaliteit is uitgeschakeld.")
+
+        run = uuid.uuid4().hex[:8]
+        # Geen e-mail naar echte beoordelaars
+        with outbox.suppressed():
+            requester, members, groups, requests = self.setup(run, options)
+            try:
+                votes = self.plan_votes(members, groups, requests, options)
+                results, elapsed = self.vote(votes, options["threads"])
+                self.report(results, elapsed, options)
+                problems = find_inconsistencies([request.pk for request in requests])
+                self.report_consistency(problems)
+            finally:
+                if not options["keep"]:
+                    self.cleanup(requester, members, groups)
+
+    def setup(self, run, options):
+        """Gebruikers, groepen, indieningen en verzoeken voor deze run."""
+        size, group_count = options["group_size"], options["groups"]
+        requester = User.objects.create(
+            email=f"bench-{run}-requester@example.com", initials="B.", last_name="Aanvrager",
+            is_active=True, is_approved=True,
+        )
+        # Elke groep eigen leden, zodat elke stem precies één groepsgoedkeuring raakt
+        members = User.objects.bulk_create(
+            User(
+                email=f"bench-{run}-{i}@example.com", initials="B.", last_name=f"Lid {i}",
+                is_active=True, is_approved=True,
+            )
+            for i in range(size * group_count)
+        )
+        Group.objects.get(name="Reviewers").user_set.add(*members)
+        groups = ApprovalGroup.objects.bulk_create(
+            ApprovalGroup(name=f"Benchmark {run} {i}") for i in range(group_count)
+        )
+        for i, group in enumerate(groups):
+            group.members.add(*members[i * size:(i + 1) * size])
+
+        submissions = InstrumentSubmission.objects.bulk_create(
+            InstrumentSubmission(owner=requester, instrument="Motie", subject=f"Benchmark {run} {i}",
+                                 date=date.today())
+            for i in range(options["requests"])
+        )
+        requests = bulk_create_requests(
+            requester,
+            InstrumentSubmission.objects.filter(pk__in=[s.pk for s in submissions]).order_by('pk')
+            .prefetch_related('submitters'),
+            ApprovalGroup.objects.filter(pk__in=[g.pk for g in groups]),
+        )
+        self.stdout.write(
+            f"Run {run}: {len(requests)} verzoeken, {group_count} groepen van {size} leden, "
+            f"{options['threads']} threads."
+        )
+        return requester, members, groups, requests
+
+    def plan_votes(self, members, groups, requests, options):
+        """Alle stemmen (gebruiker, verzoek, goedkeuren?) in willekeurige volgorde."""
+        rng = random.Random(options["seed"])
+        votes = [
+            (member, request.pk, rng.random() >= options["reject_rate"])
+            for request in requests
+            for member in members
+        ]
+        rng.shuffle(votes)
+        return votes
+
+    def cast(self, factory, user, request_pk, approve):
+        """Eén stem via de view; geeft (seconden, queries, statuscode of foutmelding)."""
+        view = ApproveRequestView.as_view() if approve else RejectRequestView.as_view()
+        comment = "Akkoord" if approve else "Niet akkoord"
+        url = reverse("approvals:approve_request" if approve else "approvals:reject_request", args=[request_pk])
+        request = factory.post(url, {"comment": comment})
+        request.user = user
+        request._messages = CookieStorage(request)
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            try:
+                response = view(request, pk=request_pk)
+                outcome = response.status_code
+            except Exception as exc:  # noqa: BLE001 - elke fout telt mee in het rapport
+                outcome = f"{type(exc).__name__}: {exc}"
+            seconds = time.perf_counter() - start
+        return seconds, len(ctx.captured_queries), outcome
+
+    def vote(self, votes, threads):
+        factory = RequestFactory()
+        results = []
+        lock = threading.Lock()
+        pending = queue.Queue()
+        for vote in votes:
+            pending.put(vote)
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        user, request_pk, approve = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    result = self.cast(factory, user, request_pk, approve)
+                    with lock:
+                        results.append(result)
+            finally:
+                # Elke thread heeft een eigen databaseverbinding
+                if threading.current_thread() is not threading.main_thread():
+                    connection.close()
+
+        start = time.perf_counter()
+        if threads == 1:
+            worker()
+        else:
+            pool = [threading.Thread(target=worker) for _ in range(threads)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+        return results, time.perf_counter() - start
+
+    def report(self, results, elapsed, options):
+        latencies = sorted(seconds * 1000 for seconds, _queries, _outcome in results)
+        queries = sorted(count for _seconds, count, _outcome in results)
+        errors = [outcome for _seconds, _queries, outcome in results if not isinstance(outcome, int)]
+
+        self.stdout.write(f"{len(results)} stemmen in {elapsed:.2f} s ({len(results) / elapsed:.1f} per seconde)")
+        if latencies:
+            parts = ", ".join(f"p{p} {percentile(latencies, p):.1f}" for p in PERCENTILES)
+            self.stdout.write(f"Latentie (ms): {parts}, max {latencies[-1]:.1f}")
+            self.stdout.write(
+                f"Queries per stem: gemiddeld {sum(queries) / len(queries):.1f}, "
+                f"p50 {percentile(queries, 50)}, max {queries[-1]}"
+            )
+        if errors:
+            self.stdout.write(self.style.ERROR(f"{len(errors)} fouten, bijvoorbeeld: {errors[0]}"))
+
+    def report_consistency(self, problems):
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("Geen inconsistenties tussen groepsgoedkeuringen en verzoeken."))
+            return
+        self.stdout.write(self.style.ERROR(f"{len(problems)} inconsistenties:"))
+        for problem in problems:
+            self.stdout.write(f"  - {problem}")
+
+    def cleanup(self, requester, members, groups):
+        # De indieningen (en daarmee verzoeken en versies) gaan mee met de aanvrager
+        ApprovalGroup.objects.filter(pk__in=[group.pk for group in groups]).delete()
+        User.objects.filter(Q(pk=requester.pk) | Q(pk__in=[member.pk for member in members])).delete()
@@ -0,0 +1,19 @@
+"""
+Management command om de inbox van beoordelaars (ReviewerTask) opnieuw op te
+bouwen, bijvoorbeeld na een bulk-import die geen signals verstuurt.
+
+Gebruik:
+python manage.py rebuild_reviewer_tasks
+"""
+
+from django.core.management.base import BaseCommand
+
+from approvals.inbox import rebuild_reviewer_tasks
+
+
+class Command(BaseCommand):
+    help = "Bouwt de openstaande beoordelingen (ReviewerTask) opnieuw op."
+
+    def handle(self, *args, **options):
+        count = rebuild_reviewer_tasks()
+        self.stdout.write(self.style.SUCCESS(f"{count} openstaande beoordelingen opgebouwd."))
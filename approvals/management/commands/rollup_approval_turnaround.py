@@ -0,0 +1,28 @@
+"""
+Management command om de dagelijkse rollups van doorlooptijden van
+groepsbeoordelingen bij te werken (zie approvals/rollups.py). Bedoeld om
+periodiek te draaien, bijvoorbeeld elk uur via cron; zonder --full worden
+alleen de laatst bijgewerkte dag en de dagen daarna herberekend.
+
+Gebruik:
+python manage.py rollup_approval_turnaround [--full]
+"""
+
+from django.core.management.base import BaseCommand
+
+from approvals.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Werkt de dagelijkse rollups van doorlooptijden van groepsbeoordelingen bij."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Alle rollups opnieuw berekenen in plaats van alleen de laatste dagen.",
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_rollups(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(f"{count} rollup-rijen bijgewerkt."))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 15:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('approvals', '0006_groupapproval_approved_members_and_more'),
+        ('instruments', '0004_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approvallog',
+            index=models.Index(fields=['approval', '-timestamp'], name='approvallog_approval_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approvalrequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-created_at', '-id'], name='approval_pending_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approvalrequest',
+            index=models.Index(fields=['submission', 'status', 'created_at'], name='approval_submission_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupapproval',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['group', 'approval_request'], name='groupapproval_pending_idx'),
+        ),
+    ]
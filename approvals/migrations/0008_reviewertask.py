@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-19 16:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Drie kolommen per taak: binnen de 999 parameters van SQLite
+BATCH_SIZE = 300
+
+
+def desired_tasks(GroupApproval, using):
+    # Bevroren kopie uit approvals/inbox.py (stand van deze migratie)
+    group_approvals = GroupApproval.objects.using(using).filter(
+        status='PENDING', approval_request__status='PENDING'
+    )
+    candidates = group_approvals.filter(group__members__isnull=False).values_list(
+        'group__members', 'pk', 'approval_request_id', 'approval_request__requester_id'
+    )
+    voted = set(
+        group_approvals.filter(approved_members__isnull=False).values_list('approved_members', 'pk').union(
+            group_approvals.filter(rejected_members__isnull=False).values_list('rejected_members', 'pk')
+        )
+    )
+    return {
+        (user_id, group_approval_id, request_id)
+        for user_id, group_approval_id, request_id, requester_id in candidates
+        if user_id != requester_id and (user_id, group_approval_id) not in voted
+    }
+
+
+def build_tasks(apps, schema_editor):
+    GroupApproval = apps.get_model('approvals', 'GroupApproval')
+    ReviewerTask = apps.get_model('approvals', 'ReviewerTask')
+    alias = schema_editor.connection.alias
+    ReviewerTask.objects.using(alias).bulk_create(
+        (
+            ReviewerTask(user_id=user_id, group_approval_id=group_approval_id, approval_request_id=request_id)
+            for user_id, group_approval_id, request_id in sorted(desired_tasks(GroupApproval, alias))
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('approvals', '0007_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewerTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('approval_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviewer_tasks', to='approvals.approvalrequest')),
+                ('group_approval', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviewer_tasks', to='approvals.groupapproval')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviewer_tasks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Openstaande beoordeling',
+                'verbose_name_plural': 'Openstaande beoordelingen',
+                'indexes': [models.Index(fields=['user', 'approval_request'], name='reviewertask_inbox_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'group_approval'), name='reviewertask_unique')],
+            },
+        ),
+        migrations.RunPython(build_tasks, migrations.RunPython.noop),
+    ]
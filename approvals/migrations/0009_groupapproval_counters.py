@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-19 16:28
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+BATCH_SIZE = 1000
+
+
+def fill_counters(apps, schema_editor):
+    GroupApproval = apps.get_model('approvals', 'GroupApproval')
+    alias = schema_editor.connection.alias
+    group_approvals = GroupApproval.objects.using(alias).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(group_approvals.filter(pk__gt=last_pk).annotate(
+            members_without_requester=Count(
+                'group__members', filter=~Q(group__members=F('approval_request__requester')), distinct=True,
+            ),
+            approvals=Count('approved_members', distinct=True),
+            rejections=Count('rejected_members', distinct=True),
+        )[:BATCH_SIZE])
+        if not batch:
+            break
+        for group_approval in batch:
+            group_approval.eligible_count = group_approval.members_without_requester
+            group_approval.approved_count = group_approval.approvals
+            group_approval.rejected_count = group_approval.rejections
+        GroupApproval.objects.using(alias).bulk_update(
+            batch, ['eligible_count', 'approved_count', 'rejected_count']
+        )
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('approvals', '0008_reviewertask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupapproval',
+            name='approved_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Goedkeuringen'),
+        ),
+        migrations.AddField(
+            model_name='groupapproval',
+            name='eligible_count',
+            field=models.PositiveIntegerField(default=0, help_text='Leden van de groep behalve de aanvrager', verbose_name='Stemgerechtigde leden'),
+        ),
+        migrations.AddField(
+            model_name='groupapproval',
+            name='rejected_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Afwijzingen'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
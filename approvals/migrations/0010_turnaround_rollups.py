@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-19 16:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('approvals', '0009_groupapproval_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalTurnaroundRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dag')),
+                ('instrument', models.CharField(max_length=50, verbose_name='Instrument')),
+                ('decisions', models.PositiveIntegerField(default=0, verbose_name='Beslissingen')),
+                ('approved', models.PositiveIntegerField(default=0, verbose_name='Goedgekeurd')),
+                ('rejected', models.PositiveIntegerField(default=0, verbose_name='Afgewezen')),
+                ('total_seconds', models.FloatField(default=0, verbose_name='Totale doorlooptijd (s)')),
+                ('histogram', models.JSONField(default=list, verbose_name='Histogram')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Doorlooptijd per dag',
+                'verbose_name_plural': 'Doorlooptijden per dag',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='groupapproval',
+            index=models.Index(condition=models.Q(('status', 'PENDING'), _negated=True), fields=['reviewed_at'], name='groupapproval_decided_idx'),
+        ),
+        migrations.AddField(
+            model_name='approvalturnaroundrollup',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='turnaround_rollups', to='approvals.approvalgroup', verbose_name='Groep'),
+        ),
+        migrations.AddConstraint(
+            model_name='approvalturnaroundrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'group', 'instrument'), name='turnaroundrollup_unique'),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q
 from django.conf import settings
 from instruments.models import InstrumentSubmission, InstrumentVersion
 from django.utils.translation import gettext_lazy as _
@@ -71,6 +72,16 @@ class ApprovalRequest(models.Model):
     class Meta:
         ordering = ['-created_at']
         get_latest_by = 'created_at'
+        indexes = [
+            # Alleen openstaande verzoeken; het dashboard vraagt vrijwel altijd hierom
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(status='PENDING'),
+                name='approval_pending_created_idx',
+            ),
+            # Eerdere afwijzingen en beoordeelde aanvragen per submission
+            models.Index(fields=['submission', 'status', 'created_at'], name='approval_submission_status_idx'),
+        ]
         verbose_name = _('Goedkeuringsverzoek')
         verbose_name_plural = _('Goedkeuringsverzoeken')
 
@@ -83,47 +94,51 @@ class ApprovalRequest(models.Model):
             self.version = InstrumentVersion.create_from_submission(self.submission)
         super().save(*args, **kwargs)
     
-    def update_status_based_on_group_approvals(self):
-        """Update de status op basis van de ontvangen groepsgoedkeuringen"""
-        group_approvals = self.group_approvals.all()
-        
+    @staticmethod
+    def status_for_group_counts(rejected, approved, required):
+        """
+        Status die volgt uit het aantal afgewezen en goedgekeurde groepen en
+        het aantal vereiste groepen, of None zolang er niets besloten is.
+        """
         # Als er minstens één afwijzing is, wordt het verzoek afgewezen
-        if group_approvals.filter(status='REJECTED').exists():
-            self.status = 'REJECTED'
-            self.reviewed_at = timezone.now()
-            self.save()
-            return
-        
-        # Controleer of alle vereiste groepen hebben goedgekeurd
-        required_groups_count = self.required_groups.count()
-        approved_groups_count = group_approvals.filter(status='APPROVED').count()
-        
+        if rejected:
+            return 'REJECTED'
         # Goedkeuring alleen als alle vereiste groepen volledig hebben goedgekeurd
-        if approved_groups_count >= required_groups_count and required_groups_count > 0:
-            self.status = 'APPROVED'
+        if approved >= required and required > 0:
+            return 'APPROVED'
+        return None
+
+    def update_status_based_on_group_approvals(self):
+        """Update de status op basis van de ontvangen groepsgoedkeuringen"""
+        counts = self.group_approvals.aggregate(
+            rejected=Count('pk', filter=Q(status='REJECTED')),
+            approved=Count('pk', filter=Q(status='APPROVED')),
+        )
+        # Bij een afwijzing is het aantal vereiste groepen niet meer nodig
+        required = 0 if counts['rejected'] else self.required_groups.count()
+        status = self.status_for_group_counts(counts['rejected'], counts['approved'], required)
+        if status:
+            self.status = status
             self.reviewed_at = timezone.now()
             self.save()
     
     def initialize_group_approvals(self):
         """Maak GroupApproval objecten aan voor alle vereiste groepen"""
-        for group in self.required_groups.all():
+        groups = self.required_groups.annotate(
+            eligible=Count('members', filter=~Q(members=self.requester_id))
+        )
+        for group in groups:
             GroupApproval.objects.get_or_create(
                 approval_request=self,
                 group=group,
-                defaults={'status': 'PENDING'}
+                defaults={'status': 'PENDING', 'eligible_count': group.eligible}
             )
     
     def can_user_review(self, user):
         """Controleer of een gebruiker dit verzoek mag beoordelen"""
-        # Aanvrager mag niet zijn eigen verzoek beoordelen
-        if self.requester == user:
-            return False
-        
-        # Controleer of de gebruiker lid is van een vereiste groep die nog niet heeft gestemd
-        pending_groups = self.group_approvals.filter(status='PENDING').values_list('group', flat=True)
-        user_groups = user.approval_groups.filter(pk__in=pending_groups)
-        
-        return user_groups.exists()
+        # Een openstaande taak betekent: lid van een groep die nog moet stemmen,
+        # niet de aanvrager en nog niet gestemd (zie ReviewerTask)
+        return self.reviewer_tasks.filter(user_id=user.pk).exists()
 
 class GroupApproval(models.Model):
     """Model voor goedkeuringen door groepen voor één aanvraag"""
@@ -184,9 +199,32 @@ class GroupApproval(models.Model):
         verbose_name=_('Leden die hebben afgewezen'),
         blank=True
     )
+
+    # Tellers, alleen bijgewerkt onder een rijvergrendeling (zie cast_vote)
+    eligible_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Stemgerechtigde leden'),
+        help_text=_('Leden van de groep behalve de aanvrager')
+    )
+    approved_count = models.PositiveIntegerField(default=0, verbose_name=_('Goedkeuringen'))
+    rejected_count = models.PositiveIntegerField(default=0, verbose_name=_('Afwijzingen'))
     
     class Meta:
         unique_together = ('approval_request', 'group')
+        indexes = [
+            # Openstaande groepsbeoordelingen per groep (inbox van een beoordelaar)
+            models.Index(
+                fields=['group', 'approval_request'],
+                condition=models.Q(status='PENDING'),
+                name='groupapproval_pending_idx',
+            ),
+            # Beslissingen per periode (approvals/rollups.py)
+            models.Index(
+                fields=['reviewed_at'],
+                condition=~models.Q(status='PENDING'),
+                name='groupapproval_decided_idx',
+            ),
+        ]
         verbose_name = _('Groepsgoedkeuring')
         verbose_name_plural = _('Groepsgoedkeuringen')
     
@@ -195,32 +233,76 @@ class GroupApproval(models.Model):
     
     def check_all_members_approved(self):
         """Controleert of alle leden van de groep hebben goedgekeurd (exclusief de aanvrager)"""
-        # Bepaal het totale aantal leden dat mag stemmen (totaal leden minus aanvrager indien aanwezig)
-        total_voting_members = self.group.members.count()
-        requester = self.approval_request.requester
-        
-        # Als de aanvrager lid is van de groep, tel deze niet mee
-        if requester in self.group.members.all():
-            total_voting_members -= 1
-            
         # Alle stemgerechtigde leden hebben goedgekeurd als het aantal goedkeuringen gelijk is aan
         # het aantal stemgerechtigde leden (en er zijn stemgerechtigde leden)
-        approved_count = self.approved_members.count()
-        return total_voting_members > 0 and approved_count >= total_voting_members
-        
-    def update_status(self):
-        """Update de status op basis van de goedkeuringen van groepsleden"""
-        # Als er een afwijzing is, is de groep afgewezen
-        if self.rejected_members.exists():
-            self.status = 'REJECTED'
-            self.save()
-            return
-        
-        # Als alle leden hebben goedgekeurd, is de groep goedgekeurd
+        return self.eligible_count > 0 and self.approved_count >= self.eligible_count
+
+    def decided_status(self):
+        """Status die volgt uit de tellers van de groepsleden"""
+        if self.rejected_count > 0:
+            # Als er een afwijzing is, is de groep afgewezen
+            return 'REJECTED'
         if self.check_all_members_approved():
-            self.status = 'APPROVED'
-            self.save()
-            return
+            # Als alle leden hebben goedgekeurd, is de groep goedgekeurd
+            return 'APPROVED'
+        return self.status
+
+    def update_status(self):
+        """Update de status op basis van de tellers van de groepsleden"""
+        status = self.decided_status()
+        if status != self.status:
+            self.status = status
+            self.save(update_fields=['status'])
+
+    def cast_vote(self, user, approve, comment=''):
+        """
+        Registreer de stem van een groepslid en werk tellers en status bij.
+        Geeft False als de gebruiker (inmiddels) niet mag stemmen.
+
+        De rij blijft tot het einde van de transactie vergrendeld, zodat
+        gelijktijdige stemmen in dezelfde groep na elkaar worden verwerkt.
+        """
+        # Geen eigen savepoint: binnen de transactie van de view is de rij al vergrendeld
+        with transaction.atomic(savepoint=False):
+            locked = GroupApproval.objects.select_for_update().only(
+                'status', 'eligible_count', 'approved_count', 'rejected_count'
+            ).get(pk=self.pk)
+            if locked.status != 'PENDING' or not self.can_user_vote(user):
+                return False
+
+            if approve:
+                self.approved_members.add(user)
+                counter = 'approved_count'
+            else:
+                self.rejected_members.add(user)
+                counter = 'rejected_count'
+            # Onder de vergrendeling zijn de gelezen tellers actueel
+            self.status = locked.status
+            self.eligible_count = locked.eligible_count
+            self.approved_count = locked.approved_count
+            self.rejected_count = locked.rejected_count
+            setattr(self, counter, getattr(locked, counter) + 1)
+            # Update de laatste beoordelaar en opmerkingen informatie
+            self.reviewer = user
+            self.review_comment = comment
+            self.reviewed_at = timezone.now()
+            self.save(update_fields=[counter, 'reviewer', 'review_comment', 'reviewed_at'])
+            self.update_status()
+        return True
+
+    @classmethod
+    def refresh_eligible_counts(cls, group_approvals):
+        """Herbereken eligible_count na een wijziging in de leden van de groepen."""
+        group_approvals = list(group_approvals.annotate(
+            current_eligible=Count(
+                'group__members',
+                filter=~Q(group__members=F('approval_request__requester')),
+            )
+        ))
+        changed = [ga for ga in group_approvals if ga.eligible_count != ga.current_eligible]
+        for ga in changed:
+            ga.eligible_count = ga.current_eligible
+        cls.objects.bulk_update(changed, ['eligible_count'])
 
     def can_user_vote(self, user):
         """Controleert of een gebruiker mag stemmen voor deze groep
@@ -229,22 +311,78 @@ class GroupApproval(models.Model):
         1. De gebruiker lid is van de groep
         2. De gebruiker niet de aanvrager is van het verzoek
         3. De gebruiker nog niet heeft gestemd voor deze groep
+        Precies dan bestaat er een ReviewerTask (zolang de groep nog open staat).
         """
-        # Controleer of gebruiker lid is van de groep
-        if user not in self.group.members.all():
-            return False
-        
-        # Controleer of gebruiker niet de aanvrager is
-        if user == self.approval_request.requester:
-            return False
-        
-        # Controleer of gebruiker nog niet heeft gestemd
-        already_voted = (user in self.approved_members.all() or 
-                        user in self.rejected_members.all())
-        if already_voted:
-            return False
-            
-        return True
+        return self.reviewer_tasks.filter(user_id=user.pk).exists()
+
+class ReviewerTask(models.Model):
+    """
+    Openstaande stem van één beoordelaar voor één groepsgoedkeuring: de
+    gebruiker is lid van de groep, is niet de aanvrager en heeft nog niet
+    gestemd, en zowel de groepsgoedkeuring als het verzoek staan nog open.
+    Bijgehouden door approvals/signals.py via approvals/inbox.py.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="reviewer_tasks"
+    )
+    group_approval = models.ForeignKey(
+        GroupApproval,
+        on_delete=models.CASCADE,
+        related_name="reviewer_tasks"
+    )
+    # Gedenormaliseerd, zodat inbox en rechtencontrole geen join nodig hebben
+    approval_request = models.ForeignKey(
+        ApprovalRequest,
+        on_delete=models.CASCADE,
+        related_name="reviewer_tasks"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'group_approval'], name='reviewertask_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'approval_request'], name='reviewertask_inbox_idx'),
+        ]
+        verbose_name = _('Openstaande beoordeling')
+        verbose_name_plural = _('Openstaande beoordelingen')
+
+    def __str__(self):
+        return f"{self.user} voor verzoek {self.approval_request_id} (groepsgoedkeuring {self.group_approval_id})"
+
+class ApprovalTurnaroundRollup(models.Model):
+    """
+    Beslissingen van groepen per dag, groep en soort instrument, met een
+    histogram van de doorlooptijd (van indienen tot beslissing). Rapportages
+    lezen alleen deze tabel; bijgewerkt door approvals/rollups.py.
+    """
+    day = models.DateField(verbose_name=_('Dag'))
+    group = models.ForeignKey(
+        ApprovalGroup,
+        on_delete=models.CASCADE,
+        related_name="turnaround_rollups",
+        verbose_name=_('Groep')
+    )
+    instrument = models.CharField(max_length=50, verbose_name=_('Instrument'))
+    decisions = models.PositiveIntegerField(default=0, verbose_name=_('Beslissingen'))
+    approved = models.PositiveIntegerField(default=0, verbose_name=_('Goedgekeurd'))
+    rejected = models.PositiveIntegerField(default=0, verbose_name=_('Afgewezen'))
+    total_seconds = models.FloatField(default=0, verbose_name=_('Totale doorlooptijd (s)'))
+    # Aantal beslissingen per klasse van rollups.BUCKET_BOUNDS
+    histogram = models.JSONField(default=list, verbose_name=_('Histogram'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'group', 'instrument'], name='turnaroundrollup_unique'),
+        ]
+        verbose_name = _('Doorlooptijd per dag')
+        verbose_name_plural = _('Doorlooptijden per dag')
+
+    def __str__(self):
+        return f"{self.day} {self.group_id} {self.instrument}: {self.decisions} beslissingen"
 
 class ApprovalLog(models.Model):
     """Model to track approval workflow history"""
@@ -264,6 +402,9 @@ class ApprovalLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['approval', '-timestamp'], name='approvallog_approval_time_idx'),
+        ]
         verbose_name = _('Goedkeuringslog')
         verbose_name_plural = _('Goedkeuringslogs')
 
@@ -0,0 +1,193 @@
+"""
+Module: approvals/rollups.py
+Beschrijving: Dagelijkse rollups van de doorlooptijd van groepsbeoordelingen,
+en rapportages (aantallen, gemiddelde en percentielen) die alleen die rollups
+lezen.
+
+De doorlooptijd van een groepsgoedkeuring loopt van het indienen van het
+verzoek tot de beslissing van de groep (reviewed_at van een goedgekeurde of
+afgewezen GroupApproval). Per dag (lokale tijd), groep en soort instrument
+bewaart ApprovalTurnaroundRollup het aantal beslissingen, de totale
+doorlooptijd en een histogram over BUCKET_BOUNDS. Histogrammen kunnen anders
+dan percentielen opgeteld worden, zodat een rapport over een maand of jaar
+uit hooguit dagen x groepen x instrumenten rijen komt, hoeveel beslissingen er
+ook zijn. Percentielen worden binnen een klasse lineair geïnterpoleerd.
+
+`refresh_rollups` werkt incrementeel: alleen de laatst bijgewerkte dag (die
+toen nog niet compleet kon zijn) en de dagen daarna worden opnieuw berekend.
+Zie de management command rollup_approval_turnaround. Rapporten worden
+gecachet tot de volgende herberekening.
+"""
+
+import bisect
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from instrument_generator import cache
+
+from .models import ApprovalTurnaroundRollup, GroupApproval
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Bovengrenzen (in seconden) van de histogramklassen; de laatste klasse is open
+BUCKET_BOUNDS = (
+    HOUR, 2 * HOUR, 4 * HOUR, 8 * HOUR, 12 * HOUR,
+    DAY, 2 * DAY, 3 * DAY, 5 * DAY, 7 * DAY, 14 * DAY, 30 * DAY,
+)
+
+PERCENTILES = (50, 90)
+
+ROLLUP_NAMESPACE = "approvals.rollups"
+
+
+def bucket_for(seconds):
+    """Index van de histogramklasse voor een doorlooptijd."""
+    return bisect.bisect_left(BUCKET_BOUNDS, seconds)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _decisions(start):
+    """Beslissingen vanaf `start`: (lokale dag, groep, instrument, status, doorlooptijd in seconden)."""
+    rows = GroupApproval.objects.exclude(status='PENDING').filter(
+        reviewed_at__gte=start
+    ).values_list(
+        'reviewed_at', 'group_id', 'approval_request__submission__instrument', 'status',
+        'approval_request__created_at',
+    ).order_by()
+    for reviewed_at, group_id, instrument, status, created_at in rows.iterator():
+        seconds = max((reviewed_at - created_at).total_seconds(), 0)
+        yield timezone.localdate(reviewed_at), group_id, instrument, status, seconds
+
+
+def rollup_days(first_day):
+    """Bereken alle rollups vanaf `first_day` (inclusief) opnieuw. Geeft het aantal rijen."""
+    rollups = {}
+    for day, group_id, instrument, status, seconds in _decisions(_day_start(first_day)):
+        key = (day, group_id, instrument)
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = ApprovalTurnaroundRollup(
+                day=day, group_id=group_id, instrument=instrument, histogram=[0] * (len(BUCKET_BOUNDS) + 1),
+            )
+        rollup.decisions += 1
+        if status == 'APPROVED':
+            rollup.approved += 1
+        else:
+            rollup.rejected += 1
+        rollup.total_seconds += seconds
+        rollup.histogram[bucket_for(seconds)] += 1
+
+    with transaction.atomic():
+        ApprovalTurnaroundRollup.objects.filter(day__gte=first_day).delete()
+        ApprovalTurnaroundRollup.objects.bulk_create(rollups.values())
+    cache.invalidate(ROLLUP_NAMESPACE)
+    return len(rollups)
+
+
+def refresh_rollups(full=False):
+    """
+    Werk de rollups bij vanaf de laatst bijgewerkte dag, of alles opnieuw met
+    `full`. Geeft het aantal herberekende rijen.
+    """
+    last_day = None if full else ApprovalTurnaroundRollup.objects.aggregate(last=Max('day'))['last']
+    if last_day is None:
+        first = GroupApproval.objects.exclude(status='PENDING').filter(
+            reviewed_at__isnull=False
+        ).order_by('reviewed_at').values_list('reviewed_at', flat=True).first()
+        if first is None:
+            ApprovalTurnaroundRollup.objects.all().delete()
+            cache.invalidate(ROLLUP_NAMESPACE)
+            return 0
+        last_day = timezone.localdate(first)
+    return rollup_days(last_day)
+
+
+def percentile(histogram, fraction):
+    """Benadering van een percentiel (0 < fraction <= 1) uit een histogram, in seconden."""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = fraction * total
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        if count and cumulative + count >= target:
+            lower = BUCKET_BOUNDS[index - 1] if index else 0
+            if index == len(BUCKET_BOUNDS):
+                # Open klasse: alleen de ondergrens is bekend
+                return lower
+            upper = BUCKET_BOUNDS[index]
+            return lower + (upper - lower) * (target - cumulative) / count
+        cumulative += count
+    return BUCKET_BOUNDS[-1]
+
+
+def _summary(label, rollups):
+    histogram = [0] * (len(BUCKET_BOUNDS) + 1)
+    decisions = approved = 0
+    total_seconds = 0.0
+    for rollup in rollups:
+        decisions += rollup['decisions']
+        approved += rollup['approved']
+        total_seconds += rollup['total_seconds']
+        for index, count in enumerate(rollup['histogram']):
+            histogram[index] += count
+    summary = {
+        'label': label,
+        'decisions': decisions,
+        'approved': approved,
+        'rejected': decisions - approved,
+        'mean': total_seconds / decisions if decisions else None,
+    }
+    for p in PERCENTILES:
+        summary[f'p{p}'] = percentile(histogram, p / 100)
+    return summary
+
+
+def _build_report(start, end):
+    rollups = ApprovalTurnaroundRollup.objects.filter(day__gte=start)
+    if end is not None:
+        rollups = rollups.filter(day__lte=end)
+    rows = list(rollups.values(
+        'day', 'group__name', 'instrument', 'decisions', 'approved', 'total_seconds', 'histogram',
+    ).order_by('day'))
+
+    by_group = defaultdict(list)
+    by_instrument = defaultdict(list)
+    by_month = defaultdict(list)
+    for row in rows:
+        by_group[row['group__name']].append(row)
+        by_instrument[row['instrument']].append(row)
+        by_month[row['day'].replace(day=1)].append(row)
+    return {
+        'total': _summary('Totaal', rows),
+        'groups': [_summary(name, by_group[name]) for name in sorted(by_group)],
+        'instruments': [_summary(name, by_instrument[name]) for name in sorted(by_instrument)],
+        'months': [_summary(month, by_month[month]) for month in sorted(by_month)],
+        'last_day': max((row['day'] for row in rows), default=None),
+    }
+
+
+def turnaround_report(start, end=None):
+    """
+    Doorlooptijden per groep, per soort instrument en per maand voor de dagen
+    van `start` tot en met `end`, uit de rollups (hooguit één query).
+    """
+    return cache.get_or_set(ROLLUP_NAMESPACE, f"report:{start}:{end}", lambda: _build_report(start, end))
+
+
+def report_start(months):
+    """Eerste dag van de periode van `months` maanden tot en met vandaag."""
+    today = timezone.localdate()
+    month = today.month - months + 1
+    year = today.year + (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return today.replace(year=year, month=month, day=1)
+
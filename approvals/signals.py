@@ -1,10 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import ApprovalRequest
-from mailer.utils import send_html_email
+from instrument_generator import cache
+from instruments.models import InstrumentSubmission
+from .counters import adjust_pending_count, reset_pending_count
+from .inbox import close_tasks, sync_reviewer_tasks
+from .models import ApprovalGroup, ApprovalRequest, GroupApproval
+from mailer.templatetags.mailer_tags import display_name
+from mailer.utils import send_html_emails, send_html_fanout
 from . import is_enabled
 
 @receiver(post_save, sender=ApprovalRequest)
@@ -16,41 +21,182 @@ def notify_approval_request(sender, instance, created, **kwargs):
         
     if created:
         # New approval request - notify reviewers
-        subject = f"Nieuw goedkeuringsverzoek voor {instance.submission.instrument}"
-        template = "emails/new_approval_request.html"
-        for user in get_reviewers():
-            context = {
-                'reviewer': user,
-                'request': instance,
-                'submission': instance.submission,
-            }
-            send_html_email(
-                subject=subject,
-                to=user.email,
-                template_name=template,
-                context=context,
-                user=user
-            )
+        notify_new_requests([instance])
     elif instance.status in ['APPROVED', 'REJECTED']:
         # Status changed - notify requester
-        subject = f"Goedkeuringsverzoek {instance.get_status_display().lower()}"
-        template = "emails/approval_request_status.html"
-        context = {
-            'request': instance,
-            'submission': instance.submission,
-            'user': instance.requester
-        }
-        send_html_email(
-            subject=subject,
-            to=instance.requester.email,
-            template_name=template,
-            context=context,
-            user=instance.requester
+        notify_decided_requests([instance])
+
+def notify_decided_requests(requests):
+    """Eén e-mail per afgerond verzoek aan de aanvrager, met één insert in de outbox per status"""
+    if not is_enabled() or not requests:
+        return
+    for status in ('APPROVED', 'REJECTED'):
+        decided = [request for request in requests if request.status == status]
+        if not decided:
+            continue
+        send_html_emails(
+            subject=f"Goedkeuringsverzoek {decided[0].get_status_display().lower()}",
+            template_name="emails/approval_request_status.html",
+            recipients=[
+                (
+                    request.requester.email,
+                    {'request': request, 'submission': request.submission, 'user': request.requester},
+                    request.requester,
+                )
+                for request in decided
+            ],
         )
 
+def notify_new_requests(requests):
+    """Eén e-mail per beoordelaar over een of meer nieuwe verzoeken"""
+    if not is_enabled() or not requests:
+        return
+    if len(requests) == 1:
+        [request] = requests
+        subject = f"Nieuw goedkeuringsverzoek voor {request.submission.instrument}"
+        template = "emails/new_approval_request.html"
+        context = {'request': request, 'submission': request.submission}
+    else:
+        subject = f"{len(requests)} nieuwe goedkeuringsverzoeken"
+        template = "emails/new_approval_requests.html"
+        context = {'requests': requests}
+    # Eén keer renderen; per beoordelaar alleen de aanhef invullen
+    send_html_fanout(
+        subject=subject,
+        template_name=template,
+        context=context,
+        recipients=[(user.email, user, {'reviewer_name': display_name(user)}) for user in get_reviewers()],
+    )
+
 def get_reviewers():
     """Get all users who can review submissions"""
     User = get_user_model()
     return User.objects.filter(
         groups__permissions__codename='can_review_submissions'
-    ).distinct()
\ No newline at end of file
+    ).distinct()
+
+@receiver([post_save, post_delete], sender=ApprovalRequest)
+def invalidate_approval_request_cache(sender, instance, **kwargs):
+    """Invalideer de cache van het verzoek en van de bijbehorende submission"""
+    cache.invalidate_instance(instance)
+    cache.invalidate(
+        cache.namespace_for(InstrumentSubmission, instance.submission_id),
+        cache.namespace_for(InstrumentSubmission),
+    )
+
+@receiver([post_save, post_delete], sender=GroupApproval)
+def invalidate_group_approval_cache(sender, instance, **kwargs):
+    """Invalideer de cache van de groepsgoedkeuring en van het bijbehorende verzoek"""
+    cache.invalidate_instance(instance)
+    cache.invalidate(
+        cache.namespace_for(ApprovalRequest, instance.approval_request_id),
+        cache.namespace_for(ApprovalRequest),
+    )
+
+@receiver(m2m_changed, sender=ApprovalRequest.required_groups.through)
+@receiver(m2m_changed, sender=GroupApproval.approved_members.through)
+@receiver(m2m_changed, sender=GroupApproval.rejected_members.through)
+def invalidate_approval_m2m_cache(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Invalideer de cache na wijzigingen in vereiste groepen of stemmen"""
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        # Wijziging vanaf de andere kant (groep of gebruiker): pk_set bevat dan
+        # de verzoeken/groepsgoedkeuringen waarvan de relatie is gewijzigd
+        cache.invalidate(
+            *(cache.namespace_for(model, pk) for pk in pk_set or ()),
+            cache.namespace_for(model),
+        )
+        return
+    cache.invalidate_instance(instance)
+
+
+# ------------------------------------------------------------------
+# Inbox van beoordelaars (ReviewerTask)
+# ------------------------------------------------------------------
+
+@receiver(post_save, sender=GroupApproval)
+def sync_tasks_for_group_approval(sender, instance, update_fields=None, **kwargs):
+    """Nieuwe of gewijzigde groepsgoedkeuring: taken van de groepsleden bijwerken"""
+    if update_fields is not None and 'status' not in update_fields:
+        # Alleen tellers of toelichting gewijzigd; stemmen lopen via m2m_changed
+        return
+    if instance.status != 'PENDING':
+        close_tasks(group_approval=instance)
+        return
+    sync_reviewer_tasks([instance.pk])
+
+@receiver(post_save, sender=ApprovalRequest)
+def sync_tasks_for_request(sender, instance, created, **kwargs):
+    """Een afgerond verzoek heeft geen openstaande taken meer"""
+    if created:
+        # Taken ontstaan pas met de groepsgoedkeuringen
+        return
+    if instance.status != 'PENDING':
+        close_tasks(approval_request=instance)
+        return
+    sync_reviewer_tasks(instance.group_approvals.values_list('pk', flat=True))
+
+@receiver(m2m_changed, sender=GroupApproval.approved_members.through)
+@receiver(m2m_changed, sender=GroupApproval.rejected_members.through)
+def sync_tasks_for_votes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Na een stem (of het intrekken ervan) de taken van de groepsgoedkeuring bijwerken"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        sync_reviewer_tasks([instance.pk])
+    elif pk_set is not None:
+        sync_reviewer_tasks(pk_set)
+    else:
+        # Alle stemmen van een gebruiker gewist: opnieuw voor al zijn groepen
+        sync_reviewer_tasks(GroupApproval.objects.filter(
+            group__members=instance, status='PENDING'
+        ).values_list('pk', flat=True))
+
+@receiver(m2m_changed, sender=ApprovalGroup.members.through)
+def sync_tasks_for_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """Leden toegevoegd aan of verwijderd uit een goedkeuringsgroep"""
+    if action == 'pre_clear' and reverse:
+        # Na het wissen is niet meer te zien uit welke groepen de gebruiker is verwijderd
+        instance._cleared_approval_group_ids = list(instance.approval_groups.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        group_ids = [instance.pk]
+    elif pk_set is not None:
+        group_ids = pk_set
+    else:
+        group_ids = getattr(instance, '_cleared_approval_group_ids', [])
+    group_approvals = GroupApproval.objects.filter(group__in=group_ids, status='PENDING')
+    GroupApproval.refresh_eligible_counts(group_approvals)
+    sync_reviewer_tasks(group_approvals.values_list('pk', flat=True))
+
+# ------------------------------------------------------------------
+# Globale teller van openstaande verzoeken (approvals/counters.py)
+# ------------------------------------------------------------------
+
+_UNKNOWN = object()
+
+@receiver(post_init, sender=ApprovalRequest)
+def remember_status(sender, instance, **kwargs):
+    """Onthoud de status bij het laden, om overgangen bij het opslaan te herkennen"""
+    # Via __dict__: een uitgestelde (deferred) status niet alsnog ophalen
+    instance._counted_status = instance.__dict__.get('status', _UNKNOWN)
+
+@receiver(post_save, sender=ApprovalRequest)
+def count_status_transition(sender, instance, created, **kwargs):
+    """Werk de teller bij bij een overgang van of naar PENDING"""
+    previous = None if created else getattr(instance, '_counted_status', _UNKNOWN)
+    if previous is _UNKNOWN:
+        reset_pending_count()
+    else:
+        delta = (instance.status == 'PENDING') - (previous == 'PENDING')
+        if delta:
+            adjust_pending_count(delta)
+    instance._counted_status = instance.status
+
+@receiver(post_delete, sender=ApprovalRequest)
+def count_deleted_request(sender, instance, **kwargs):
+    if getattr(instance, '_counted_status', _UNKNOWN) == 'PENDING':
+        adjust_pending_count(-1)
@@ -1,20 +1,19 @@
 from django import template
-from approvals.models import ApprovalRequest
-import difflib
+from approvals.counters import inbox_count, pending_count
+from approvals.diff import diff_texts
 
 register = template.Library()
 
 @register.simple_tag
 def pending_approvals_count():
-    """Return the number of pending approval requests"""
-    return ApprovalRequest.objects.filter(status='PENDING').count()
+    """Return the number of pending approval requests (cached counter)"""
+    return pending_count()
 
 @register.simple_tag
 def user_has_pending_approvals(user):
-    """Check if a specific user has pending approval requests"""
-    if user.has_perm('approvals.can_review_submissions'):
-        return ApprovalRequest.objects.filter(status='PENDING').exists()
-    return False
+    """Check if a specific user has approval requests they can still vote on (cached counter)"""
+    # Taken bestaan alleen voor wie nog mag stemmen; has_perm zou groepen en permissies laden
+    return user.is_authenticated and inbox_count(user) > 0
 
 @register.filter
 def get_item(dictionary, key):
@@ -24,29 +23,29 @@ def get_item(dictionary, key):
 @register.filter
 def generate_diff_lines(text1, text2):
     """
-    Generate HTML diff between two texts with added/removed/unchanged lines.
-    text1 should be the original (older) version
-    text2 should be the new version
+    Generate diff lines between two texts as (type, line) tuples with type
+    added/removed/unchanged. text1 should be the original (older) version,
+    text2 the new version. See approvals/diff.py for hunks with word-level changes.
     """
     if not text1 or not text2:
         return []
-    
-    # Split both texts into lines
-    lines1 = text1.splitlines()
-    lines2 = text2.splitlines()
-    
-    # Use differ to get the differences
-    differ = difflib.Differ()
-    diff = list(differ.compare(lines1, lines2))
-    
-    # Process the diff output
+
     result = []
-    for line in diff:
-        if line.startswith('  '):  # Unchanged
-            result.append(('unchanged', line[2:]))
-        elif line.startswith('- '):  # Removed (in original but not in new)
-            result.append(('removed', line[2:]))
-        elif line.startswith('+ '):  # Added (in new but not in original)
-            result.append(('added', line[2:]))
-            
-    return result
\ No newline at end of file
+    for hunk in diff_texts(text1, text2):
+        if hunk['tag'] == 'equal':
+            result.extend(('unchanged', line) for line in hunk['lines'])
+        else:
+            result.extend(('removed', ''.join(text for _kind, text in segments)) for segments in hunk['removed'])
+            result.extend(('added', ''.join(text for _kind, text in segments)) for segments in hunk['added'])
+    return result
+
+@register.filter
+def duration(seconds):
+    """Doorlooptijd in seconden als leesbare tekst (minuten, uren of dagen)"""
+    if seconds is None:
+        return '-'
+    if seconds < 3600:
+        return f"{round(seconds / 60)} min"
+    if seconds < 48 * 3600:
+        return f"{seconds / 3600:.1f} uur".replace('.', ',')
+    return f"{seconds / 86400:.1f} dagen".replace('.', ',')
@@ -0,0 +1,466 @@
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from approvals.bulk import bulk_create_requests, bulk_review
+from approvals.counters import inbox_count, pending_count
+from approvals.diff import diff_texts, opcodes
+from approvals.inbox import rebuild_reviewer_tasks
+from approvals.models import (
+    ApprovalGroup, ApprovalLog, ApprovalRequest, ApprovalTurnaroundRollup, GroupApproval, ReviewerTask,
+)
+from approvals.rollups import HOUR, percentile, refresh_rollups, turnaround_report
+from approvals.views import ApprovalDashboardView
+from instrument_generator.pagination import order_by
+from instrument_generator.testing import assert_no_seq_scan
+from instruments.models import InstrumentSubmission, InstrumentVersion
+from mailer.models import OutboxEmail
+from mailer.outbox import dispatch
+
+User = get_user_model()
+
+
+@pytest.fixture
+def dashboard(db, rf):
+    """
+    Een dashboard voor een beoordelaar met een paar honderd verzoeken, waarvan
+    de meeste al beoordeeld zijn. bulk_create slaat de e-mailsignalen over.
+    """
+    requester = User.objects.create_user(
+        email="requester@example.com", password="secret", initials="R.", last_name="Requester"
+    )
+    reviewer = User.objects.create_user(
+        email="reviewer@example.com", password="secret", initials="B.", last_name="Reviewer"
+    )
+    groups = ApprovalGroup.objects.bulk_create(ApprovalGroup(name=f"Groep {i}") for i in range(3))
+    groups[0].members.add(reviewer)
+    members = User.objects.bulk_create(
+        User(email=f"member{i}@example.com", initials="M.", last_name=f"Member {i}") for i in range(30)
+    )
+    for i, member in enumerate(members):
+        groups[i % 3].members.add(member)
+
+    submissions = InstrumentSubmission.objects.bulk_create(
+        InstrumentSubmission(owner=requester, instrument="Motie", subject=f"Motie {i}", date=date(2025, 1, 1))
+        for i in range(100)
+    )
+    statuses = ["APPROVED", "REJECTED", "APPROVED", "PENDING"]
+    requests = ApprovalRequest.objects.bulk_create(
+        ApprovalRequest(submission=submissions[i % 100], requester=requester, status=statuses[i % 4])
+        for i in range(400)
+    )
+    GroupApproval.objects.bulk_create(
+        GroupApproval(approval_request=request, group=group, status=request.status)
+        for request in requests
+        for group in groups
+    )
+    rebuild_reviewer_tasks()
+    # Verse statistieken, zoals in productie na autovacuum
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    view = ApprovalDashboardView()
+    view.setup(rf.get("/approvals/"))
+    view.request.user = reviewer
+    return view
+
+
+def test_dashboard_pending_query_uses_indexes(dashboard):
+    queryset = dashboard.get_queryset()
+    assert_no_seq_scan(queryset.order_by(*order_by(dashboard.PENDING_ORDERING))[:11])
+    assert_no_seq_scan(dashboard.pending_requests().values("pk"))
+
+
+def test_dashboard_reviewed_query_uses_indexes(dashboard):
+    dashboard.request.GET = dashboard.request.GET.copy()
+    dashboard.request.GET["tab"] = "reviewed"
+    submissions = dashboard.get_queryset().order_by(*order_by(dashboard.REVIEWED_ORDERING))[:11]
+    # De submissions zelf worden in pk-volgorde doorlopen; de Exists per
+    # submission moet via de index op (submission, status) gaan
+    assert_no_seq_scan(submissions, allow=["instruments_instrumentsubmission"])
+    reviewed = ApprovalRequest.objects.filter(submission__in=list(submissions)).exclude(status="PENDING")
+    assert_no_seq_scan(reviewed)
+
+
+def test_dashboard_pending_annotations(dashboard):
+    request = ApprovalRequest.objects.filter(status="PENDING").first()
+    groups = {group.name: group for group in ApprovalGroup.objects.all()}
+    # De aanvrager is lid van Groep 2 en telt daar niet mee als stemgerechtigde
+    groups["Groep 2"].members.add(request.requester)
+    request.required_groups.set(groups.values())
+    # bulk_create vult de tellers niet
+    GroupApproval.refresh_eligible_counts(GroupApproval.objects.filter(approval_request=request))
+    GroupApproval.objects.filter(approval_request=request, group__name="Groep 1").update(status="APPROVED")
+    assert GroupApproval.objects.get(approval_request=request, group__name="Groep 0").cast_vote(
+        groups["Groep 0"].members.exclude(pk=dashboard.request.user.pk).first(), approve=True
+    )
+
+    [row] = dashboard.annotate_pending(list(dashboard.get_queryset().filter(pk=request.pk)))
+    assert row.user_pending_groups == ["Groep 0"]
+    assert row.approval_progress == 33
+    counts = {ga.group.name: (ga.approved_count, ga.eligible_count) for ga in row.group_approvals.all()}
+    assert counts == {"Groep 0": (1, 11), "Groep 1": (0, 10), "Groep 2": (0, 10)}
+
+
+def test_dashboard_reviewed_shows_latest_requests_per_submission(dashboard, django_assert_num_queries):
+    submission = InstrumentSubmission.objects.filter(
+        approval_requests__status="APPROVED"
+    ).order_by("-pk").first()
+    requester = ApprovalRequest.objects.first().requester
+    ApprovalRequest.objects.bulk_create(
+        ApprovalRequest(
+            submission=submission, requester=requester, status="REJECTED",
+            reviewed_at=timezone.now() + timedelta(days=i),
+        )
+        for i in range(dashboard.REVIEWED_PER_SUBMISSION + 2)
+    )
+
+    # Aanvragen en hun groepsgoedkeuringen (de nieuwe aanvragen hebben er geen)
+    with django_assert_num_queries(2):
+        [group] = dashboard.group_reviewed([submission])
+    assert group["submission"] == submission
+    assert len(group["requests"]) == dashboard.REVIEWED_PER_SUBMISSION
+    reviewed_at = [request.reviewed_at for request in group["requests"]]
+    assert reviewed_at == sorted(reviewed_at, reverse=True)
+    # Vier beoordeelde aanvragen uit de fixture en twee extra
+    assert group["hidden_count"] == 6
+
+
+@pytest.mark.django_db
+def test_reviewer_tasks_follow_votes_and_membership():
+    requester, alice, bob = User.objects.bulk_create(
+        User(email=f"{name}@example.com", initials="T.", last_name=name) for name in ("requester", "alice", "bob")
+    )
+    group = ApprovalGroup.objects.create(name="Juridisch")
+    group.members.add(requester, alice)
+    submission = InstrumentSubmission.objects.create(
+        owner=requester, instrument="Motie", subject="Motie", date=date(2025, 1, 1)
+    )
+    request = ApprovalRequest.objects.create(submission=submission, requester=requester, status="PENDING")
+    request.required_groups.add(group)
+    request.initialize_group_approvals()
+    group_approval = request.group_approvals.get()
+
+    def reviewers():
+        return set(ReviewerTask.objects.filter(approval_request=request).values_list("user__email", flat=True))
+
+    # De aanvrager krijgt geen taak
+    assert reviewers() == {"alice@example.com"}
+    bob.approval_groups.add(group)
+    assert reviewers() == {"alice@example.com", "bob@example.com"}
+    assert request.can_user_review(bob) and not request.can_user_review(requester)
+
+    group_approval.approved_members.add(alice)
+    assert reviewers() == {"bob@example.com"}
+    assert not group_approval.can_user_vote(alice)
+    group.members.remove(bob)
+    assert reviewers() == set()
+
+    group.members.add(bob)
+    # De tabel komt overeen met een volledige herberekening
+    assert rebuild_reviewer_tasks() == 1
+    assert reviewers() == {"bob@example.com"}
+
+    request.status = "APPROVED"
+    request.save()
+    assert reviewers() == set()
+
+
+@pytest.mark.django_db
+def test_group_vote_tallies():
+    requester, alice, bob, carol = User.objects.bulk_create(
+        User(email=f"{name}@example.com", initials="T.", last_name=name)
+        for name in ("requester", "alice", "bob", "carol")
+    )
+    group = ApprovalGroup.objects.create(name="Juridisch")
+    group.members.add(requester, alice, bob)
+    submission = InstrumentSubmission.objects.create(
+        owner=requester, instrument="Motie", subject="Motie", date=date(2025, 1, 1)
+    )
+    request = ApprovalRequest.objects.create(submission=submission, requester=requester, status="PENDING")
+    request.required_groups.add(group)
+    request.initialize_group_approvals()
+    group_approval = request.group_approvals.get()
+    # De aanvrager is geen stemgerechtigd lid
+    assert group_approval.eligible_count == 2
+
+    group.members.add(carol)
+    group_approval.refresh_from_db()
+    assert group_approval.eligible_count == 3
+
+    assert group_approval.cast_vote(alice, approve=True)
+    # Twee keer stemmen telt niet dubbel
+    assert not group_approval.cast_vote(alice, approve=True)
+    assert not group_approval.cast_vote(requester, approve=True)
+    group.members.remove(carol)
+    group_approval.refresh_from_db()
+    assert (group_approval.approved_count, group_approval.eligible_count) == (1, 2)
+    assert group_approval.status == "PENDING"
+
+    assert group_approval.cast_vote(bob, approve=True)
+    assert group_approval.status == "APPROVED"
+    request.update_status_based_on_group_approvals()
+    assert request.status == "APPROVED"
+    # Na de beslissing kan er niet meer gestemd worden
+    group.members.add(carol)
+    assert not group_approval.cast_vote(carol, approve=False)
+
+
+@pytest.mark.django_db
+def test_bulk_review_reports_per_request():
+    requester, alice, bob = User.objects.bulk_create(
+        User(email=f"{name}@example.com", initials="T.", last_name=name) for name in ("requester", "alice", "bob")
+    )
+    legal, finance = ApprovalGroup.objects.bulk_create(ApprovalGroup(name=name) for name in ("Juridisch", "Financiën"))
+    legal.members.add(alice, bob)
+    finance.members.add(alice)
+    requests = []
+    for i in range(3):
+        submission = InstrumentSubmission.objects.create(
+            owner=requester, instrument="Motie", subject=f"Motie {i}", date=date(2025, 1, 1)
+        )
+        request = ApprovalRequest.objects.create(submission=submission, requester=requester, status="PENDING")
+        request.required_groups.add(legal, finance)
+        request.initialize_group_approvals()
+        requests.append(request)
+    requests[2].status = "APPROVED"
+    requests[2].save()
+    ids = [requests[0].pk, requests[1].pk, requests[2].pk, 0]
+
+    # Alice keurt goed namens beide groepen; Financiën is daarmee rond
+    results = bulk_review(alice, ids, approve=True, comment="Akkoord")
+    assert [result["ok"] for result in results] == [True, True, False, False]
+    assert results[2]["message"] == "Dit verzoek kan niet meer worden beoordeeld."
+    assert results[3]["request"] is None
+    assert ApprovalLog.objects.filter(user=alice).count() == 4
+    statuses = dict(GroupApproval.objects.filter(approval_request=requests[0]).values_list("group__name", "status"))
+    assert statuses == {"Juridisch": "PENDING", "Financiën": "APPROVED"}
+    assert not ReviewerTask.objects.filter(user=alice).exists()
+    # Nog een keer stemmen kan niet
+    assert not any(result["ok"] for result in bulk_review(alice, ids, approve=True))
+
+    # Eén afwijzing beslist het verzoek
+    results = bulk_review(bob, ids[:1], approve=False, comment="Niet akkoord")
+    assert results[0]["ok"] and results[0]["request"].status == "REJECTED"
+    requests[0].refresh_from_db()
+    assert requests[0].status == "REJECTED"
+    assert GroupApproval.objects.get(approval_request=requests[0], group=legal).rejected_count == 1
+    assert pending_count() == 1
+    # De aanvrager krijgt bericht, net als bij een gewone save (requests[2] en requests[0])
+    assert OutboxEmail.objects.filter(to="requester@example.com").count() == 2
+
+
+@pytest.mark.django_db
+def test_bulk_create_requests_sends_one_email_per_reviewer(mailoutbox):
+    requester, alice, bob = User.objects.bulk_create(
+        User(email=f"{name}@example.com", initials="T.", last_name=name) for name in ("requester", "alice", "bob")
+    )
+    Group.objects.get(name="Reviewers").user_set.add(alice, bob)
+    group = ApprovalGroup.objects.create(name="Juridisch")
+    group.members.add(requester, alice)
+    submissions = InstrumentSubmission.objects.bulk_create(
+        InstrumentSubmission(owner=requester, instrument="Motie", subject=f"Motie {i}", date=date(2025, 1, 1))
+        for i in range(3)
+    )
+    existing = InstrumentVersion.create_from_submission(submissions[0])
+
+    requests = bulk_create_requests(
+        requester,
+        InstrumentSubmission.objects.filter(owner=requester).order_by("pk").prefetch_related("submitters"),
+        ApprovalGroup.objects.all(),
+        "Graag",
+    )
+    assert [request.submission_id for request in requests] == [submission.pk for submission in submissions]
+    # Ongewijzigde inhoud: de bestaande versie wordt hergebruikt
+    assert requests[0].version_id == existing.pk
+    assert InstrumentVersion.objects.count() == 3
+    assert set(GroupApproval.objects.values_list("eligible_count", flat=True)) == {1}
+    assert ReviewerTask.objects.filter(user=alice).count() == 3
+    assert pending_count() == 3
+    assert dispatch() == (2, 0, 0)
+    assert sorted(message.to[0] for message in mailoutbox) == ["alice@example.com", "bob@example.com"]
+    assert mailoutbox[0].subject == "3 nieuwe goedkeuringsverzoeken"
+
+
+@pytest.mark.django_db
+def test_benchmark_voting_reports_consistent_states():
+    # Een echte beoordelaar krijgt van de benchmark geen mail
+    reviewer = User.objects.create(email="reviewer@example.com", initials="T.", last_name="Beoordelaar")
+    Group.objects.get(name="Reviewers").user_set.add(reviewer)
+    out = StringIO()
+    call_command(
+        "benchmark_voting", group_size=3, groups=2, requests=3, threads=1, reject_rate=0.2, stdout=out,
+    )
+    output = out.getvalue()
+    assert "18 stemmen" in output
+    assert "Latentie (ms): p50" in output
+    assert "fouten" not in output
+    assert "Geen inconsistenties" in output
+    # Alle benchmarkdata is weer opgeruimd
+    assert not User.objects.filter(email__startswith="bench-").exists()
+    assert not ApprovalGroup.objects.exists()
+    assert not ApprovalRequest.objects.exists()
+    assert not OutboxEmail.objects.exists()
+
+
+@pytest.mark.django_db
+def test_turnaround_rollups(django_assert_num_queries):
+    requester = User.objects.create(email="requester@example.com", initials="R.", last_name="Requester")
+    legal, finance = ApprovalGroup.objects.bulk_create(ApprovalGroup(name=name) for name in ("Juridisch", "Financiën"))
+    # 08:00 lokale tijd, zodat de beslissingen op voorspelbare dagen vallen
+    submitted = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=3), time(8)))
+
+    def decide(group, instrument, hours, status="APPROVED", day=0):
+        submission = InstrumentSubmission.objects.create(
+            owner=requester, instrument=instrument, subject="Motie", date=date(2025, 1, 1)
+        )
+        request = ApprovalRequest.objects.create(submission=submission, requester=requester, status="PENDING")
+        created_at = submitted + timedelta(days=day)
+        ApprovalRequest.objects.filter(pk=request.pk).update(created_at=created_at)
+        GroupApproval.objects.create(
+            approval_request=request, group=group, status=status, reviewed_at=created_at + timedelta(hours=hours),
+        )
+
+    for hours in (1.5, 3, 3, 10):
+        decide(legal, "Motie", hours)
+    decide(finance, "Schriftelijke vragen", 30, status="REJECTED", day=-1)
+    # Nog niet beslist: telt niet mee
+    GroupApproval.objects.create(approval_request=ApprovalRequest.objects.first(), group=finance)
+
+    assert refresh_rollups() == 2
+    with django_assert_num_queries(1):
+        report = turnaround_report(timezone.localdate(submitted))
+    assert (report["total"]["decisions"], report["total"]["approved"], report["total"]["rejected"]) == (5, 4, 1)
+    legal_row, = [row for row in report["groups"] if row["label"] == "Juridisch"]
+    assert legal_row["mean"] == pytest.approx(4.375 * HOUR)
+    # Mediaan valt in de klasse 2-4 uur
+    assert 2 * HOUR < legal_row["p50"] <= 4 * HOUR
+    assert [row["label"] for row in report["instruments"]] == ["Motie", "Schriftelijke vragen"]
+    assert percentile([0, 0, 0], 0.5) is None
+
+    # Incrementeel: alleen de laatste dag en later worden herberekend
+    decide(legal, "Motie", 2, day=1)
+    assert refresh_rollups() == 3
+    assert ApprovalTurnaroundRollup.objects.count() == 3
+    assert turnaround_report(timezone.localdate(submitted))["total"]["decisions"] == 6
+
+
+@pytest.mark.django_db
+def test_pending_counters_are_maintained_without_queries(django_assert_num_queries, django_capture_on_commit_callbacks):
+    requester, reviewer = User.objects.bulk_create(
+        User(email=f"{name}@example.com", initials="T.", last_name=name) for name in ("requester", "reviewer")
+    )
+    group = ApprovalGroup.objects.create(name="Juridisch")
+    group.members.add(reviewer)
+    submission = InstrumentSubmission.objects.create(
+        owner=requester, instrument="Motie", subject="Motie", date=date(2025, 1, 1)
+    )
+    assert pending_count() == 0
+    assert inbox_count(reviewer) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        request = ApprovalRequest.objects.create(submission=submission, requester=requester, status="PENDING")
+        request.required_groups.add(group)
+        request.initialize_group_approvals()
+        # De globale teller volgt pas na de commit
+        assert pending_count() == 0
+    with django_assert_num_queries(0):
+        # Globale teller bijgewerkt met incr; per beoordelaar na invalidatie opnieuw geteld
+        assert pending_count() == 1
+    assert inbox_count(reviewer) == 1
+    with django_assert_num_queries(0):
+        assert inbox_count(reviewer) == 1
+
+    # Een teruggedraaide overgang laat de teller ongemoeid
+    with pytest.raises(RuntimeError), transaction.atomic():
+        ApprovalRequest.objects.get(pk=request.pk).delete()
+        raise RuntimeError
+    with django_assert_num_queries(0):
+        assert pending_count() == 1
+
+    request = ApprovalRequest.objects.get(pk=request.pk)
+    request.status = "APPROVED"
+    with django_capture_on_commit_callbacks(execute=True):
+        request.save()
+    assert inbox_count(reviewer) == 0
+    with django_assert_num_queries(0):
+        assert pending_count() == 0
+
+
+@pytest.mark.django_db
+def test_user_has_pending_approvals_tag_is_query_free_when_warm(django_assert_num_queries):
+    from django.template import Context, Template
+
+    requester, reviewer = User.objects.bulk_create(
+        User(email=f"{name}@example.com", initials="T.", last_name=name) for name in ("requester", "reviewer")
+    )
+    Group.objects.get(name="Reviewers").user_set.add(reviewer)
+    group = ApprovalGroup.objects.create(name="Juridisch")
+    group.members.add(reviewer)
+    submission = InstrumentSubmission.objects.create(
+        owner=requester, instrument="Motie", subject="Motie", date=date(2025, 1, 1)
+    )
+    request = ApprovalRequest.objects.create(submission=submission, requester=requester, status="PENDING")
+    request.required_groups.add(group)
+    request.initialize_group_approvals()
+
+    template = Template("{% load approval_tags %}{% user_has_pending_approvals user %}")
+    assert template.render(Context({"user": User.objects.get(pk=reviewer.pk)})) == "True"
+    # Een nieuwe request: geen geladen permissies, wel een warme cache
+    user = User.objects.get(pk=reviewer.pk)
+    with django_assert_num_queries(0):
+        assert template.render(Context({"user": user})) == "True"
+
+
+def test_diff_engine_lines_and_words():
+    old = "\n".join(f"Overweging {i}." for i in range(2000))
+    new_lines = old.splitlines()
+    new_lines[10] = "Overweging tien, aangepast."
+    del new_lines[500]
+    new_lines.insert(1500, "Nieuwe overweging.")
+    new = "\n".join(new_lines)
+
+    codes = opcodes(old.splitlines(), new_lines)
+    # De opcodes zetten de oude tekst om in de nieuwe
+    rebuilt = []
+    for tag, i1, i2, j1, j2 in codes:
+        rebuilt.extend(old.splitlines()[i1:i2] if tag == "equal" else new_lines[j1:j2])
+    assert rebuilt == new_lines
+    assert [code[0] for code in codes if code[0] != "equal"] == ["replace", "delete", "insert"]
+
+    changes = [hunk for hunk in diff_texts(old, new) if hunk["tag"] == "change"]
+    # Alleen de gewijzigde woorden zijn gemarkeerd
+    assert changes[0]["removed"] == [[("equal", "Overweging "), ("removed", "10"), ("equal", ".")]]
+    assert changes[0]["added"] == [[("equal", "Overweging "), ("added", "tien, aangepast"), ("equal", ".")]]
+    assert changes[1] == {"tag": "change", "removed": [[("removed", "Overweging 500.")]], "added": []}
+
+
+@pytest.mark.django_db
+def test_version_diff_is_cached_per_pair(monkeypatch):
+    from approvals import diff
+    from instruments.models import InstrumentVersion
+
+    requester = User.objects.create(email="diff@example.com", initials="D.", last_name="Diff")
+    submission = InstrumentSubmission.objects.create(
+        owner=requester, instrument="Motie", subject="Diff", date=date(2025, 1, 1), considerations="Een",
+    )
+    first = InstrumentVersion.create_from_submission(submission)
+    submission.considerations = "Twee"
+    submission.save()
+    second = InstrumentVersion.create_from_submission(submission)
+
+    result = diff.version_diff(first, second, first.preview_text, second.preview_text)
+    with monkeypatch.context() as patch:
+        patch.setattr(diff, "diff_texts", lambda *args: pytest.fail("diff opnieuw berekend"))
+        assert diff.version_diff(first, second, first.preview_text, second.preview_text) == result
+
+    # Andere previewtemplates na een deploy: de diff wordt opnieuw berekend
+    monkeypatch.setattr(diff, "_renderer_revision", lambda: "nieuwe-revisie")
+    monkeypatch.setattr(diff, "diff_texts", lambda *args: ["opnieuw"])
+    assert diff.version_diff(first, second, first.preview_text, second.preview_text) == ["opnieuw"]
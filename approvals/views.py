@@ -1,14 +1,21 @@
-from django.views.generic import ListView, DetailView, CreateView, View
+from django.views.generic import ListView, DetailView, CreateView, FormView, TemplateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
-from django.utils import timezone
-from django.db.models import Q, Count, Exists, OuterRef
+from django.contrib.auth import get_user_model
+from django.db.models import Q, Count, Exists, F, OuterRef, Prefetch, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.db import transaction
 from django.http import Http404
 from instruments.models import InstrumentSubmission
-from .models import ApprovalRequest, ApprovalLog
-from .forms import ApprovalRequestForm, ReviewForm
+from instrument_generator.aggregates import GroupConcat, SubqueryCount, split_concat
+from instrument_generator.pagination import paginate_keyset
+from .counters import inbox_count
+from .models import ApprovalRequest, ApprovalLog, GroupApproval, ReviewerTask
+from .rollups import report_start, turnaround_report
+from .bulk import bulk_create_requests, bulk_review
+from .forms import ApprovalRequestForm, BulkApprovalRequestForm, BulkReviewForm, ReviewForm
 from itertools import groupby
 from operator import attrgetter
 from . import is_enabled
@@ -36,94 +43,148 @@ class ApprovalDashboardView(ApprovalBaseMixin, ListView):
     context_object_name = 'requests'
     paginate_by = 10
 
-    def get_queryset(self):
-        tab = self.request.GET.get('tab', 'pending')
-        user = self.request.user
-        
-        if (tab == 'reviewed'):
-            # Haal alle beoordeelde aanvragen op, gesorteerd op submission en datum
-            reviewed = ApprovalRequest.objects.exclude(status='PENDING').select_related(
-                'submission', 'requester'
-            ).prefetch_related('group_approvals', 'group_approvals__group', 'group_approvals__reviewer').order_by('submission', '-reviewed_at')
-            
-            # Groepeer de aanvragen per submission
-            grouped_requests = []
-            for submission_id, requests in groupby(reviewed, key=lambda x: x.submission_id):
-                requests = list(requests)  # Convert iterator to list
-                grouped_requests.append({
-                    'submission': requests[0].submission,  # Eerste aanvraag bevat de submission
-                    'requests': requests  # Alle aanvragen voor deze submission
-                })
-            return grouped_requests
-        
-        # Haal de goedkeuringsgroepen op waar de gebruiker lid van is
-        user_groups = user.approval_groups.all()
-        
-        # Voor pending tab: haal de aanvragen op waar de gebruiker nog op kan stemmen
-        # 1. Het verzoek is nog in behandeling (status = PENDING)
-        # 2. De gebruiker is niet de aanvrager
-        # 3. De gebruiker is lid van minstens één groep die nog moet goedkeuren
-        pending = ApprovalRequest.objects.filter(
+    # Keyset-volgorde per tab (zie instrument_generator/pagination.py).
+    # Wachtend: eerst verzoeken met eerdere afwijzingen, dan nieuwste eerst.
+    PENDING_ORDERING = [('has_previous_rejections', True), ('created_at', True), ('pk', True)]
+    # Beoordeeld: per submission, nieuwste submission eerst
+    REVIEWED_ORDERING = [('pk', True)]
+    REVIEWED_PER_SUBMISSION = 5
+
+    def get_tab(self):
+        return 'reviewed' if self.request.GET.get('tab') == 'reviewed' else 'pending'
+
+    def pending_requests(self):
+        """
+        Verzoeken waar de gebruiker nog op kan stemmen: er is minstens één
+        openstaande taak (ReviewerTask) voor deze gebruiker.
+        """
+        return ApprovalRequest.objects.filter(
             status='PENDING'
-        ).exclude(
-            requester=user
         ).filter(
-            group_approvals__status='PENDING',
-            group_approvals__group__in=user_groups
+            Exists(ReviewerTask.objects.filter(user=self.request.user, approval_request=OuterRef('pk')))
+        )
+
+    def get_queryset(self):
+        if self.get_tab() == 'reviewed':
+            # Submissions met minstens één beoordeelde aanvraag; de aanvragen
+            # zelf worden per pagina opgehaald in paginate_queryset
+            return InstrumentSubmission.objects.filter(
+                Exists(ApprovalRequest.objects.filter(submission=OuterRef('pk')).exclude(status='PENDING'))
+            )
+
+        user = self.request.user
+        return self.pending_requests().annotate(
+            has_previous_rejections=Exists(ApprovalRequest.objects.filter(
+                submission=OuterRef('submission'),
+                status='REJECTED',
+                created_at__lt=OuterRef('created_at'),
+            )),
+            # Groepen waarvoor deze gebruiker nog moet stemmen, als één tekstwaarde
+            user_pending_group_names=Subquery(
+                ReviewerTask.objects.filter(
+                    user=user,
+                    approval_request=OuterRef('pk'),
+                ).values('approval_request').annotate(
+                    names=GroupConcat('group_approval__group__name')
+                ).values('names')
+            ),
+            # Gecorreleerde tellingen in plaats van joins met GROUP BY: zo
+            # worden ze alleen berekend voor de rijen op de huidige pagina
+            required_group_count=SubqueryCount(
+                ApprovalRequest.required_groups.through.objects.filter(approvalrequest=OuterRef('pk'))
+            ),
+            approved_group_count=SubqueryCount(
+                GroupApproval.objects.filter(approval_request=OuterRef('pk'), status='APPROVED')
+            ),
         ).select_related(
             'submission', 'requester'
         ).prefetch_related(
-            'group_approvals', 'required_groups'
-        ).distinct()
-        
-        # Voeg informatie toe aan elk verzoek over eerdere afwijzingen en welke groepen nog moeten goedkeuren
-        for request in pending:
-            # Controleer of er eerdere afgewezen verzoeken zijn
-            request.has_previous_rejections = ApprovalRequest.objects.filter(
-                submission=request.submission,
-                status='REJECTED',
-                created_at__lt=request.created_at
-            ).exists()
-            
-            # Vind de groepen van deze gebruiker die nog moeten goedkeuren
-            request.user_pending_groups = list(
-                request.group_approvals.filter(
-                    status='PENDING', 
-                    group__in=user_groups
-                ).select_related('group').values_list('group__name', flat=True)
-            )
-            
-            # Voortgang bepalen
-            total_required_groups = request.required_groups.count()
-            approved_groups = request.group_approvals.filter(status='APPROVED').count()
-            
-            # Gebruik de status van GroupApproval objecten in plaats van een aangepaste berekening
-            # Deze statussen zijn al correct ingesteld met inachtneming van de aanvrager
+            Prefetch('group_approvals', queryset=self.group_approvals_with_counts())
+        )
+
+    def group_approvals_with_counts(self):
+        """Groepsgoedkeuringen met de groep en of de aanvrager er lid van is."""
+        # De tellingen (eligible_count, approved_count) staan op GroupApproval zelf
+        return GroupApproval.objects.select_related('group').annotate(
+            requester_is_member=Exists(get_user_model().objects.filter(
+                pk=OuterRef('approval_request__requester_id'),
+                approval_groups=OuterRef('group_id'),
+            )),
+        ).order_by('pk')
+
+    def paginate_queryset(self, queryset, page_size):
+        tab = self.get_tab()
+        ordering = self.REVIEWED_ORDERING if tab == 'reviewed' else self.PENDING_ORDERING
+        page = paginate_keyset(queryset, ordering, self.request.GET.get('cursor'), page_size)
+        if tab == 'reviewed':
+            object_list = self.group_reviewed(page.object_list)
+        else:
+            object_list = self.annotate_pending(page.object_list)
+        page.object_list = object_list
+        return None, page, object_list, page.has_other_pages()
+
+    def group_reviewed(self, submissions):
+        """
+        Haal de beoordeelde aanvragen van één pagina submissions op, gegroepeerd
+        per submission. Per submission komen alleen de laatste
+        REVIEWED_PER_SUBMISSION aanvragen mee (window-functie in de database);
+        de rest staat op de detailpagina.
+        """
+        reviewed = ApprovalRequest.objects.filter(
+            submission__in=submissions
+        ).exclude(status='PENDING').annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('submission'),
+                order_by=[F('reviewed_at').desc(nulls_last=True), F('pk').desc()],
+            ),
+            reviewed_total=Window(Count('pk'), partition_by=F('submission')),
+        ).filter(
+            position__lte=self.REVIEWED_PER_SUBMISSION
+        ).select_related(
+            'requester', 'reviewer'
+        ).prefetch_related(
+            'group_approvals', 'group_approvals__group', 'group_approvals__reviewer'
+        ).order_by('submission', 'position')
+
+        by_submission = {
+            submission_id: list(requests)
+            for submission_id, requests in groupby(reviewed, key=attrgetter('submission_id'))
+        }
+        grouped_requests = []
+        for submission in submissions:
+            requests = by_submission.get(submission.pk)
+            if not requests:
+                continue
+            grouped_requests.append({
+                'submission': submission,
+                'requests': requests,
+                # Oudere beoordelingen die niet op het dashboard getoond worden
+                'hidden_count': requests[0].reviewed_total - len(requests),
+            })
+        return grouped_requests
+
+    def annotate_pending(self, requests):
+        """Zet de annotaties van get_queryset om naar de waarden die de template gebruikt (zonder queries)."""
+        for request in requests:
+            # Groepen van deze gebruiker die nog moeten goedkeuren
+            request.user_pending_groups = split_concat(request.user_pending_group_names)
+
+            # Voortgang op basis van de status van de groepsgoedkeuringen; deze
+            # statussen zijn al correct ingesteld met inachtneming van de aanvrager
             request.approval_progress = 0
-            if total_required_groups > 0:
-                request.approval_progress = int((approved_groups / total_required_groups) * 100)
-        
-        # Sorteer op prioriteit: eerst verzoeken met eerdere afwijzingen, dan op aanvraagdatum (nieuwste eerst)
-        return sorted(pending, key=lambda x: (-x.has_previous_rejections, -x.created_at.timestamp()))
+            if request.required_group_count > 0:
+                request.approval_progress = int((request.approved_group_count / request.required_group_count) * 100)
+        return requests
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
         # Huidige tab (pending of reviewed)
-        context['current_tab'] = self.request.GET.get('tab', 'pending')
+        context['current_tab'] = self.get_tab()
         
         # Aantal openstaande verzoeken die deze gebruiker kan beoordelen
-        user = self.request.user
-        user_groups = user.approval_groups.all()
-        
-        context['pending_count'] = ApprovalRequest.objects.filter(
-            status='PENDING'
-        ).exclude(
-            requester=user
-        ).filter(
-            group_approvals__status='PENDING',
-            group_approvals__group__in=user_groups
-        ).distinct().count()
+        context['pending_count'] = inbox_count(self.request.user)
         
         return context
 
@@ -134,7 +195,14 @@ class ApprovalRequestDetailView(ApprovalFeatureRequiredMixin, LoginRequiredMixin
     context_object_name = 'request'
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        qs = super().get_queryset().select_related(
+            'submission', 'version', 'requester'
+        ).prefetch_related(
+            Prefetch('group_approvals', queryset=GroupApproval.objects.select_related('group', 'reviewer')),
+            'group_approvals__group__members',
+            'group_approvals__approved_members',
+            'group_approvals__rejected_members',
+        )
         # Sta zowel beoordelaars als aanvragers toe
         if self.request.user.has_perm('approvals.can_review_submissions'):
             return qs
@@ -142,54 +210,35 @@ class ApprovalRequestDetailView(ApprovalFeatureRequiredMixin, LoginRequiredMixin
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        from instruments.views import process_gui_data, render_to_string
-        
-        # Generate all version previews first
-        version_previews = {}
-        historical_requests = self.object.submission.approval_requests.all()
-        for request in historical_requests:
-            if request.version:
-                version = request.version
-                preview_data = process_gui_data(
-                    table_data=[[s['initials'], s['lastname'], s['party']] for s in version.submitters_data],
-                    instrument=version.instrument,
-                    subject=version.subject,
-                    date_str=str(version.date),
-                    considerations=version.considerations,
-                    requests=version.requests
-                )
-                # Convert request.pk to string to match template behavior
-                version_previews[str(request.pk)] = render_to_string("instruments/previews/template.txt", preview_data)
-        
-        # Add version previews to context
-        context['version_previews'] = version_previews
-        
-        # Generate main preview for current request
+        from instruments.previews import render_preview, version_preview
+
+        # Alle verzoeken voor deze submission, nieuwste eerst, met versie, aanvrager en log.
+        # De versies hebben hun preview al bij het aanmaken gerenderd; HTML en data zijn hier niet nodig.
+        historical_requests = list(
+            self.object.submission.approval_requests.select_related(
+                'version', 'requester'
+            ).defer(
+                'version__preview_html', 'version__preview_data'
+            ).prefetch_related(
+                Prefetch('logs', queryset=ApprovalLog.objects.select_related('user').order_by('-timestamp'))
+            ).order_by('-created_at', '-pk')
+        )
+        context['historical_requests'] = historical_requests
+
+        # Opgeslagen previews van alle versies (sleutel als string, zoals in de template)
+        context['version_previews'] = {
+            str(request.pk): version_preview(request.version)
+            for request in historical_requests
+            if request.version
+        }
+
+        # Preview van het huidige verzoek
         if self.object.version:
-            version = self.object.version
-            preview_data = process_gui_data(
-                table_data=[[s['initials'], s['lastname'], s['party']] for s in version.submitters_data],
-                instrument=version.instrument,
-                subject=version.subject,
-                date_str=str(version.date),
-                considerations=version.considerations,
-                requests=version.requests
-            )
-            context['preview'] = render_to_string("instruments/previews/template.txt", preview_data)
+            context['preview'] = version_preview(self.object.version)
         else:
             # Fallback to current submission data if no version exists
-            submission = self.object.submission
-            table_data = [[s.initials, s.lastname, s.party] for s in submission.submitters.all()]
-            preview_data = process_gui_data(
-                table_data=table_data,
-                instrument=submission.instrument,
-                subject=submission.subject,
-                date_str=str(submission.date),
-                considerations=submission.considerations,
-                requests=submission.requests
-            )
-            context['preview'] = render_to_string("instruments/previews/template.txt", preview_data)
-        
+            context['preview'] = render_preview(self.object.submission)
+
         # Add approval logs to context, ordered by timestamp
         context['logs'] = self.object.logs.all().order_by('-timestamp')
         
@@ -209,18 +258,9 @@ class CreateApprovalRequestView(ApprovalFeatureRequiredMixin, LoginRequiredMixin
         submission = get_object_or_404(InstrumentSubmission, pk=self.kwargs['submission_pk'])
         context['submission'] = submission
         
-        # Get preview data
-        from instruments.views import process_gui_data, render_to_string
-        table_data = [[s.initials, s.lastname, s.party] for s in submission.submitters.all()]
-        preview_data = process_gui_data(
-            table_data=table_data,
-            instrument=submission.instrument,
-            subject=submission.subject,
-            date_str=str(submission.date),
-            considerations=submission.considerations,
-            requests=submission.requests
-        )
-        context['preview'] = render_to_string("instruments/previews/template.txt", preview_data)
+        # Get (cached) preview
+        from instruments.previews import render_preview
+        context['preview'] = render_preview(submission)
         return context
 
     def form_valid(self, form):
@@ -250,6 +290,30 @@ class CreateApprovalRequestView(ApprovalFeatureRequiredMixin, LoginRequiredMixin
         messages.success(self.request, 'Goedkeuringsverzoek is succesvol ingediend.')
         return response
 
+class BulkCreateApprovalRequestView(ApprovalFeatureRequiredMixin, LoginRequiredMixin, FormView):
+    """Goedkeuring aanvragen voor meerdere eigen indieningen tegelijk"""
+    form_class = BulkApprovalRequestForm
+    template_name = 'approvals/bulk_create_request.html'
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
+    def get_initial(self):
+        # Voorselectie vanuit het overzicht (?submissions=1&submissions=2)
+        return {'submissions': self.request.GET.getlist('submissions')}
+
+    def form_valid(self, form):
+        requests = bulk_create_requests(
+            self.request.user,
+            form.cleaned_data['submissions'].prefetch_related('submitters'),
+            form.cleaned_data['required_groups'],
+            form.cleaned_data['request_comment'],
+        )
+        messages.success(self.request, f'{len(requests)} goedkeuringsverzoeken zijn ingediend.')
+        return redirect('instrument_submission_list')
+
 class ApproveRequestView(ApprovalBaseMixin, View):
     """View for approving a request"""
     def post(self, request, *args, **kwargs):
@@ -266,55 +330,51 @@ class ApproveRequestView(ApprovalBaseMixin, View):
 
         form = ReviewForm(request.POST)
         if form.is_valid():
-            # Haal de groepsgoedkeuringen op waar de gebruiker lid van is
-            user_group_approvals = approval_request.group_approvals.filter(
-                group__members=request.user
-            )
-            
-            if not user_group_approvals.exists():
-                messages.error(request, 'Je bent geen lid van een vereiste goedkeuringsgroep.')
-                return redirect('approvals:request_detail', pk=approval_request.pk)
-            
-            # Controleer of de gebruiker de aanvrager is
-            if approval_request.requester == request.user:
-                messages.error(request, 'Je kunt niet stemmen op je eigen aanvraag.')
-                return redirect('approvals:request_detail', pk=approval_request.pk)
-            
-            approval_count = 0
-            for group_approval in user_group_approvals:
-                # Gebruik de nieuwe can_user_vote methode om te controleren of de gebruiker mag stemmen
-                if not group_approval.can_user_vote(request.user):
-                    continue
-                
-                # Voeg de gebruiker toe aan de lijst van leden die hebben goedgekeurd
-                group_approval.approved_members.add(request.user)
-                
-                # Update de laatste beoordelaar en opmerkingen informatie
-                group_approval.reviewer = request.user
-                group_approval.review_comment = form.cleaned_data['comment']
-                group_approval.reviewed_at = timezone.now()
-                group_approval.save()
-                
-                # Update de status van de groepsgoedkeuring
-                group_approval.update_status()
-                
-                # Creëer log entry voor de goedkeuring
-                ApprovalLog.objects.create(
-                    approval=approval_request,
-                    user=request.user,
-                    action=f'approved_as_member_of_{group_approval.group.name}',
-                    comment=form.cleaned_data['comment']
-                )
-                
-                approval_count += 1
-            
-            if approval_count == 0:
-                messages.info(request, 'Je kunt dit verzoek niet goedkeuren. Mogelijk ben je de aanvrager of heb je al gestemd.')
-                return redirect('approvals:request_detail', pk=approval_request.pk)
-            
-            # Update de algemene status van het verzoek
-            approval_request.update_status_based_on_group_approvals()
-            
+            with transaction.atomic():
+                # Vergrendel het verzoek: gelijktijdige stemmen worden na elkaar verwerkt,
+                # zodat de status van het verzoek altijd op alle stemmen gebaseerd is
+                approval_request = ApprovalRequest.objects.select_for_update().get(pk=approval_request.pk)
+                if approval_request.status != 'PENDING':
+                    messages.error(request, 'Dit verzoek kan niet meer worden beoordeeld.')
+                    return redirect('approvals:request_detail', pk=approval_request.pk)
+
+                # Haal de groepsgoedkeuringen op waar de gebruiker lid van is
+                user_group_approvals = list(approval_request.group_approvals.filter(
+                    group__members=request.user
+                ).select_related('group'))
+
+                if not user_group_approvals:
+                    messages.error(request, 'Je bent geen lid van een vereiste goedkeuringsgroep.')
+                    return redirect('approvals:request_detail', pk=approval_request.pk)
+
+                # Controleer of de gebruiker de aanvrager is
+                if approval_request.requester_id == request.user.pk:
+                    messages.error(request, 'Je kunt niet stemmen op je eigen aanvraag.')
+                    return redirect('approvals:request_detail', pk=approval_request.pk)
+
+                approval_count = 0
+                for group_approval in user_group_approvals:
+                    # Stem, tellers en groepsstatus in één keer; False als de gebruiker niet mag stemmen
+                    if not group_approval.cast_vote(request.user, approve=True, comment=form.cleaned_data['comment']):
+                        continue
+
+                    # Creëer log entry voor de goedkeuring
+                    ApprovalLog.objects.create(
+                        approval=approval_request,
+                        user=request.user,
+                        action=f'approved_as_member_of_{group_approval.group.name}',
+                        comment=form.cleaned_data['comment']
+                    )
+
+                    approval_count += 1
+
+                if approval_count == 0:
+                    messages.info(request, 'Je kunt dit verzoek niet goedkeuren. Mogelijk ben je de aanvrager of heb je al gestemd.')
+                    return redirect('approvals:request_detail', pk=approval_request.pk)
+
+                # Update de algemene status van het verzoek
+                approval_request.update_status_based_on_group_approvals()
+
             if approval_request.status == 'APPROVED':
                 messages.success(request, 'Het verzoek is volledig goedgekeurd.')
             else:
@@ -345,64 +405,109 @@ class RejectRequestView(ApprovalBaseMixin, View):
                 messages.error(request, 'Een toelichting is verplicht bij het afwijzen van een verzoek.')
                 return redirect('approvals:request_detail', pk=approval_request.pk)
 
-            # Haal de groepsgoedkeuringen op waar de gebruiker lid van is
-            user_group_approvals = approval_request.group_approvals.filter(
-                group__members=request.user
-            )
-            
-            if not user_group_approvals.exists():
-                messages.error(request, 'Je bent geen lid van een vereiste goedkeuringsgroep.')
-                return redirect('approvals:request_detail', pk=approval_request.pk)
-            
-            # Controleer of de gebruiker de aanvrager is
-            if approval_request.requester == request.user:
-                messages.error(request, 'Je kunt niet stemmen op je eigen aanvraag.')
-                return redirect('approvals:request_detail', pk=approval_request.pk)
-                
-            rejection_count = 0
-            for group_approval in user_group_approvals:
-                # Gebruik de nieuwe can_user_vote methode om te controleren of de gebruiker mag stemmen
-                if not group_approval.can_user_vote(request.user):
-                    continue
-                
-                # Voeg de gebruiker toe aan de lijst van leden die hebben afgewezen
-                group_approval.rejected_members.add(request.user)
-                
-                # Update de laatste beoordelaar en opmerkingen informatie
-                group_approval.reviewer = request.user
-                group_approval.review_comment = form.cleaned_data['comment']
-                group_approval.reviewed_at = timezone.now()
-                
-                # Stel de groepsgoedkeuring direct in op afgewezen
-                group_approval.status = 'REJECTED'
-                group_approval.save()
-                
-                # Creëer log entry voor de afwijzing
-                ApprovalLog.objects.create(
-                    approval=approval_request,
-                    user=request.user,
-                    action=f'rejected_as_member_of_{group_approval.group.name}',
-                    comment=form.cleaned_data['comment']
-                )
-                
-                rejection_count += 1
-                
-                # Eén afwijzing is genoeg, dus we stoppen na de eerste groep
-                break
-            
-            if rejection_count == 0:
-                messages.info(request, 'Je kunt dit verzoek niet afwijzen. Mogelijk ben je de aanvrager of heb je al gestemd.')
-                return redirect('approvals:request_detail', pk=approval_request.pk)
-            
-            # Eén afwijzing is genoeg om het hele verzoek af te wijzen
-            approval_request.update_status_based_on_group_approvals()
-            
+            with transaction.atomic():
+                # Vergrendel het verzoek: gelijktijdige stemmen worden na elkaar verwerkt
+                approval_request = ApprovalRequest.objects.select_for_update().get(pk=approval_request.pk)
+                if approval_request.status != 'PENDING':
+                    messages.error(request, 'Dit verzoek kan niet meer worden beoordeeld.')
+                    return redirect('approvals:request_detail', pk=approval_request.pk)
+
+                # Haal de groepsgoedkeuringen op waar de gebruiker lid van is
+                user_group_approvals = list(approval_request.group_approvals.filter(
+                    group__members=request.user
+                ).select_related('group'))
+
+                if not user_group_approvals:
+                    messages.error(request, 'Je bent geen lid van een vereiste goedkeuringsgroep.')
+                    return redirect('approvals:request_detail', pk=approval_request.pk)
+
+                # Controleer of de gebruiker de aanvrager is
+                if approval_request.requester_id == request.user.pk:
+                    messages.error(request, 'Je kunt niet stemmen op je eigen aanvraag.')
+                    return redirect('approvals:request_detail', pk=approval_request.pk)
+
+                rejection_count = 0
+                for group_approval in user_group_approvals:
+                    # Eén afwijzing zet de groepsgoedkeuring direct op afgewezen (via rejected_count)
+                    if not group_approval.cast_vote(request.user, approve=False, comment=form.cleaned_data['comment']):
+                        continue
+
+                    # Creëer log entry voor de afwijzing
+                    ApprovalLog.objects.create(
+                        approval=approval_request,
+                        user=request.user,
+                        action=f'rejected_as_member_of_{group_approval.group.name}',
+                        comment=form.cleaned_data['comment']
+                    )
+
+                    rejection_count += 1
+
+                    # Eén afwijzing is genoeg, dus we stoppen na de eerste groep
+                    break
+
+                if rejection_count == 0:
+                    messages.info(request, 'Je kunt dit verzoek niet afwijzen. Mogelijk ben je de aanvrager of heb je al gestemd.')
+                    return redirect('approvals:request_detail', pk=approval_request.pk)
+
+                # Eén afwijzing is genoeg om het hele verzoek af te wijzen
+                approval_request.update_status_based_on_group_approvals()
+
             messages.success(request, f'Het verzoek is afgewezen op basis van jouw beoordeling.')
             return redirect('approvals:request_detail', pk=approval_request.pk)
         
         messages.error(request, 'Er is een fout opgetreden bij het verwerken van het formulier.')
         return redirect('approvals:request_detail', pk=approval_request.pk)
 
+class BulkReviewView(ApprovalBaseMixin, View):
+    """Eén beoordeling met één toelichting voor meerdere verzoeken tegelijk, vanaf het dashboard"""
+    def post(self, request, *args, **kwargs):
+        form = BulkReviewForm(request.POST)
+        if not form.is_valid():
+            for errors in form.errors.values():
+                for error in errors:
+                    messages.error(request, error)
+            return redirect('approvals:dashboard')
+
+        approve = form.cleaned_data['decision'] == 'approve'
+        results = bulk_review(request.user, form.cleaned_data['requests'], approve, form.cleaned_data['comment'])
+
+        reviewed = sum(1 for result in results if result['ok'])
+        if reviewed:
+            action = 'goedgekeurd' if approve else 'afgewezen'
+            messages.success(request, f'{reviewed} van de {len(results)} verzoeken {action}.')
+        # Resultaat per verzoek
+        for result in results:
+            approval_request = result['request']
+            label = (
+                f'{approval_request.submission.instrument} - {approval_request.submission.subject}'
+                if approval_request else f'Verzoek {result["pk"]}'
+            )
+            level = messages.SUCCESS if result['ok'] else messages.WARNING
+            messages.add_message(request, level, f'{label}: {result["message"]}')
+        return redirect('approvals:dashboard')
+
+class ApprovalAnalyticsView(ApprovalBaseMixin, TemplateView):
+    """Doorlooptijden van groepsbeoordelingen, alleen uit de dagelijkse rollups"""
+    template_name = 'approvals/analytics.html'
+    PERIODS = (3, 12, 36)
+    DEFAULT_PERIOD = 12
+
+    def get_months(self):
+        try:
+            months = int(self.request.GET.get('months', self.DEFAULT_PERIOD))
+        except ValueError:
+            return self.DEFAULT_PERIOD
+        return months if months in self.PERIODS else self.DEFAULT_PERIOD
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        months = self.get_months()
+        context['months'] = months
+        context['periods'] = self.PERIODS
+        context['start'] = report_start(months)
+        context['report'] = turnaround_report(context['start'])
+        return context
+
 class CompareVersionsView(ApprovalFeatureRequiredMixin, LoginRequiredMixin, View):
     """View voor het vergelijken van twee versies van een instrument"""
     template_name = 'approvals/compare_versions.html'
@@ -437,39 +542,26 @@ class CompareVersionsView(ApprovalFeatureRequiredMixin, LoginRequiredMixin, View
                 messages.error(request, 'Een of beide geselecteerde verzoeken heeft geen versie informatie.')
                 return redirect(request.META.get('HTTP_REFERER', 'approvals:dashboard'))
 
-            # Genereer previews voor beide versies
-            from instruments.views import process_gui_data, render_to_string
+            # Opgeslagen previews van beide versies
+            from instruments.previews import version_preview
+            from .diff import version_diff
             
             version1 = version1_request.version  # Oudste versie
             version2 = version2_request.version  # Nieuwste versie
 
-            preview1_data = process_gui_data(
-                table_data=[[s['initials'], s['lastname'], s['party']] for s in version1.submitters_data],
-                instrument=version1.instrument,
-                subject=version1.subject,
-                date_str=str(version1.date),
-                considerations=version1.considerations,
-                requests=version1.requests
-            )
-
-            preview2_data = process_gui_data(
-                table_data=[[s['initials'], s['lastname'], s['party']] for s in version2.submitters_data],
-                instrument=version2.instrument,
-                subject=version2.subject,
-                date_str=str(version2.date),
-                considerations=version2.considerations,
-                requests=version2.requests
-            )
-
+            preview1 = version_preview(version1)
+            preview2 = version_preview(version2)
             context = {
                 'version1': {
                     'request': version1_request,
-                    'preview': render_to_string("instruments/previews/template.txt", preview1_data)
+                    'preview': preview1
                 },
                 'version2': {
                     'request': version2_request,
-                    'preview': render_to_string("instruments/previews/template.txt", preview2_data)
+                    'preview': preview2
                 },
+                # Diff per regel en woord, gecachet per paar versies
+                'diff': version_diff(version1, version2, preview1, preview2),
                 'submission': version1_request.submission  # Voor broodkruimelpad
             }
 
@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(settings):
+    """Gebruik in tests altijd lege, proces-lokale caches in plaats van de gedeelde backend."""
+    from django.core.cache import caches
+
+    settings.CACHES = {
+        alias: {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": f"test-{alias}",
+        }
+        for alias in settings.CACHES
+    }
+    yield
+    for cache in caches.all(initialized_only=True):
+        cache.clear()
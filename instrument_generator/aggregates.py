@@ -0,0 +1,46 @@
+"""
+Module: instrument_generator/aggregates.py
+Beschrijving: Aggregaten en subquery-expressies die Django niet database-
+onafhankelijk meelevert.
+
+- GroupConcat: voegt tekstwaarden samen; STRING_AGG op PostgreSQL,
+  GROUP_CONCAT op SQLite.
+- SubqueryCount: aantal rijen van een gecorreleerde subquery. Anders dan
+  Count() via een join hoeft de buitenste query dan niet gegroepeerd te
+  worden, zodat PostgreSQL de telling alleen uitvoert voor de rijen die na
+  LIMIT overblijven.
+"""
+
+from django.db.models import Aggregate, CharField, IntegerField, Subquery, Value
+
+# Scheidingsteken voor GroupConcat; komt niet voor in namen of andere tekst
+SEPARATOR = "\x1f"
+
+
+class GroupConcat(Aggregate):
+    """Tekstwaarden samengevoegd met SEPARATOR; zie `split_concat` om te splitsen."""
+
+    function = "GROUP_CONCAT"
+    template = "%(function)s(%(expressions)s)"
+    output_field = CharField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, Value(SEPARATOR), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function="STRING_AGG", **extra_context)
+
+
+def split_concat(value):
+    """Splits het resultaat van GroupConcat in een (gesorteerde) lijst."""
+    return sorted(value.split(SEPARATOR)) if value else []
+
+
+class SubqueryCount(Subquery):
+    """COUNT(*) over de rijen van een (gecorreleerde) queryset."""
+
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) _count)"
+    output_field = IntegerField()
+
+    def __init__(self, queryset, **extra):
+        super().__init__(queryset.order_by().values("pk"), **extra)
@@ -0,0 +1,171 @@
+"""
+Module: instrument_generator/cache.py
+Beschrijving: Gelaagde cache voor de hele applicatie. Een kleine LRU-cache per
+proces (alias "local") staat vóór een gedeelde backend (alias "default") die
+alle workers zien. Sleutels worden per model gegroepeerd in namespaces; elke
+namespace heeft een versienummer in de gedeelde cache. Invalideren betekent
+dat versienummer ophogen, waardoor alle oude sleutels in beide lagen
+onbereikbaar worden zonder ze één voor één te hoeven verwijderen. Binnen een
+transactie wordt na de commit nogmaals geïnvalideerd (zie `invalidate`).
+
+De versienummers zelf staan ook VERSION_TIMEOUT seconden in de lokale laag,
+zodat een lokale treffer geen round-trip naar de gedeelde laag kost. Een
+invalidatie door dit proces werkt de lokale versie direct bij; een invalidatie
+door een ander proces is hier dus pas na hooguit VERSION_TIMEOUT seconden
+zichtbaar.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import models, transaction
+
+from instrument_generator import oncommit
+
+LOCAL_ALIAS = "local"
+SHARED_ALIAS = "default"
+
+# Hoe lang een waarde in de proces-lokale laag blijft. De versiecontrole via de
+# gedeelde laag houdt de lokale laag coherent; deze timeout begrenst alleen het
+# geheugengebruik van zelden gebruikte sleutels.
+LOCAL_TIMEOUT = 300
+
+# Hoe lang een versienummer in de lokale laag blijft: de maximale tijd dat dit
+# proces een invalidatie door een ander proces niet ziet.
+VERSION_TIMEOUT = 2
+
+_MISSING = object()
+
+
+def namespace_for(model_or_instance, pk=None):
+    """
+    Geef de namespace voor een model ("instruments.instrumentsubmission") of
+    voor één object ("instruments.instrumentsubmission:42").
+    """
+    namespace = model_or_instance._meta.label_lower
+    if pk is None and isinstance(model_or_instance, models.Model):
+        pk = model_or_instance.pk
+    if pk is not None:
+        namespace = f"{namespace}:{pk}"
+    return namespace
+
+
+def _version_key(namespace):
+    return f"ns:{namespace}"
+
+
+def _versions(namespaces):
+    """
+    Haal de huidige versies van de opgegeven namespaces op: uit de lokale laag,
+    en wat daar ontbreekt in één round-trip uit de gedeelde laag.
+    """
+    local = caches[LOCAL_ALIAS]
+    keys = [_version_key(ns) for ns in namespaces]
+    found = local.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        shared = caches[SHARED_ALIAS]
+        fetched = shared.get_many(missing)
+        for key in missing:
+            version = fetched.get(key)
+            if version is None:
+                # Een tijdsafhankelijke startwaarde voorkomt dat een weggevallen
+                # versiesleutel terugspringt naar een eerder gebruikte versie.
+                shared.add(key, time.time_ns(), timeout=None)
+                version = shared.get(key)
+            found[key] = version
+        local.set_many({key: found[key] for key in missing}, VERSION_TIMEOUT)
+    return [found[key] for key in keys]
+
+
+def _full_key(namespaces, key):
+    if isinstance(namespaces, str):
+        namespaces = (namespaces,)
+    versions = _versions(namespaces)
+    prefix = "|".join(f"{ns}@{version}" for ns, version in zip(namespaces, versions))
+    full_key = f"{prefix}|{key}"
+    if len(full_key) > 200:
+        full_key = hashlib.sha256(full_key.encode("utf-8")).hexdigest()
+    return full_key
+
+
+def get_cached(namespaces, key, default=None):
+    """Lees een waarde uit de cache; eerst de lokale laag, dan de gedeelde laag."""
+    full_key = _full_key(namespaces, key)
+    local = caches[LOCAL_ALIAS]
+    value = local.get(full_key, _MISSING)
+    if value is _MISSING:
+        value = caches[SHARED_ALIAS].get(full_key, _MISSING)
+        if value is _MISSING:
+            return default
+        local.set(full_key, value, LOCAL_TIMEOUT)
+    return value
+
+
+def set_cached(namespaces, key, value, timeout=None):
+    """Schrijf een waarde naar beide lagen. timeout=None gebruikt de backend-default."""
+    full_key = _full_key(namespaces, key)
+    if timeout is None:
+        caches[SHARED_ALIAS].set(full_key, value)
+    else:
+        caches[SHARED_ALIAS].set(full_key, value, timeout)
+    caches[LOCAL_ALIAS].set(full_key, value, LOCAL_TIMEOUT)
+
+
+def get_or_set(namespaces, key, default, timeout=None, local=True):
+    """
+    Geef de gecachte waarde terug of bereken deze met `default` (waarde of
+    callable) en sla het resultaat op. `namespaces` is één namespace of een
+    tuple van namespaces waarvan de waarde afhankelijk is. Met local=False
+    wordt de proces-lokale laag overgeslagen, bijvoorbeeld voor grote
+    binaire waarden.
+    """
+    full_key = _full_key(namespaces, key)
+    if local:
+        value = caches[LOCAL_ALIAS].get(full_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+    shared = caches[SHARED_ALIAS]
+    value = shared.get(full_key, _MISSING)
+    if value is _MISSING:
+        value = default() if callable(default) else default
+        if timeout is None:
+            shared.set(full_key, value)
+        else:
+            shared.set(full_key, value, timeout)
+    if local:
+        caches[LOCAL_ALIAS].set(full_key, value, LOCAL_TIMEOUT)
+    return value
+
+
+def _bump(namespaces):
+    shared = caches[SHARED_ALIAS]
+    bumped = {}
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            bumped[key] = shared.incr(key)
+        except ValueError:
+            bumped[key] = time.time_ns()
+            shared.set(key, bumped[key], timeout=None)
+    # Dit proces ziet de nieuwe versies direct, niet pas na VERSION_TIMEOUT
+    caches[LOCAL_ALIAS].set_many(bumped, VERSION_TIMEOUT)
+
+
+def invalidate(*namespaces):
+    """
+    Maak alle sleutels in de opgegeven namespaces in één keer ongeldig. Binnen
+    een transactie gebeurt dat direct (voor de schrijver zelf) én nog een keer
+    na de commit: een gelijktijdige lezer kan tussendoor de oude rijen onder de
+    nieuwe versie in de cache hebben gezet.
+    """
+    _bump(namespaces)
+    if transaction.get_connection().in_atomic_block:
+        oncommit.defer("cache.invalidate", namespaces, _bump)
+
+
+def invalidate_instance(instance):
+    """Invalideer zowel de namespace van het object als die van het hele model."""
+    invalidate(namespace_for(instance), namespace_for(type(instance)))
@@ -1,5 +1,6 @@
 # context_processors.py
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 
 def sqlite_mode(request):
     using_sqlite = (
@@ -10,4 +11,19 @@ def sqlite_mode(request):
 
 def approvals_enabled(request):
     """Maakt de approvals status beschikbaar in templates."""
-    return {"approvals_enabled": settings.ENABLE_APPROVALS}
\ No newline at end of file
+    return {"approvals_enabled": settings.ENABLE_APPROVALS}
+
+
+def approval_inbox_count(request):
+    """
+    Aantal verzoeken in de inbox van de gebruiker, voor de badge in de
+    navigatiebalk. Lui en gecachet: alleen berekend als de template het toont.
+    """
+    if not settings.ENABLE_APPROVALS:
+        return {}
+
+    def count():
+        from approvals.counters import inbox_count
+        return inbox_count(request.user) if request.user.is_authenticated else 0
+
+    return {"approval_inbox_count": SimpleLazyObject(count)}
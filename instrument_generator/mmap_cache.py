@@ -0,0 +1,274 @@
+"""
+Module: instrument_generator/mmap_cache.py
+Beschrijving: Cache-backend op basis van een gedeeld, met mmap ingelezen bestand.
+Het bestand bevat een hashtabel met een vast aantal slots van vaste grootte.
+Alle workers op dezelfde host lezen en schrijven hetzelfde segment zonder
+netwerkservice, en omdat het segment een bestand is (bij voorkeur op /dev/shm)
+overleeft het het herstarten van workers.
+
+Indeling van het bestand:
+    [bestandsheader][slot 0][slot 1]...[slot N-1]
+Elk slot begint met een header (sleutel-digest, vervaltijd, lengte, crc32)
+gevolgd door de met zlib gecomprimeerde pickle van de waarde. Waarden die niet
+in één slot passen worden niet opgeslagen.
+
+Gelijktijdige toegang tussen processen wordt geregeld met fcntl-recordlocks per
+slot; binnen één proces met een threading.Lock.
+
+Let op: wijzig SLOTS of SLOT_SIZE bij voorkeur samen met LOCATION. Anders
+vervangt het eerste proces met de nieuwe indeling het bestand door een nieuw
+segment; processen die het oude nog gemapt hebben blijven dat (veilig)
+gebruiken tot ze herstarten.
+"""
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"IGMMAP01"
+_FILE_HEADER = struct.Struct("<8sII")
+_FILE_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct("<16sdII")
+_EMPTY_DIGEST = b"\x00" * 16
+
+# Aantal opeenvolgende slots dat bij een botsing wordt geprobeerd
+_PROBES = 4
+
+
+class MmapCache(BaseCache):
+    """Django cache-backend met een vaste hashtabel in een gedeeld mmap-segment."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location
+        self._slots = int(options.get("SLOTS", 4096))
+        self._slot_size = int(options.get("SLOT_SIZE", 8192))
+        self._size = _FILE_HEADER_SIZE + self._slots * self._slot_size
+        self._lock = threading.Lock()
+        self._fd = None
+        self._map = None
+        self._pid = None
+
+    # ------------------------------------------------------------------
+    # Segmentbeheer
+    # ------------------------------------------------------------------
+    def _segment(self):
+        # Na een fork hoort elk proces zijn eigen descriptor (en locks) te hebben
+        if self._map is None or self._pid != os.getpid():
+            self._open()
+        return self._map
+
+    def _open(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        expected = _FILE_HEADER.pack(_MAGIC, self._slots, self._slot_size)
+        while True:
+            fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino != os.stat(self._path).st_ino:
+                    # Intussen door een ander proces vervangen: het nieuwe bestand openen
+                    replaced = True
+                elif os.fstat(fd).st_size == 0:
+                    # Nieuw bestand: nog door niemand gemapt, dus ter plekke initialiseren
+                    os.ftruncate(fd, self._size)
+                    os.pwrite(fd, expected, 0)
+                    replaced = False
+                elif (os.pread(fd, _FILE_HEADER.size, 0) != expected
+                      or os.fstat(fd).st_size != self._size):
+                    self._replace_segment(expected)
+                    replaced = True
+                else:
+                    replaced = False
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            if not replaced:
+                break
+            os.close(fd)
+        self._fd = fd
+        self._map = mmap.mmap(fd, self._size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self._pid = os.getpid()
+
+    def _replace_segment(self, header):
+        """
+        Vervang een segment met een andere geometrie door een nieuw bestand.
+        Het oude bestand wordt nooit verkleind: andere processen kunnen het nog
+        gemapt hebben en blijven het oude segment tot hun herstart gebruiken.
+        """
+        logger.warning(
+            "mmap-cache %s heeft een andere indeling dan %d slots van %d bytes; nieuw segment aangemaakt",
+            self._path, self._slots, self._slot_size,
+        )
+        temporary = f"{self._path}.{os.getpid()}.tmp"
+        fd = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, self._size)
+            os.pwrite(fd, header, 0)
+        finally:
+            os.close(fd)
+        os.replace(temporary, self._path)
+
+    def _offset(self, index):
+        return _FILE_HEADER_SIZE + index * self._slot_size
+
+    def _candidates(self, digest):
+        start = int.from_bytes(digest[:8], "little") % self._slots
+        return [(start + i) % self._slots for i in range(_PROBES)]
+
+    def _lock_slot(self, index, exclusive):
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        fcntl.lockf(self._fd, mode, self._slot_size, self._offset(index), os.SEEK_SET)
+
+    def _unlock_slot(self, index):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, self._slot_size, self._offset(index), os.SEEK_SET)
+
+    def _read_header(self, segment, index):
+        return _SLOT_HEADER.unpack_from(segment, self._offset(index))
+
+    # ------------------------------------------------------------------
+    # Sleutels en waarden
+    # ------------------------------------------------------------------
+    def _digest(self, key, version):
+        key = self.make_and_validate_key(key, version=version)
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+    def _expiry(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        return 0.0 if timeout is None else time.time() + timeout
+
+    @staticmethod
+    def _is_live(expires):
+        return expires == 0.0 or expires > time.time()
+
+    def _find(self, segment, digest):
+        """Geef (index, payload) van een geldig slot met deze digest, of (None, None)."""
+        for index in self._candidates(digest):
+            self._lock_slot(index, exclusive=False)
+            try:
+                slot_digest, expires, length, checksum = self._read_header(segment, index)
+                if slot_digest != digest:
+                    continue
+                if not self._is_live(expires):
+                    return None, None
+                start = self._offset(index) + _SLOT_HEADER.size
+                payload = bytes(segment[start:start + length])
+            finally:
+                self._unlock_slot(index)
+            if zlib.crc32(payload) != checksum:
+                return None, None
+            return index, payload
+        return None, None
+
+    def _write(self, segment, digest, payload, expires, only_if_absent=False):
+        if _SLOT_HEADER.size + len(payload) > self._slot_size:
+            return False
+        candidates = self._candidates(digest)
+        # Alle kandidaten vergrendelen (in vaste volgorde, tegen deadlocks), zodat
+        # controleren en schrijven één atomaire stap is; nodig voor add()
+        locked = sorted(candidates)
+        for index in locked:
+            self._lock_slot(index, exclusive=True)
+        try:
+            target = None
+            for index in candidates:
+                slot_digest, slot_expires, _length, _checksum = self._read_header(segment, index)
+                if slot_digest == digest:
+                    if only_if_absent and self._is_live(slot_expires):
+                        return False
+                    target = index
+                    break
+                if target is None and (slot_digest == _EMPTY_DIGEST or not self._is_live(slot_expires)):
+                    target = index
+            if target is None:
+                # Alle kandidaten bezet: overschrijf het eerste slot
+                target = candidates[0]
+
+            offset = self._offset(target)
+            start = offset + _SLOT_HEADER.size
+            segment[start:start + len(payload)] = payload
+            _SLOT_HEADER.pack_into(segment, offset, digest, expires, len(payload), zlib.crc32(payload))
+        finally:
+            for index in locked:
+                self._unlock_slot(index)
+        return True
+
+    def _clear_slot(self, segment, index):
+        self._lock_slot(index, exclusive=True)
+        try:
+            _SLOT_HEADER.pack_into(segment, self._offset(index), _EMPTY_DIGEST, 0.0, 0, 0)
+        finally:
+            self._unlock_slot(index)
+
+    # ------------------------------------------------------------------
+    # BaseCache API
+    # ------------------------------------------------------------------
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        digest = self._digest(key, version)
+        payload = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            return self._write(self._segment(), digest, payload, self._expiry(timeout), only_if_absent=True)
+
+    def get(self, key, default=None, version=None):
+        digest = self._digest(key, version)
+        with self._lock:
+            _index, payload = self._find(self._segment(), digest)
+        if payload is None:
+            return default
+        return pickle.loads(zlib.decompress(payload))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        digest = self._digest(key, version)
+        payload = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._write(self._segment(), digest, payload, self._expiry(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        digest = self._digest(key, version)
+        with self._lock:
+            segment = self._segment()
+            index, payload = self._find(segment, digest)
+            if payload is None:
+                return False
+            return self._write(segment, digest, payload, self._expiry(timeout))
+
+    def delete(self, key, version=None):
+        digest = self._digest(key, version)
+        with self._lock:
+            segment = self._segment()
+            index, _payload = self._find(segment, digest)
+            if index is None:
+                return False
+            self._clear_slot(segment, index)
+            return True
+
+    def has_key(self, key, version=None):
+        digest = self._digest(key, version)
+        with self._lock:
+            _index, payload = self._find(self._segment(), digest)
+        return payload is not None
+
+    def clear(self):
+        with self._lock:
+            segment = self._segment()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                segment[_FILE_HEADER_SIZE:] = b"\x00" * (self._size - _FILE_HEADER_SIZE)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def close(self, **kwargs):
+        # Het segment blijft bewust open tussen requests; sluiten gebeurt bij procesafsluiting
+        pass
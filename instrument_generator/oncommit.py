@@ -0,0 +1,42 @@
+"""
+Module: instrument_generator/oncommit.py
+Beschrijving: Werk bundelen tot na de huidige transactie.
+
+`defer(name, items, flush)` verzamelt `items` in een batch per thread en
+roept `flush(batch)` één keer aan nadat de transactie is vastgelegd; buiten
+een transactie direct. Elke aanroep registreert een eigen on_commit-callback,
+maar alleen de eerste die na de commit draait vindt de batch gevuld; de rest
+doet niets. Na een rollback vervallen de callbacks en blijven de items in de
+batch staan: ze worden dan met de volgende transactie meegenomen. Gebruik het
+dus alleen voor werk dat onschadelijk is om te herhalen, zoals
+cache-invalidatie of het herberekenen van een zoekdocument.
+"""
+
+import threading
+from functools import partial
+
+from django.db import transaction
+
+_batches = threading.local()
+
+
+def _flush(name, flush):
+    batch = getattr(_batches, name, None)
+    if not batch:
+        return
+    # Eerst leegmaken: wat `flush` zelf plant, komt in een nieuwe batch
+    setattr(_batches, name, None)
+    flush(batch)
+
+
+def defer(name, items, flush):
+    """Voer `flush` met alle items van batch `name` uit na de huidige transactie."""
+    if not transaction.get_connection().in_atomic_block:
+        flush(set(items))
+        return
+    batch = getattr(_batches, name, None)
+    if batch is None:
+        batch = set()
+        setattr(_batches, name, batch)
+    batch.update(items)
+    transaction.on_commit(partial(_flush, name, flush))
@@ -0,0 +1,224 @@
+"""
+Module: instrument_generator/pagination.py
+Beschrijving: Keyset- (cursor-)paginering voor querysets.
+
+In plaats van OFFSET/LIMIT onthoudt de cursor de sorteerwaarden van de laatste
+(of eerste) rij van de huidige pagina. De volgende pagina is dan een
+WHERE (sortkey, pk) > (...) met LIMIT, zodat pagina N even snel is als pagina 1
+zolang er een index op de sorteervolgorde staat. Er wordt geen COUNT(*) per
+pagina uitgevoerd; `KeysetPage.count` is optioneel en op PostgreSQL een
+schatting uit de queryplanner.
+
+De volgorde wordt opgegeven als lijst van (veldnaam, aflopend) tuples en moet
+eindigen op een uniek veld (meestal "pk") zodat elke rij een vaste plek heeft.
+Velden mogen ook annotaties zijn.
+"""
+
+import base64
+import binascii
+import json
+import math
+from functools import cached_property
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+
+FORWARD = "n"
+BACKWARD = "p"
+LAST = "last"
+
+
+class InvalidCursor(ValueError):
+    """Een cursor uit de URL die niet (meer) te decoderen is."""
+
+
+def _field_for(queryset, name):
+    """Geef het (output)veld van een modelveld of annotatie, voor het decoderen."""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    opts = queryset.model._meta
+    if name == "pk":
+        return opts.pk
+    try:
+        return opts.get_field(name)
+    except FieldDoesNotExist as exc:
+        raise InvalidCursor(f"Onbekend sorteerveld: {name}") from exc
+
+
+def _value_of(obj, name):
+    return obj.pk if name == "pk" else getattr(obj, name)
+
+
+def encode_cursor(values, direction=FORWARD, number=None):
+    """Codeer sorteerwaarden als URL-veilige string."""
+    payload = {
+        "d": direction,
+        "v": [None if value is None else str(value) for value in values],
+        "n": number,
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, queryset, ordering):
+    """Decodeer een cursor naar (richting, waarden, paginanummer)."""
+    if cursor == LAST:
+        return LAST, None, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        direction, values, number = payload["d"], payload["v"], payload.get("n")
+    except (binascii.Error, ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursor("Ongeldige cursor") from exc
+    if direction not in (FORWARD, BACKWARD) or len(values) != len(ordering):
+        raise InvalidCursor("Ongeldige cursor")
+    try:
+        values = [
+            None if value is None else _field_for(queryset, name).to_python(value)
+            for (name, _descending), value in zip(ordering, values)
+        ]
+    except ValidationError as exc:
+        raise InvalidCursor("Ongeldige cursor") from exc
+    if number is not None and not isinstance(number, int):
+        number = None
+    return direction, values, number
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    Bouw de voorwaarde "rij komt na (of vóór) deze waarden" in de opgegeven
+    volgorde: (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    equal = Q()
+    for (name, descending), value in zip(ordering, values):
+        after = descending != forward
+        lookup = "gt" if after else "lt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def order_by(ordering, reverse=False):
+    """Zet (veld, aflopend) tuples om naar argumenten voor QuerySet.order_by."""
+    return [
+        f"-{name}" if descending != reverse else name
+        for name, descending in ordering
+    ]
+
+
+def estimate_count(queryset):
+    """
+    Aantal rijen van een queryset. Op PostgreSQL de schatting van de planner
+    (EXPLAIN, zonder de tabel te scannen); elders een gewone COUNT.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPage:
+    """
+    Eén pagina uit een keyset-paginering. Biedt dezelfde namen als Django's
+    Page waar dat kan (object_list, has_next, has_previous, number), maar
+    paginanummers zijn alleen bekend als je vanaf de eerste pagina bladert.
+    """
+
+    def __init__(self, object_list, queryset, ordering, per_page, has_next, has_previous, number):
+        # `rows` blijft de opgehaalde rijen (voor de cursors); object_list mag
+        # een view vervangen door bijvoorbeeld gegroepeerde of verrijkte objecten
+        self.rows = object_list
+        self.object_list = object_list
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.number = number
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _cursor_for(self, obj, direction, number):
+        return encode_cursor([_value_of(obj, name) for name, _ in self.ordering], direction, number)
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.rows:
+            return None
+        number = self.number + 1 if self.number else None
+        return self._cursor_for(self.rows[-1], FORWARD, number)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.rows:
+            return None
+        number = self.number - 1 if self.number else None
+        return self._cursor_for(self.rows[0], BACKWARD, number)
+
+    @property
+    def last_cursor(self):
+        return LAST if self._has_next else None
+
+    @cached_property
+    def count(self):
+        """(Geschat) totaal aantal rijen; alleen berekend als erom gevraagd wordt."""
+        return estimate_count(self.queryset)
+
+    @cached_property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+
+def paginate_keyset(queryset, ordering, cursor=None, per_page=10):
+    """
+    Geef één KeysetPage van `queryset` in de volgorde `ordering`. `cursor` is
+    None (eerste pagina), "last" (laatste pagina) of een waarde uit
+    next_cursor/previous_cursor. Een ongeldige cursor geeft de eerste pagina.
+    """
+    base = queryset.order_by()
+    try:
+        direction, values, number = decode_cursor(cursor, base, ordering) if cursor else (FORWARD, None, 1)
+    except InvalidCursor:
+        direction, values, number = FORWARD, None, 1
+
+    forward = direction == FORWARD
+    page_qs = base
+    if values is not None:
+        page_qs = page_qs.filter(keyset_filter(ordering, values, forward=forward))
+    rows = list(page_qs.order_by(*order_by(ordering, reverse=not forward))[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if forward:
+        has_next, has_previous = has_more, values is not None
+    else:
+        rows.reverse()
+        has_next, has_previous = direction != LAST, has_more
+    return KeysetPage(rows, base, ordering, per_page, has_next, has_previous, number)
@@ -71,6 +71,63 @@ else:
         }
     }
 
+# ------------------------------------------------------------------------------
+# CACHE
+# ------------------------------------------------------------------------------
+# Twee lagen (zie instrument_generator/cache.py): een kleine LRU-cache per
+# proces ("local") vóór een gedeelde backend ("default") die alle workers zien.
+# Kies de gedeelde backend met de env-variabele CACHE_BACKEND:
+#   `file`  (standaard) bestanden in CACHE_LOCATION
+#   `db`    databasetabel; eenmalig `python manage.py createcachetable` draaien
+#   `redis` lokale Redis op REDIS_URL; vereist het `redis`-pakket
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "file").lower()
+CACHE_TIMEOUT = int(os.environ.get("CACHE_TIMEOUT", "86400"))
+
+if CACHE_BACKEND == "file":
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION", "/tmp/instrument_generator_cache"),
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+elif CACHE_BACKEND == "db":
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "instrument_generator_cache",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+elif CACHE_BACKEND == "redis":
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/1"),
+    }
+else:
+    raise ImproperlyConfigured(f"Onbekende CACHE_BACKEND: {CACHE_BACKEND!r}")
+
+# Gerenderde previews staan daarnaast in een gedeeld mmap-segment dat alle
+# workers op dezelfde host delen (zie instrument_generator/mmap_cache.py).
+# Sleutels zijn content-hashes, dus invalidatie is niet nodig.
+PREVIEW_CACHE_PATH = os.environ.get(
+    "PREVIEW_CACHE_PATH",
+    "/dev/shm/instrument_generator_previews" if os.path.isdir("/dev/shm")
+    else "/tmp/instrument_generator_previews",
+)
+
+CACHES = {
+    "default": {**SHARED_CACHE, "TIMEOUT": CACHE_TIMEOUT},
+    "local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "instrument-generator-local",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+    "previews": {
+        "BACKEND": "instrument_generator.mmap_cache.MmapCache",
+        "LOCATION": PREVIEW_CACHE_PATH,
+        "TIMEOUT": None,
+        "OPTIONS": {"SLOTS": 4096, "SLOT_SIZE": 8192},
+    },
+}
+
 # ------------------------------------------------------------------------------
 # APPLICATIONS & MIDDLEWARE
 # ------------------------------------------------------------------------------
@@ -188,6 +245,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'instrument_generator.context_processors.sqlite_mode',
                 'instrument_generator.context_processors.approvals_enabled',
+                'instrument_generator.context_processors.approval_inbox_count',
             ],
         },
     },
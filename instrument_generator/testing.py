@@ -0,0 +1,158 @@
+"""
+Module: instrument_generator/testing.py
+Beschrijving: Hulpmiddelen voor tests die queryplannen en -aantallen controleren.
+
+`query_plan` geeft het plan van een queryset als lijst regels; `seq_scans`
+filtert daaruit de volledige tabelscans. Tests gebruiken
+`assert_no_seq_scan` om te voorkomen dat een belangrijke query ongemerkt zijn
+index verliest.
+
+- SQLite: EXPLAIN QUERY PLAN. "SCAN <tabel>" zonder "USING ... INDEX" is een
+  volledige tabelscan; "SEARCH" en scans over een (partiële) index zijn goed.
+- PostgreSQL: EXPLAIN (FORMAT JSON) met enable_seqscan uit. Met kleine
+  testdata kiest de planner anders altijd een Seq Scan; zo blijft alleen een
+  Seq Scan over als er geen bruikbare index is.
+
+`assert_constant_queries` vergelijkt de queries van dezelfde request bij een
+kleine en een tien keer grotere dataset. Groeit het aantal, dan is er een N+1;
+de foutmelding toont welke (genormaliseerde) queries vaker voorkwamen, met
+een voorbeeld van de volledige SQL.
+"""
+
+import json
+import re
+from collections import Counter
+
+from django.db import connections, transaction
+
+
+def _sqlite_plan(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def _postgres_plan(connection, sql, params):
+    lines = []
+
+    def walk(node, depth=0):
+        relation = node.get("Relation Name")
+        index = node.get("Index Name")
+        line = node["Node Type"]
+        if relation:
+            line += f" on {relation}"
+        if index:
+            line += f" using {index}"
+        lines.append("  " * depth + line)
+        for child in node.get("Plans", []):
+            walk(child, depth + 1)
+
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    walk(plan[0]["Plan"])
+    return lines
+
+
+def query_plan(queryset):
+    """Geef het queryplan van een queryset als lijst van regels."""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == "sqlite":
+        return _sqlite_plan(connection, sql, params)
+    if connection.vendor == "postgresql":
+        return _postgres_plan(connection, sql, params)
+    raise NotImplementedError(f"Geen queryplan-ondersteuning voor {connection.vendor}")
+
+
+def seq_scans(plan):
+    """De regels uit een plan die een volledige tabelscan zijn."""
+    scans = []
+    for line in plan:
+        text = line.strip()
+        if text.startswith("Seq Scan"):
+            scans.append(text)
+        elif text.startswith("SCAN ") and " USING " not in text:
+            # SQLite: "SCAN <tabel>" zonder index; subquery-scans ("SCAN (subquery-1)") tellen niet mee
+            if not text.startswith("SCAN ("):
+                scans.append(text)
+    return scans
+
+
+def assert_no_seq_scan(queryset, allow=()):
+    """
+    Faal als het plan van de queryset een volledige tabelscan bevat, behalve
+    over de tabellen in `allow` (bijvoorbeeld kleine opzoektabellen).
+    """
+    plan = query_plan(queryset)
+    offending = [
+        line for line in seq_scans(plan)
+        if not any(table in line.split() for table in allow)
+    ]
+    assert not offending, "Volledige tabelscan in queryplan:\n" + "\n".join(plan)
+    return plan
+
+
+def assert_no_sort(queryset):
+    """
+    Faal als de database voor de ORDER BY apart moet sorteren in plaats van
+    de volgorde van een index te volgen (belangrijk voor keyset-paginering).
+    """
+    plan = query_plan(queryset)
+    sorts = [
+        line for line in plan
+        if "TEMP B-TREE FOR ORDER BY" in line or line.strip().startswith(("Sort", "Incremental Sort"))
+    ]
+    assert not sorts, "Aparte sortering in queryplan:\n" + "\n".join(plan)
+    return plan
+
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"IN \((?:\?, )*\?\)")
+
+
+def normalize_sql(sql):
+    """Vervang literals en IN-lijsten door '?', zodat herhaalde queries gelijk worden."""
+    return _IN_LIST_RE.sub("IN (...)", _LITERAL_RE.sub("?", sql))
+
+
+def query_report(small, large):
+    """
+    Beschrijf het verschil tussen twee lijsten gevangen queries
+    (CaptureQueriesContext.captured_queries): welke queries bij de grote
+    dataset vaker voorkwamen, met de eerste volledige SQL als voorbeeld.
+    """
+    small_counts = Counter(normalize_sql(query["sql"]) for query in small)
+    large_counts = Counter(normalize_sql(query["sql"]) for query in large)
+    examples = {}
+    for query in large:
+        examples.setdefault(normalize_sql(query["sql"]), query["sql"])
+
+    lines = []
+    for sql, count in large_counts.most_common():
+        extra = count - small_counts.get(sql, 0)
+        if extra > 0:
+            lines.append(f"+{extra} ({small_counts.get(sql, 0)} -> {count}): {examples[sql]}")
+    lines.append(f"Alle {len(large)} queries bij de grote dataset:")
+    lines.extend(f"  {index}. {query['sql']}" for index, query in enumerate(large, start=1))
+    return "\n".join(lines)
+
+
+def assert_constant_queries(small, large, budget, label=""):
+    """
+    Faal als een request bij de grote dataset meer queries doet dan bij de
+    kleine, of meer dan het budget. `small` en `large` zijn de
+    captured_queries van twee metingen.
+    """
+    prefix = f"{label}: " if label else ""
+    assert len(large) <= len(small), (
+        f"{prefix}aantal queries groeit met de data ({len(small)} -> {len(large)}):\n"
+        + query_report(small, large)
+    )
+    assert len(large) <= budget, (
+        f"{prefix}{len(large)} queries, budget is {budget}:\n" + query_report([], large)
+    )
@@ -0,0 +1,326 @@
+"""
+Module: instrument_generator/tests.py
+Beschrijving: Querybudgetten voor alle views van instruments, approvals,
+accounts en mailer.
+
+Elke view wordt twee keer aangeroepen: met N en met 10·N objecten van elke
+soort (submissions, indieners, notities, versies, goedkeuringsverzoeken,
+groepsleden en beoordelaars). Het aantal queries moet gelijk blijven en binnen
+het budget van de view vallen. Een nieuwe URL zonder budget laat
+test_every_url_has_a_budget falen.
+"""
+
+import importlib.util
+import re
+import shutil
+from datetime import date
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from approvals import inbox
+from approvals.models import ApprovalGroup, ApprovalLog, ApprovalRequest
+from instrument_generator.testing import assert_constant_queries
+from instruments.models import InstrumentSubmission, InstrumentVersion, Note, Submitter
+
+User = get_user_model()
+
+N = 2
+APPS = ("instruments", "approvals", "accounts", "mailer")
+
+
+def _submission_post(world):
+    return {
+        "instrument": "Motie",
+        "subject": "Budget",
+        "date": "2025-04-19",
+        "considerations": "Overweging",
+        "requests": "Verzoek",
+        "submitters-TOTAL_FORMS": "1",
+        "submitters-INITIAL_FORMS": "0",
+        "submitters-MIN_NUM_FORMS": "0",
+        "submitters-MAX_NUM_FORMS": "1000",
+        "submitters-0-initials": "A.",
+        "submitters-0-lastname": "Jansen",
+        "submitters-0-party": "D66",
+    }
+
+
+def _bulk_review_post(world):
+    # Alle openstaande verzoeken; de goedkeuring beslist niets, want de groep heeft meer leden
+    pending = ApprovalRequest.objects.filter(status="PENDING").values_list("pk", flat=True)
+    return {"requests": list(pending), "decision": "approve", "comment": "Akkoord"}
+
+
+def _bulk_reject_post(world):
+    # Eén afwijzing beslist het verzoek: alle geselecteerde verzoeken worden afgerond
+    return {**_bulk_review_post(world), "decision": "reject", "comment": "Niet akkoord"}
+
+
+def _bulk_request_post(world):
+    # Nieuwe submissions in verhouding tot de wereld, zodat een N+1 opvalt
+    submissions = [world._submission(f"Bulk {i}") for i in range(world.size)]
+    return {
+        "submissions": [submission.pk for submission in submissions],
+        "required_groups": [world.group.pk],
+        "request_comment": "Graag",
+    }
+
+
+def _bulk_request_tasks(world):
+    # Eén taak per nieuw verzoek per groepslid (de aanvrager is geen lid)
+    return world.size * world.group.members.count()
+
+
+def _compare_query(world):
+    return {"versions": [world.history[0].pk, world.history[-1].pk]}
+
+
+# (URL-naam, methode) -> budget. Optioneel per budget:
+# - kwargs: URL-argumenten als naam van een object uit World.targets()
+# - user: "owner" (standaard), "reviewer" of None (niet ingelogd)
+# - data: functie(world) -> POST-data of GET-parameters
+# - status: verwachte statuscode (standaard 200)
+# - batches: (tabel, functie(world) -> aantal rijen, batchgrootte) voor een
+#   insert die bewust in batches gaat; het budget geldt voor één batch, elke
+#   volgende batch kost precies één insert extra
+# - requires: externe afhankelijkheid die hier aanwezig moet zijn
+# - known_issue: bekende N+1 die nog opgelost moet worden (strikte xfail, dus
+#   de test faalt zodra het probleem weg is en de markering vergeten wordt)
+BUDGETS = {
+    # instruments
+    ("instrument_submission_list", "get"): {"queries": 8},
+    ("instrument_submission_create", "get"): {"queries": 4},
+    ("instrument_submission_create", "post"): {"queries": 5, "data": _submission_post, "status": 302},
+    ("instrument_submission_detail", "get"): {"queries": 10, "kwargs": {"pk": "submission"}},
+    ("instrument_submission_detail", "post"): {
+        "queries": 4, "kwargs": {"pk": "submission"}, "data": lambda world: {"text": "Notitie"}, "status": 302,
+    },
+    ("instrument_submission_live_preview", "post"): {"queries": 2, "data": _submission_post},
+    ("instrument_submission_edit", "get"): {"queries": 9, "kwargs": {"pk": "submission"}},
+    ("instrument_submission_edit", "post"): {
+        "queries": 6, "kwargs": {"pk": "scratch_submission"}, "data": _submission_post, "status": 302,
+    },
+    ("instrument_submission_delete", "post"): {"queries": 24, "kwargs": {"pk": "scratch_submission"}, "status": 302},
+    ("instrument_submission_export", "get"): {"queries": 4},
+    ("instrument_submission_export_pdf", "get"): {"queries": 4, "requires": "weasyprint"},
+    ("submission_preview_pdf", "get"): {"queries": 4, "kwargs": {"pk": "submission"}, "requires": "weasyprint"},
+    ("submission_notes", "get"): {"queries": 5, "kwargs": {"pk": "submission"}},
+    ("note_edit", "get"): {"queries": 6, "kwargs": {"pk": "scratch_note"}},
+    ("note_delete", "post"): {"queries": 4, "kwargs": {"pk": "scratch_note"}, "status": 302},
+    ("instrument_submission_export_docx", "get"): {"queries": 4, "kwargs": {"pk": "submission"}},
+    ("instrument_submission_export_latex", "get"): {
+        "queries": 4, "kwargs": {"pk": "submission"}, "requires": "pdflatex",
+    },
+    ("instrument_submission_export_latex_source", "get"): {"queries": 4, "kwargs": {"pk": "submission"}},
+    ("instrument_submission_export_zip", "get"): {"queries": 4, "kwargs": {"pk": "submission"}},
+    ("instrument_email_export", "post"): {
+        "queries": 6, "kwargs": {"pk": "submission"}, "data": lambda world: {"format": "txt"}, "status": 302,
+    },
+    # approvals
+    ("approvals:dashboard", "get"): {"queries": 7, "user": "reviewer"},
+    ("approvals:dashboard", "get", "reviewed"): {
+        "queries": 10, "user": "reviewer", "data": lambda world: {"tab": "reviewed"},
+    },
+    ("approvals:request_detail", "get"): {"queries": 12, "kwargs": {"pk": "request"}, "user": "reviewer"},
+    ("approvals:create_request", "get"): {"queries": 9, "kwargs": {"submission_pk": "submission"}},
+    ("approvals:create_request", "post"): {
+        "queries": 22, "kwargs": {"submission_pk": "submission"}, "status": 302,
+        "data": lambda world: {"required_groups": [world.group.pk], "request_comment": "Graag"},
+    },
+    ("approvals:bulk_create_request", "get"): {"queries": 6},
+    ("approvals:bulk_create_request", "post"): {
+        "queries": 22, "status": 302, "data": _bulk_request_post,
+        "batches": ("approvals_reviewertask", _bulk_request_tasks, inbox.BATCH_SIZE),
+    },
+    ("approvals:approve_request", "post"): {
+        "queries": 22, "kwargs": {"pk": "scratch_request"}, "user": "reviewer", "status": 302,
+        "data": lambda world: {"comment": "Akkoord"},
+    },
+    ("approvals:reject_request", "post"): {
+        "queries": 29, "kwargs": {"pk": "scratch_request"}, "user": "reviewer", "status": 302,
+        "data": lambda world: {"comment": "Niet akkoord"},
+    },
+    ("approvals:bulk_review", "post"): {
+        "queries": 19, "user": "reviewer", "status": 302, "data": _bulk_review_post,
+    },
+    ("approvals:bulk_review", "post", "decided"): {
+        "queries": 24, "user": "reviewer", "status": 302, "data": _bulk_reject_post,
+    },
+    ("approvals:analytics", "get"): {"queries": 6, "user": "reviewer"},
+    ("approvals:compare_versions", "get"): {"queries": 11, "user": "reviewer", "data": _compare_query},
+    # accounts
+    ("accounts:activate", "get"): {
+        "queries": 4, "kwargs": {"uidb64": "uidb64", "token": "token"}, "user": None, "status": 302,
+    },
+    ("accounts:login", "get"): {"queries": 0, "user": None},
+    ("accounts:logout", "post"): {"queries": 4, "status": 302},
+    ("accounts:password_reset", "get"): {"queries": 0, "user": None},
+    ("accounts:register", "get"): {"queries": 1, "user": None},
+    ("accounts:password_reset_done", "get"): {"queries": 0, "user": None},
+    ("accounts:password_reset_confirm", "get"): {
+        "queries": 5, "kwargs": {"uidb64": "uidb64", "token": "token"}, "user": None, "status": 302,
+    },
+    ("accounts:password_reset_complete", "get"): {"queries": 0, "user": None},
+    ("accounts:profile", "get"): {"queries": 4},
+    ("accounts:edit_profile", "get"): {"queries": 5},
+    ("accounts:email_profile_info", "get"): {"queries": 3, "status": 302},
+}
+
+
+class World:
+    """Testdata die per stap met dezelfde hoeveelheid van elke soort groeit."""
+
+    def __init__(self):
+        self.size = 0
+        self.owner = self._user("owner@example.com", "Eigenaar")
+        self.reviewer = self._user("reviewer@example.com", "Beoordelaar")
+        self.reviewers = Group.objects.get(name="Reviewers")
+        self.reviewers.user_set.add(self.reviewer)
+        self.group = ApprovalGroup.objects.create(name="Juridisch")
+        self.group.members.add(self.reviewer)
+        self.submission = self._submission("Hoofdonderwerp")
+        self.history = []
+
+    def _user(self, email, last_name):
+        # Zonder wachtwoord: force_login heeft het niet nodig en hashen is traag
+        return User.objects.create(
+            email=email, initials="T.", last_name=last_name, is_active=True, is_approved=True,
+        )
+
+    def _submission(self, subject):
+        submission = InstrumentSubmission.objects.create(
+            owner=self.owner, instrument="Motie", subject=subject, date=date(2025, 4, 19),
+        )
+        Submitter.objects.create(submission=submission, initials="A.", lastname="Jansen", party="D66")
+        Submitter.objects.create(submission=submission, initials="B.", lastname="de Vries", party="PvdA")
+        return submission
+
+    def _request(self, submission, status="PENDING"):
+        request = ApprovalRequest.objects.create(submission=submission, requester=self.owner, status=status)
+        request.required_groups.add(self.group)
+        request.initialize_group_approvals()
+        ApprovalLog.objects.create(approval=request, user=self.owner, action="submitted")
+        return request
+
+    def grow(self, size):
+        for i in range(self.size, size):
+            submission = self._submission(f"Onderwerp {i}")
+            Note.objects.create(submission=submission, user=self.owner, text=f"Notitie {i}")
+            Note.objects.create(submission=self.submission, user=self.owner, text=f"Notitie bij hoofd {i}")
+            InstrumentVersion.create_from_submission(self.submission)
+
+            # Meer groepsleden en beoordelaars
+            member = self._user(f"member{i}@example.com", f"Lid {i}")
+            self.group.members.add(member)
+            self.reviewers.user_set.add(member)
+
+            # Een openstaand verzoek per submission en beoordeelde verzoeken op de hoofdsubmission
+            self._request(submission)
+            self.history.append(self._request(self.submission, "APPROVED" if i % 2 else "REJECTED"))
+        self.size = size
+
+    def targets(self):
+        """Objecten voor de URL-argumenten; verbruikbare objecten zijn per meting nieuw."""
+        scratch_submission = self._submission("Wegwerp")
+        return {
+            "submission": self.submission.pk,
+            "request": self.history[-1].pk,
+            "scratch_submission": scratch_submission.pk,
+            "scratch_note": Note.objects.create(submission=self.submission, user=self.owner, text="Weg").pk,
+            "scratch_request": self._request(scratch_submission).pk,
+            "uidb64": urlsafe_base64_encode(force_bytes(self.owner.pk)),
+            "token": default_token_generator.make_token(self.owner),
+        }
+
+
+def _available(requirement):
+    if requirement == "pdflatex":
+        return shutil.which("pdflatex") is not None
+    try:
+        importlib.import_module(requirement)
+    except (ImportError, OSError):
+        # weasyprint geeft een OSError als de systeembibliotheken ontbreken
+        return False
+    return True
+
+
+def _measure(client, world, key, budget):
+    url_name, method = key[:2]
+    targets = world.targets()
+    url = reverse(url_name, kwargs={
+        name: targets[target] for name, target in budget.get("kwargs", {}).items()
+    })
+    user = budget.get("user", "owner")
+    client.logout()
+    if user:
+        client.force_login(getattr(world, user))
+    data = budget["data"](world) if "data" in budget else {}
+    if "batches" in budget:
+        table, rows, batch_size = budget["batches"]
+        extra_batches = -(-rows(world) // batch_size) - 1
+    # Koude caches, zodat beide metingen alle queries van de view zien
+    for cache in caches.all(initialized_only=True):
+        cache.clear()
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = getattr(client, method)(url, data)
+    assert response.status_code == budget.get("status", 200), f"{url_name}: {response.status_code}"
+    if "batches" in budget:
+        return _without_extra_batches(ctx.captured_queries, table, extra_batches)
+    return ctx.captured_queries
+
+
+def _without_extra_batches(queries, table, count):
+    """Laat de inserts in `table` na de eerste weg; het moeten er precies `count` zijn."""
+    insert = re.compile(rf'^INSERT (OR IGNORE )?INTO "{table}"')
+    inserts = [i for i, query in enumerate(queries) if insert.match(query["sql"])]
+    assert len(inserts) == count + 1, f"{len(inserts)} inserts in {table}, verwacht {count + 1}"
+    extra = set(inserts[1:])
+    return [query for i, query in enumerate(queries) if i not in extra]
+
+
+def _url_names(app):
+    module = f"{app}.urls"
+    if importlib.util.find_spec(module) is None:
+        return set()
+    urlconf = importlib.import_module(module)
+    prefix = f"{urlconf.app_name}:" if getattr(urlconf, "app_name", None) else ""
+    return {f"{prefix}{pattern.name}" for pattern in urlconf.urlpatterns if pattern.name}
+
+
+def test_every_url_has_a_budget():
+    budgeted = {key[0] for key in BUDGETS}
+    missing = set().union(*(_url_names(app) for app in APPS)) - budgeted
+    assert not missing, f"Geen querybudget voor: {sorted(missing)}"
+
+
+def _budget_params():
+    for key, budget in BUDGETS.items():
+        marks = []
+        if "known_issue" in budget:
+            marks.append(pytest.mark.xfail(reason=budget["known_issue"], strict=True))
+        yield pytest.param(key, id=" ".join(key), marks=marks)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("key", _budget_params())
+def test_query_budget(client, key):
+    budget = BUDGETS[key]
+    if "requires" in budget and not _available(budget["requires"]):
+        pytest.skip(f"{budget['requires']} is niet beschikbaar")
+
+    world = World()
+    world.grow(N)
+    small = _measure(client, world, key, budget)
+    world.grow(10 * N)
+    large = _measure(client, world, key, budget)
+    assert_constant_queries(small, large, budget["queries"], label=" ".join(key))
@@ -8,4 +8,8 @@ from django.apps import AppConfig
 
 class InstrumentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'instruments'
\ No newline at end of file
+    name = 'instruments'
+
+    def ready(self):
+        # Registreer de cache-invalidatie signals
+        import instruments.signals
\ No newline at end of file
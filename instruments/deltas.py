@@ -0,0 +1,63 @@
+"""
+Module: instruments/deltas.py
+Beschrijving: Inhoudshashes en compacte tekstdelta's voor InstrumentVersion.
+
+- `content_hash`: SHA-256 over de volledige inhoud van een momentopname. Een
+  nieuwe versie met dezelfde hash als een bestaande versie van dezelfde
+  submission wordt niet opnieuw opgeslagen.
+- `make_delta` / `apply_delta`: een tekst als verschil ten opzichte van een
+  basistekst, per regel. Een delta is een JSON-lijst met [begin, eind]
+  (regels uit de basis overnemen) en strings (nieuwe tekst). Een delta wordt
+  alleen gebruikt als die kleiner is dan de tekst zelf.
+
+De basis van een delta is altijd een volledig opgeslagen versie (een
+"keyframe"), zodat reconstructie hooguit één extra rij nodig heeft.
+"""
+
+import difflib
+import hashlib
+import json
+
+# Na zoveel delta's op dezelfde basis wordt weer een volledige versie opgeslagen
+KEYFRAME_INTERVAL = 20
+
+# Velden die als delta opgeslagen kunnen worden
+DELTA_FIELDS = ("considerations", "requests")
+
+
+def content_hash(instrument, subject, date, considerations, requests, submitters_data):
+    """Hash van de inhoud van een versie (onafhankelijk van hoe die is opgeslagen)."""
+    payload = json.dumps(
+        [instrument, subject, str(date), considerations, requests, submitters_data],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_delta(base, text):
+    """Delta van `text` ten opzichte van `base`, of None als die niet kleiner is."""
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    delta = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append("".join(lines[j1:j2]))
+    encoded = json.dumps(delta, ensure_ascii=False, separators=(",", ":"))
+    return delta if len(encoded) < len(text) else None
+
+
+def apply_delta(base, delta):
+    """Reconstrueer de tekst uit de basistekst en een delta van `make_delta`."""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in delta:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return "".join(parts)
@@ -11,9 +11,6 @@ from django.template.loader import render_to_string
 from django.contrib import messages
 from django.urls import reverse_lazy
 
-# Import weasyprint voor PDF-generatie
-from weasyprint import HTML
-
 from instruments.models import InstrumentSubmission
 from instruments.exports.generators import generate_export_file, generate_export_file_and_body
 from instruments.exports.responses import serve_export_file, export_submission_zip_response
@@ -36,13 +33,15 @@ def export_submissions_csv(request):
     writer.writerow(["Onderwerp", "Instrument", "Datum", "Laatst bewerkt", "Aantal indieners", "Indieners"])
 
     for submission in queryset:
-        indieners = ", ".join(f"{s.initials} {s.lastname}" for s in submission.submitters.all())
+        # Uit de prefetch van de list view; geen extra query per rij
+        submitters = submission.submitters.all()
+        indieners = ", ".join(f"{s.initials} {s.lastname}" for s in submitters)
         writer.writerow([
             submission.subject,
             submission.instrument,
             submission.date.strftime('%Y-%m-%d'),
             submission.updated_at.strftime('%Y-%m-%d %H:%M'),
-            submission.submitters.count(),
+            len(submitters),
             indieners
         ])
     return response
@@ -61,6 +60,9 @@ def export_submissions_pdf(request):
         "filters": request.GET,
     })
 
+    # Pas hier importeren: weasyprint laadt bij import de systeembibliotheken
+    # (pango), die niet nodig zijn voor de andere views in deze module
+    from weasyprint import HTML
     pdf_file = HTML(string=html_string).write_pdf()
 
     response = HttpResponse(pdf_file, content_type="application/pdf")
@@ -136,5 +138,5 @@ def email_export(request, pk):
         body=body
     )
 
-    messages.success(request, f"De e-mail is succesvol verstuurd naar {user.email}.")
+    messages.success(request, f"De e-mail wordt verstuurd naar {user.email}.")
     return redirect("instrument_submission_detail", pk=pk)
\ No newline at end of file
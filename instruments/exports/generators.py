@@ -1,30 +1,61 @@
 # instruments/exports/generators.py
 
+import hashlib
+from functools import lru_cache
 from pathlib import Path
 import tempfile
 import subprocess
 import shutil
 from django.template.loader import render_to_string
 from docxtpl import DocxTemplate
-from weasyprint import HTML
-from instruments.exports.compose_text import process_gui_data
+from instrument_generator import cache
+from instruments.previews import (
+    get_preview_data, render_preview, _renderer_revision, PREVIEW_HTML_TEMPLATE, PREVIEW_TXT_TEMPLATE,
+)
 import logging
 logger = logging.getLogger(__name__)
 
+_DOCX_TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "instruments" / "docx_templates"
+
+
+@lru_cache(maxsize=1)
+def _export_revision():
+    """
+    Revisie van alles waarmee een export wordt gemaakt: de previewrenderer,
+    deze module en de .docx-templates. Hoort in de cachesleutel, zodat een
+    deploy nooit oude exports uit de gedeelde cache oplevert.
+    """
+    digest = hashlib.sha256(_renderer_revision().encode("utf-8"))
+    digest.update(Path(__file__).read_bytes())
+    for path in sorted(_DOCX_TEMPLATE_DIR.glob("*.docx")):
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
 
 def generate_export_file(submission, export_type):
-    table_data = [[s.initials, s.lastname, s.party] for s in submission.submitters.all()]
-    data = process_gui_data(
-        table_data=table_data,
-        instrument=submission.instrument,
-        subject=submission.subject,
-        date_str=submission.date.isoformat(),
-        considerations=submission.considerations,
-        requests=submission.requests
+    """
+    Genereer een exportbestand als (filename, content, mimetype).
+    Het resultaat wordt per submission gecachet; de signals in
+    instruments/signals.py maken de cache ongeldig zodra de submission wijzigt.
+    Alleen in de gedeelde laag: binaire bestanden horen niet in het geheugen
+    van elk proces.
+    """
+    return cache.get_or_set(
+        cache.namespace_for(submission),
+        f"export:{_export_revision()}:{export_type}",
+        lambda: _render_export_file(submission, export_type),
+        local=False,
     )
 
+
+def _render_export_file(submission, export_type):
+    data = get_preview_data(submission)
+
     if export_type == "pdf":
         html_string = render_to_string("instruments/previews/template.html", data)
+        # Pas hier importeren: weasyprint laadt bij import de systeembibliotheken (pango)
+        from weasyprint import HTML
         pdf_file = HTML(string=html_string).write_pdf()
         return "instrument.pdf", pdf_file, "application/pdf"
 
@@ -120,18 +151,8 @@ def generate_export_file(submission, export_type):
 
 
 def generate_export_file_and_body(submission, export_type):
-    table_data = [[s.initials, s.lastname, s.party] for s in submission.submitters.all()]
-    data = process_gui_data(
-        table_data=table_data,
-        instrument=submission.instrument,
-        subject=submission.subject,
-        date_str=submission.date.isoformat(),
-        considerations=submission.considerations,
-        requests=submission.requests,
-    )
-
-    body_template = "instruments/previews/template.txt" if export_type == "txt" else "instruments/previews/template.html"
-    body = render_to_string(body_template, data)
+    body_template = PREVIEW_TXT_TEMPLATE if export_type == "txt" else PREVIEW_HTML_TEMPLATE
+    body = render_preview(submission, body_template)
 
     filename, content, mimetype = generate_export_file(submission, export_type)
     return filename, content, mimetype, body
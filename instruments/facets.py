@@ -0,0 +1,136 @@
+"""
+Module: instruments/facets.py
+Beschrijving: Facetfilters voor de lijst met submissions (instrument, maand en
+partij) met het aantal submissions per waarde.
+
+Alle tellingen komen uit één query: per facet een GROUP BY, samengevoegd met
+UNION ALL. Elk facet wordt geteld met alle actieve filters behalve zijn eigen
+filter, zodat de andere waarden van dat facet zichtbaar blijven. Het resultaat
+wordt per gebruiker gecachet in de namespace uit `facet_namespace`; de signals
+in instruments/signals.py maken die ongeldig bij elke wijziging van een
+submission of indiener van die gebruiker.
+"""
+
+import hashlib
+import json
+import re
+
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast, TruncMonth
+
+from instrument_generator import cache
+from instruments.exports.compose_text import MONTHS_NL
+from instruments.models import Submitter
+
+FACETS = ("instrument", "month", "party")
+
+_MONTH_RE = re.compile(r"^(\d{4})-(\d{2})$")
+
+
+def facet_namespace(user_id):
+    """Cache-namespace met de facettellingen van één gebruiker."""
+    return f"instruments.facets:{user_id}"
+
+
+def selected_facets(params):
+    """Lees de gekozen facetwaarden uit de GET-parameters; ongeldige waarden vervallen."""
+    selected = {}
+    instrument = params.get("instrument", "").strip()
+    if instrument:
+        selected["instrument"] = instrument
+    month = params.get("month", "").strip()
+    match = _MONTH_RE.match(month)
+    if match and 1 <= int(match.group(2)) <= 12:
+        selected["month"] = month
+    party = params.get("party", "").strip()
+    if party:
+        selected["party"] = party
+    return selected
+
+
+def apply_facets(queryset, selected, exclude=None):
+    """Filter een queryset op de gekozen facetwaarden, eventueel zonder één facet."""
+    for name, value in selected.items():
+        if name == exclude:
+            continue
+        if name == "instrument":
+            queryset = queryset.filter(instrument__iexact=value)
+        elif name == "month":
+            year, month = value.split("-")
+            queryset = queryset.filter(date__year=int(year), date__month=int(month))
+        elif name == "party":
+            # Subquery in plaats van een join: geen dubbele rijen bij meerdere indieners
+            queryset = queryset.filter(
+                pk__in=Submitter.objects.filter(party=value).values("submission_id")
+            )
+    return queryset
+
+
+def _grouped(queryset, name, expression, distinct=False):
+    return (
+        queryset.order_by()
+        .annotate(facet=Value(name, output_field=CharField()), value=expression)
+        .values("facet", "value")
+        .annotate(count=Count("pk", distinct=distinct))
+    )
+
+
+def facet_counts(queryset, selected):
+    """
+    Tel per facetwaarde het aantal submissions in `queryset` (al gefilterd op
+    eigenaar, zoekterm en datum). Geeft {"instrument": [(waarde, aantal), ...], ...}.
+    """
+    def base(name):
+        return apply_facets(queryset, selected, exclude=name)
+
+    query = _grouped(base("instrument"), "instrument", F("instrument")).union(
+        _grouped(base("month"), "month", Cast(TruncMonth("date"), CharField())),
+        # Een submission telt één keer per partij, ook met meerdere indieners daarvan
+        _grouped(base("party"), "party", F("submitters__party"), distinct=True),
+        all=True,
+    )
+    counts = {name: [] for name in FACETS}
+    for row in query:
+        value = row["value"]
+        if not value:
+            continue
+        if row["facet"] == "month":
+            value = value[:7]
+        counts[row["facet"]].append((value, row["count"]))
+
+    counts["instrument"].sort(key=lambda item: item[0].lower())
+    counts["month"].sort(reverse=True)
+    counts["party"].sort(key=lambda item: item[0].lower())
+    return counts
+
+
+def facet_choices(counts):
+    """Zet de tellingen om naar keuzes voor de template, met leesbare maandnamen."""
+    choices = {}
+    for name, values in counts.items():
+        choices[name] = []
+        for value, count in values:
+            label = value
+            if name == "month":
+                year, month = value.split("-")
+                label = f"{MONTHS_NL[int(month)]} {year}"
+            choices[name].append({"value": value, "label": label, "count": count})
+    return choices
+
+
+def cached_facet_counts(user, queryset, selected, params):
+    """
+    Gecachte variant van facet_counts. De sleutel bevat alle parameters die
+    het resultaat bepalen; de namespace wordt ongeldig bij elke wijziging.
+    """
+    relevant = {
+        key: params.get(key, "").strip()
+        for key in ("q", "date_from", "date_to")
+    }
+    relevant.update(selected)
+    digest = hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+    return cache.get_or_set(
+        facet_namespace(user.pk),
+        f"counts:{digest}",
+        lambda: facet_counts(queryset, selected),
+    )
@@ -0,0 +1,35 @@
+"""
+Management command om de zoekdocumenten (SubmissionSearchDocument) opnieuw op
+te bouwen, bijvoorbeeld na een bulk-import die geen signals verstuurt.
+
+Gebruik:
+python manage.py rebuild_search_index            # alle submissions
+python manage.py rebuild_search_index --ids 3 7  # alleen deze submissions
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from instruments.models import InstrumentSubmission
+from instruments.search import refresh_search_document
+
+
+class Command(BaseCommand):
+    help = "Bouwt de zoekdocumenten van submissions opnieuw op."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ids",
+            nargs="+",
+            type=int,
+            help="Alleen de submissions met deze id's opnieuw opbouwen.",
+        )
+
+    def handle(self, *args, **options):
+        ids = options["ids"] or InstrumentSubmission.objects.order_by("pk").values_list("pk", flat=True).iterator()
+        count = 0
+        for submission_id in ids:
+            with transaction.atomic():
+                refresh_search_document(submission_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"{count} zoekdocumenten bijgewerkt."))
@@ -0,0 +1,133 @@
+# Generated by Django 5.2 on 2026-10-19 15:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
+from django.db.models.functions import Upper
+
+# Bevroren kopieën uit instruments/search.py (stand van deze migratie); latere
+# wijzigingen aan die module mogen de migratiegeschiedenis niet veranderen.
+FTS_TABLE = "instruments_submissionsearch_fts"
+SEARCH_CONFIG = "dutch"
+
+BATCH_SIZE = 1000
+
+
+def document_fields(submission, submitters, notes):
+    names = " ".join(
+        " ".join(part for part in (s.initials, s.lastname, s.party) if part)
+        for s in submitters
+    )
+    return {
+        "title": " ".join(part for part in (submission.instrument, submission.subject, names) if part),
+        "body": "\n".join(part for part in (submission.considerations, submission.requests) if part),
+        "notes": "\n".join(note.text for note in notes),
+    }
+
+
+def postgres_indexes():
+    vector = (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("body", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("notes", weight="C", config=SEARCH_CONFIG)
+    )
+    return [
+        GinIndex(vector, name="instruments_search_vector_gin"),
+        GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="instruments_search_title_trgm"),
+    ]
+
+FTS_TRIGGERS = {
+    "ai": "AFTER INSERT ON {doc} BEGIN "
+          "INSERT INTO {fts}(rowid, title, body, notes) VALUES (new.submission_id, new.title, new.body, new.notes); "
+          "END",
+    "ad": "AFTER DELETE ON {doc} BEGIN "
+          "INSERT INTO {fts}({fts}, rowid, title, body, notes) VALUES ('delete', old.submission_id, old.title, old.body, old.notes); "
+          "END",
+    "au": "AFTER UPDATE ON {doc} BEGIN "
+          "INSERT INTO {fts}({fts}, rowid, title, body, notes) VALUES ('delete', old.submission_id, old.title, old.body, old.notes); "
+          "INSERT INTO {fts}(rowid, title, body, notes) VALUES (new.submission_id, new.title, new.body, new.notes); "
+          "END",
+}
+
+
+def build_documents(apps, schema_editor):
+    InstrumentSubmission = apps.get_model("instruments", "InstrumentSubmission")
+    SubmissionSearchDocument = apps.get_model("instruments", "SubmissionSearchDocument")
+    submissions = InstrumentSubmission.objects.using(schema_editor.connection.alias).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(submissions.filter(pk__gt=last_pk).prefetch_related("submitters", "notes")[:BATCH_SIZE])
+        if not batch:
+            break
+        SubmissionSearchDocument.objects.using(schema_editor.connection.alias).bulk_create([
+            SubmissionSearchDocument(
+                submission=submission,
+                **document_fields(
+                    submission,
+                    sorted(submission.submitters.all(), key=lambda s: s.pk),
+                    sorted(submission.notes.all(), key=lambda n: (n.created_at, n.pk)),
+                ),
+            )
+            for submission in batch
+        ])
+        last_pk = batch[-1].pk
+
+
+def create_search_indexes(apps, schema_editor):
+    SubmissionSearchDocument = apps.get_model("instruments", "SubmissionSearchDocument")
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for index in postgres_indexes():
+            schema_editor.add_index(SubmissionSearchDocument, index)
+    elif vendor == "sqlite":
+        doc = SubmissionSearchDocument._meta.db_table
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"title, body, notes, content='{doc}', content_rowid='submission_id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite zonder FTS5: search_submissions valt terug op icontains
+            return
+        for suffix, body in FTS_TRIGGERS.items():
+            schema_editor.execute(f"CREATE TRIGGER {FTS_TABLE}_{suffix} " + body.format(doc=doc, fts=FTS_TABLE))
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_indexes(apps, schema_editor):
+    SubmissionSearchDocument = apps.get_model("instruments", "SubmissionSearchDocument")
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for index in postgres_indexes():
+            schema_editor.remove_index(SubmissionSearchDocument, index)
+    elif vendor == "sqlite":
+        for suffix in FTS_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instruments', '0002_instrumentversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionSearchDocument',
+            fields=[
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='instruments.instrumentsubmission')),
+                ('title', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('notes', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 15:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instruments', '0003_submissionsearchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='instrumentsubmission',
+            index=models.Index(fields=['owner', '-updated_at', '-id'], name='submission_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instrumentsubmission',
+            index=models.Index(fields=['owner', '-date', '-id'], name='submission_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instrumentsubmission',
+            index=models.Index(fields=['owner', 'subject', 'id'], name='submission_owner_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instrumentsubmission',
+            index=models.Index(fields=['owner', 'instrument', 'id'], name='submission_owner_instr_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instrumentversion',
+            index=models.Index(fields=['submission', '-created_at'], name='version_submission_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['submission', '-created_at', '-id'], name='note_submission_created_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2 on 2026-10-19 16:18
+
+from django.db import migrations, models
+
+from django.template.loader import render_to_string
+
+from instruments.exports.compose_text import process_gui_data
+
+BATCH_SIZE = 500
+
+# Bevroren kopie uit instruments/previews.py (stand van deze migratie). Alleen
+# de invoer is bevroren: de previews zelf zijn afgeleide uitvoer en worden met
+# de renderer en templates van het moment van migreren gemaakt.
+PREVIEW_TXT_TEMPLATE = "instruments/previews/template.txt"
+PREVIEW_HTML_TEMPLATE = "instruments/previews/template.html"
+
+
+def version_preview_inputs(version):
+    return {
+        "table_data": [[s['initials'], s['lastname'], s['party']] for s in version.submitters_data],
+        "instrument": version.instrument,
+        "subject": version.subject,
+        "date_str": str(version.date),
+        "considerations": version.considerations,
+        "requests": version.requests,
+    }
+
+
+def version_preview_fields(version):
+    data = process_gui_data(**version_preview_inputs(version))
+    return {
+        "preview_data": data,
+        "preview_text": render_to_string(PREVIEW_TXT_TEMPLATE, data),
+        "preview_html": render_to_string(PREVIEW_HTML_TEMPLATE, data),
+    }
+
+
+def render_version_previews(apps, schema_editor):
+    InstrumentVersion = apps.get_model("instruments", "InstrumentVersion")
+    versions = InstrumentVersion.objects.using(schema_editor.connection.alias).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(versions.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        for version in batch:
+            for field, value in version_preview_fields(version).items():
+                setattr(version, field, value)
+        InstrumentVersion.objects.using(schema_editor.connection.alias).bulk_update(
+            batch, ["preview_text", "preview_html", "preview_data"]
+        )
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instruments', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instrumentversion',
+            name='preview_data',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='instrumentversion',
+            name='preview_html',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='instrumentversion',
+            name='preview_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(render_version_previews, migrations.RunPython.noop),
+    ]
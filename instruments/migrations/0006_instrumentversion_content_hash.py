@@ -0,0 +1,95 @@
+# Generated by Django 5.2 on 2026-10-19 16:40
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def content_hash(instrument, subject, date, considerations, requests, submitters_data):
+    # Bevroren kopie uit instruments/deltas.py (stand van deze migratie)
+    payload = json.dumps(
+        [instrument, subject, str(date), considerations, requests, submitters_data],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def fill_content_hashes(apps, schema_editor):
+    # Bestaande versies zijn allemaal volledig opgeslagen; alleen de hash ontbreekt
+    InstrumentVersion = apps.get_model("instruments", "InstrumentVersion")
+    versions = InstrumentVersion.objects.using(schema_editor.connection.alias).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(versions.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        for version in batch:
+            version.content_hash = content_hash(
+                version.instrument,
+                version.subject,
+                version.date,
+                version.stored_considerations,
+                version.stored_requests,
+                version.submitters_data,
+            )
+        InstrumentVersion.objects.using(schema_editor.connection.alias).bulk_update(batch, ["content_hash"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instruments', '0005_instrumentversion_previews'),
+    ]
+
+    operations = [
+        # Alleen de veldnaam verandert; de kolommen heten nog steeds considerations en requests
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.RenameField(
+                model_name='instrumentversion',
+                old_name='considerations',
+                new_name='stored_considerations',
+            ),
+            migrations.AlterField(
+                model_name='instrumentversion',
+                name='stored_considerations',
+                field=models.TextField(blank=True, db_column='considerations'),
+            ),
+            migrations.RenameField(
+                model_name='instrumentversion',
+                old_name='requests',
+                new_name='stored_requests',
+            ),
+            migrations.AlterField(
+                model_name='instrumentversion',
+                name='stored_requests',
+                field=models.TextField(blank=True, db_column='requests'),
+            ),
+        ]),
+        migrations.AddField(
+            model_name='instrumentversion',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='instrumentversion',
+            name='base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='deltas', to='instruments.instrumentversion'),
+        ),
+        migrations.AddField(
+            model_name='instrumentversion',
+            name='text_delta',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddIndex(
+            model_name='instrumentversion',
+            index=models.Index(fields=['submission', 'content_hash'], name='version_submission_hash_idx'),
+        ),
+        migrations.RunPython(fill_content_hashes, migrations.RunPython.noop),
+    ]
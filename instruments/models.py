@@ -5,6 +5,8 @@ en notities (Note). Nu wordt elke InstrumentSubmission gekoppeld aan een eigenaa
 """
 
 from django.db import models
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
 from django.conf import settings
 
 class InstrumentSubmission(models.Model):
@@ -42,6 +44,16 @@ class InstrumentSubmission(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # De lijstweergave filtert altijd op eigenaar en sorteert (keyset) op
+        # één van deze velden met id als tiebreaker
+        indexes = [
+            models.Index(fields=["owner", "-updated_at", "-id"], name="submission_owner_updated_idx"),
+            models.Index(fields=["owner", "-date", "-id"], name="submission_owner_date_idx"),
+            models.Index(fields=["owner", "subject", "id"], name="submission_owner_subject_idx"),
+            models.Index(fields=["owner", "instrument", "id"], name="submission_owner_instr_idx"),
+        ]
+
     def __str__(self):
         return f"{self.instrument} - {self.subject} ({self.date})"
 
@@ -78,6 +90,9 @@ class Note(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["submission", "-created_at", "-id"], name="note_submission_created_idx"),
+        ]
 
     def __str__(self):
         return f"Notitie door {self.user} op {self.created_at.date()}"
@@ -87,6 +102,11 @@ class InstrumentVersion(models.Model):
     """
     Model voor het opslaan van een versie van een instrument submission op het moment van goedkeuringsaanvraag.
     Dit zorgt ervoor dat we altijd kunnen zien welke versie van het instrument is beoordeeld.
+
+    Een ongewijzigde momentopname wordt hergebruikt (zelfde content_hash). De
+    lange tekstvelden worden waar dat loont opgeslagen als delta ten opzichte
+    van een eerdere, volledig opgeslagen versie (`base`); `considerations` en
+    `requests` reconstrueren de tekst transparant (zie instruments/deltas.py).
     """
     submission = models.ForeignKey(
         InstrumentSubmission,
@@ -96,24 +116,111 @@ class InstrumentVersion(models.Model):
     instrument = models.CharField(max_length=50)
     subject = models.CharField(max_length=200)
     date = models.DateField()
-    considerations = models.TextField(blank=True)
-    requests = models.TextField(blank=True)
+    # Volledige tekst, of leeg als het veld als delta in text_delta staat
+    stored_considerations = models.TextField(blank=True, db_column="considerations")
+    stored_requests = models.TextField(blank=True, db_column="requests")
     created_at = models.DateTimeField(auto_now_add=True)
 
     # JSON field voor het opslaan van de indieners op het moment van versioning
     submitters_data = models.JSONField(default=list)
 
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    # Volledig opgeslagen versie waartegen de delta's in text_delta gelden.
+    # RESTRICT: een basis kan alleen samen met haar submission verwijderd worden.
+    base = models.ForeignKey(
+        "self",
+        on_delete=models.RESTRICT,
+        null=True,
+        blank=True,
+        related_name="deltas"
+    )
+    # {"considerations": delta, "requests": delta} voor velden die als delta zijn opgeslagen
+    text_delta = models.JSONField(default=dict, blank=True)
+
+    # Eén keer gerenderd bij het aanmaken; een versie verandert daarna niet meer
+    preview_text = models.TextField(blank=True)
+    preview_html = models.TextField(blank=True)
+    preview_data = models.JSONField(default=dict, blank=True)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=["submission", "-created_at"], name="version_submission_created_idx"),
+            models.Index(fields=["submission", "content_hash"], name="version_submission_hash_idx"),
+        ]
 
     def __str__(self):
         return f"Versie van {self.instrument} - {self.subject} ({self.created_at})"
 
-    @classmethod
-    def create_from_submission(cls, submission):
+    def _text(self, name):
+        delta = self.text_delta.get(name)
+        if delta is None:
+            return getattr(self, f"stored_{name}")
+        from instruments.deltas import apply_delta
+
+        return apply_delta(getattr(self.base, f"stored_{name}"), delta)
+
+    def _set_text(self, name, value):
+        setattr(self, f"stored_{name}", value)
+        self.text_delta = {key: delta for key, delta in self.text_delta.items() if key != name}
+
+    @property
+    def considerations(self):
+        return self._text("considerations")
+
+    @considerations.setter
+    def considerations(self, value):
+        self._set_text("considerations", value)
+
+    @property
+    def requests(self):
+        return self._text("requests")
+
+    @requests.setter
+    def requests(self, value):
+        self._set_text("requests", value)
+
+    def compute_content_hash(self):
+        from instruments.deltas import content_hash
+
+        return content_hash(
+            self.instrument, self.subject, self.date, self.considerations, self.requests, self.submitters_data
+        )
+
+    def store_as_delta(self):
         """
-        Maak een nieuwe versie op basis van een InstrumentSubmission
+        Sla de lange tekstvelden op als delta tegen de laatste volledige versie
+        van dezelfde submission, zolang dat kleiner is en de keten kort blijft.
         """
+        latest = InstrumentVersion.objects.filter(
+            submission_id=self.submission_id
+        ).select_related("base").order_by("-created_at", "-pk").first()
+        if latest is None:
+            return
+        base = latest.base or latest
+        self.store_as_delta_against(base, base.deltas.count())
+
+    def store_as_delta_against(self, base, delta_count):
+        """Als store_as_delta, met een al opgehaalde basis en het aantal delta's daarop."""
+        from instruments.deltas import DELTA_FIELDS, KEYFRAME_INTERVAL, make_delta
+
+        if delta_count >= KEYFRAME_INTERVAL:
+            return
+
+        text_delta = {}
+        for name in DELTA_FIELDS:
+            delta = make_delta(getattr(base, f"stored_{name}"), getattr(self, name))
+            if delta is not None:
+                text_delta[name] = delta
+        if text_delta:
+            self.base = base
+            for name in text_delta:
+                setattr(self, f"stored_{name}", "")
+            self.text_delta = text_delta
+
+    @classmethod
+    def _unsaved_from_submission(cls, submission):
+        """Een nog niet opgeslagen versie met de huidige inhoud van de submission en haar hash."""
         submitters_data = [
             {
                 'initials': s.initials,
@@ -123,7 +230,7 @@ class InstrumentVersion(models.Model):
             for s in submission.submitters.all()
         ]
 
-        return cls.objects.create(
+        version = cls(
             submission=submission,
             instrument=submission.instrument,
             subject=submission.subject,
@@ -131,4 +238,112 @@ class InstrumentVersion(models.Model):
             considerations=submission.considerations,
             requests=submission.requests,
             submitters_data=submitters_data
-        )
\ No newline at end of file
+        )
+        version.content_hash = version.compute_content_hash()
+        return version
+
+    @classmethod
+    def create_from_submission(cls, submission):
+        """
+        Maak een nieuwe versie op basis van een InstrumentSubmission, of geef
+        de bestaande versie terug als de inhoud niet is veranderd
+        """
+        version = cls._unsaved_from_submission(submission)
+        existing = cls.objects.filter(
+            submission=submission, content_hash=version.content_hash
+        ).order_by("-created_at", "-pk").first()
+        if existing is not None:
+            return existing
+
+        version.render_previews()
+        version.store_as_delta()
+        version.save()
+        return version
+
+    @classmethod
+    def bulk_create_from_submissions(cls, submissions):
+        """
+        create_from_submission voor een reeks submissions (met geprefetchte
+        indieners) in een vast aantal queries. Geeft {submission_id: versie}.
+
+        bulk_create verstuurt geen post_save; de cache van de submissions
+        wordt hier zelf ongeldig gemaakt (zie instruments/signals.py).
+        """
+        from instrument_generator import cache
+
+        versions = {submission.pk: cls._unsaved_from_submission(submission) for submission in submissions}
+        if not versions:
+            return {}
+
+        # Bestaande versies met dezelfde inhoud worden hergebruikt
+        existing = {}
+        for version in cls.objects.filter(
+            submission_id__in=versions, content_hash__in={v.content_hash for v in versions.values()}
+        ).order_by("-created_at", "-pk"):
+            existing.setdefault((version.submission_id, version.content_hash), version)
+        new = {}
+        for submission_id, version in versions.items():
+            found = existing.get((submission_id, version.content_hash))
+            if found is not None:
+                versions[submission_id] = found
+            else:
+                new[submission_id] = version
+        if not new:
+            return versions
+
+        # Laatste versie per submission als basis voor de delta's
+        latest = cls.objects.annotate(
+            position=Window(
+                RowNumber(), partition_by=F("submission"), order_by=[F("created_at").desc(), F("pk").desc()]
+            )
+        ).filter(submission_id__in=new, position=1).select_related("base")
+        bases = {version.submission_id: version.base or version for version in latest}
+        delta_counts = dict(
+            cls.objects.filter(base__in={base.pk for base in bases.values()}).values("base").annotate(
+                count=Count("pk")
+            ).order_by().values_list("base", "count")
+        ) if bases else {}
+        for submission_id, version in new.items():
+            version.render_previews()
+            base = bases.get(submission_id)
+            if base is not None:
+                version.store_as_delta_against(base, delta_counts.get(base.pk, 0))
+        cls.objects.bulk_create(new.values())
+
+        cache.invalidate(
+            cache.namespace_for(cls),
+            *(cache.namespace_for(InstrumentSubmission, submission_id) for submission_id in new),
+            cache.namespace_for(InstrumentSubmission),
+        )
+        return versions
+
+    def render_previews(self):
+        """Render de previews van deze versie en zet ze op het object (zonder op te slaan)."""
+        from instruments.previews import version_preview_fields
+
+        for field, value in version_preview_fields(self).items():
+            setattr(self, field, value)
+
+class SubmissionSearchDocument(models.Model):
+    """
+    Zoekdocument per submission, bijgehouden door instruments/signals.py.
+    De tekst is over drie velden verdeeld zodat treffers in onderwerp en
+    indieners zwaarder wegen dan treffers in de tekst of de notities.
+    De database-specifieke indexen (GIN/trigram op PostgreSQL, FTS5 op SQLite)
+    worden in migratie 0003 aangemaakt; zie instruments/search.py.
+    """
+    submission = models.OneToOneField(
+        InstrumentSubmission,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document"
+    )
+    # Instrument, onderwerp en indieners
+    title = models.TextField(blank=True)
+    # Overwegingen/toelichting en verzoeken/vragen
+    body = models.TextField(blank=True)
+    notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Zoekdocument voor submission {self.submission_id}"
@@ -0,0 +1,160 @@
+"""
+Module: instruments/previews.py
+Beschrijving: Bouwt en rendert de tekstpreview van een instrument submission.
+
+Er zijn twee cachelagen:
+- per submission in de gelaagde cache (instrument_generator/cache.py), ongeldig
+  gemaakt via de signals in instruments/signals.py;
+- per inhoud in het gedeelde mmap-segment (cache-alias "previews"), met als
+  sleutel een hash van de invoer. Identieke inhoud (bijv. een versie die gelijk
+  is aan de huidige submission) wordt zo maar één keer gerenderd, door welke
+  worker dan ook.
+
+Een InstrumentVersion is een bevroren momentopname: de previews daarvan worden
+één keer gerenderd bij het aanmaken (`version_preview_fields`) en op de versie
+zelf opgeslagen. Pagina's met de hele geschiedenis renderen dus niets.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+from pathlib import Path
+
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+from instrument_generator import cache
+from instruments.exports import compose_text
+from instruments.exports.compose_text import process_gui_data
+
+PREVIEW_TXT_TEMPLATE = "instruments/previews/template.txt"
+PREVIEW_HTML_TEMPLATE = "instruments/previews/template.html"
+PREVIEW_CACHE_ALIAS = "previews"
+
+_PREVIEW_TEMPLATE_DIR = Path(__file__).resolve().parent / "templates" / "instruments" / "previews"
+
+
+@lru_cache(maxsize=1)
+def _renderer_revision():
+    """
+    Hash van de previewtemplates en compose_text.py. Het gedeelde segment en de
+    gedeelde cache overleven herstarts; met de revisie in elke sleutel leveren
+    gewijzigde templates na een deploy nooit oude previews op.
+    """
+    digest = hashlib.sha256(Path(compose_text.__file__).read_bytes())
+    for path in sorted(_PREVIEW_TEMPLATE_DIR.rglob("*")):
+        if path.is_file() and path.suffix in (".txt", ".html", ".tex"):
+            digest.update(path.name.encode("utf-8"))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def submission_preview_inputs(submission):
+    """Invoer voor process_gui_data op basis van een (live) submission."""
+    return {
+        "table_data": [[s.initials, s.lastname, s.party] for s in submission.submitters.all()],
+        "instrument": submission.instrument,
+        "subject": submission.subject,
+        "date_str": str(submission.date),
+        "considerations": submission.considerations,
+        "requests": submission.requests,
+    }
+
+
+def version_preview_inputs(version):
+    """Invoer voor process_gui_data op basis van een InstrumentVersion-snapshot."""
+    return {
+        "table_data": [[s['initials'], s['lastname'], s['party']] for s in version.submitters_data],
+        "instrument": version.instrument,
+        "subject": version.subject,
+        "date_str": str(version.date),
+        "considerations": version.considerations,
+        "requests": version.requests,
+    }
+
+
+def draft_preview_inputs(data, prefix="submitters"):
+    """
+    Invoer voor process_gui_data op basis van een (nog niet opgeslagen) POST
+    van het submissionformulier, inclusief de indieners uit de formset.
+    """
+    try:
+        total = int(data.get(f"{prefix}-TOTAL_FORMS", 0))
+    except (TypeError, ValueError):
+        total = 0
+    rows = []
+    for index in range(min(total, 1000)):
+        if data.get(f"{prefix}-{index}-DELETE"):
+            continue
+        row = [data.get(f"{prefix}-{index}-{field}", "").strip() for field in ("initials", "lastname", "party")]
+        if any(row):
+            rows.append(row)
+    return {
+        "table_data": rows,
+        "instrument": data.get("instrument", ""),
+        "subject": data.get("subject", "").strip(),
+        "date_str": data.get("date", ""),
+        "considerations": data.get("considerations", ""),
+        "requests": data.get("requests", ""),
+    }
+
+
+def content_key(template_name, inputs):
+    """Sleutel in het gedeelde segment: hash van template, renderer-revisie en invoer."""
+    payload = json.dumps([template_name, inputs], ensure_ascii=False, sort_keys=True)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"preview:{_renderer_revision()}:{digest}"
+
+
+def render_preview_content(inputs, template_name=PREVIEW_TXT_TEMPLATE):
+    """Render een preview op basis van de invoer, via het gedeelde segment."""
+    shared = caches[PREVIEW_CACHE_ALIAS]
+    key = content_key(template_name, inputs)
+    text = shared.get(key)
+    if text is None:
+        text = render_to_string(template_name, process_gui_data(**inputs))
+        shared.set(key, text)
+    return text
+
+
+def version_preview_fields(version):
+    """
+    Tekst, HTML en gestructureerde data van een versie, als waarden voor de
+    velden preview_text, preview_html en preview_data van InstrumentVersion.
+    """
+    inputs = version_preview_inputs(version)
+    return {
+        "preview_data": process_gui_data(**inputs),
+        "preview_text": render_preview_content(inputs),
+        "preview_html": render_preview_content(inputs, PREVIEW_HTML_TEMPLATE),
+    }
+
+
+def version_preview(version):
+    """De opgeslagen tekstpreview van een versie (gerenderd als die nog ontbreekt)."""
+    if version.preview_text:
+        return version.preview_text
+    return render_preview_content(version_preview_inputs(version))
+
+
+def build_preview_data(submission):
+    """Zet een submission en haar indieners om naar de data voor de previewtemplates."""
+    return process_gui_data(**submission_preview_inputs(submission))
+
+
+def get_preview_data(submission):
+    """Gecachte variant van build_preview_data."""
+    return cache.get_or_set(
+        cache.namespace_for(submission),
+        f"preview_data:{_renderer_revision()}",
+        lambda: build_preview_data(submission),
+    )
+
+
+def render_preview(submission, template_name=PREVIEW_TXT_TEMPLATE):
+    """Render de preview van een submission met de opgegeven template (gecachet)."""
+    return cache.get_or_set(
+        cache.namespace_for(submission),
+        f"preview:{_renderer_revision()}:{template_name}",
+        lambda: render_preview_content(submission_preview_inputs(submission), template_name),
+    )
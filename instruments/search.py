@@ -0,0 +1,208 @@
+"""
+Module: instruments/search.py
+Beschrijving: Full-text zoeken in submissions via SubmissionSearchDocument.
+
+- PostgreSQL: gewogen tsvector (Nederlandse configuratie) met een GIN-index op
+  exact dezelfde expressie, plus een trigram-index op UPPER(title) voor
+  deelwoorden zoals "ansen" in "Jansen". Gerangschikt met ts_rank.
+- SQLite (ontwikkeling): een FTS5-tabel die met triggers synchroon loopt met
+  de zoekdocumenten. Gerangschikt met bm25.
+- Overige databases (of SQLite zonder FTS5): icontains op de zoekdocumenten.
+
+De zoekdocumenten worden na de commit van een transactie bijgewerkt; elke
+submission wordt per transactie maar één keer opnieuw opgebouwd.
+"""
+
+import re
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Upper
+
+from instrument_generator import cache, oncommit
+from instrument_generator.pagination import order_by as keyset_order_by
+from instruments.facets import facet_namespace
+from instruments.models import InstrumentSubmission, Note, SubmissionSearchDocument, Submitter
+
+SEARCH_CONFIG = "dutch"
+
+# Namen van de database-specifieke objecten uit migratie 0003
+VECTOR_INDEX_NAME = "instruments_search_vector_gin"
+TRIGRAM_INDEX_NAME = "instruments_search_title_trgm"
+FTS_TABLE = "instruments_submissionsearch_fts"
+
+# Volgorde van zoekresultaten (ook als keyset, zie instrument_generator/pagination.py)
+RANK_ORDERING = [("search_rank", True), ("updated_at", True), ("pk", True)]
+
+# Gewichten per veld: titel > tekst > notities
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_vector(prefix=""):
+    """
+    De gewogen tsvector over de drie velden. De GIN-index wordt met dezelfde
+    expressie aangemaakt, zodat PostgreSQL hem bij het zoeken kan gebruiken.
+    """
+    return (
+        SearchVector(f"{prefix}title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(f"{prefix}body", weight="B", config=SEARCH_CONFIG)
+        + SearchVector(f"{prefix}notes", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def postgres_indexes():
+    """De indexen die migratie 0003 op PostgreSQL aanmaakt."""
+    return [
+        GinIndex(search_vector(), name=VECTOR_INDEX_NAME),
+        GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name=TRIGRAM_INDEX_NAME),
+    ]
+
+
+# ------------------------------------------------------------------
+# Zoekdocumenten opbouwen
+# ------------------------------------------------------------------
+def document_fields(submission, submitters, notes):
+    """
+    Zet een submission, haar indieners en notities om naar de velden van het
+    zoekdocument. Werkt ook met de historische modellen in migraties.
+    """
+    names = " ".join(
+        " ".join(part for part in (s.initials, s.lastname, s.party) if part)
+        for s in submitters
+    )
+    return {
+        "title": " ".join(part for part in (submission.instrument, submission.subject, names) if part),
+        "body": "\n".join(part for part in (submission.considerations, submission.requests) if part),
+        "notes": "\n".join(note.text for note in notes),
+    }
+
+
+def refresh_search_document(submission_id):
+    """
+    Bouw het zoekdocument van één submission opnieuw op (of verwijder het).
+    Geeft de eigenaar van de submission terug, of None als die niet meer bestaat.
+    """
+    submission = InstrumentSubmission.objects.filter(pk=submission_id).first()
+    if submission is None:
+        SubmissionSearchDocument.objects.filter(submission_id=submission_id).delete()
+        return None
+    fields = document_fields(
+        submission,
+        Submitter.objects.filter(submission_id=submission_id).order_by("pk"),
+        Note.objects.filter(submission_id=submission_id).order_by("created_at", "pk"),
+    )
+    SubmissionSearchDocument.objects.update_or_create(submission_id=submission_id, defaults=fields)
+    return submission.owner_id
+
+
+def _refresh_documents(submission_ids):
+    owners = {refresh_search_document(submission_id) for submission_id in sorted(submission_ids)}
+    owners.discard(None)
+    # Het zoekdocument bepaalt welke submissions bij een zoekterm horen, en
+    # daarmee de facettellingen van een zoekopdracht
+    if owners:
+        cache.invalidate(*(facet_namespace(owner_id) for owner_id in sorted(owners)))
+
+
+def schedule_refresh(submission_id):
+    """
+    Plan het bijwerken van een zoekdocument na de huidige transactie. Meerdere
+    wijzigingen aan dezelfde submission leiden tot één herberekening.
+    """
+    oncommit.defer("instruments.search", [submission_id], _refresh_documents)
+
+
+# ------------------------------------------------------------------
+# Zoeken
+# ------------------------------------------------------------------
+def _words(query):
+    return _WORD_RE.findall(query)
+
+
+def _fts_available():
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def _stable_rank(rank):
+    """
+    Rang als double precision. ts_rank is float4: vergeleken met de float8 uit
+    de cursor is een rij dan nooit exact gelijk, waardoor rijen met gelijke rang
+    op een paginagrens herhaald of overgeslagen worden. Een float8 komt via
+    str()/to_python exact terug, dus ORDER BY en cursor zien dezelfde waarde.
+    """
+    return Cast(rank, FloatField())
+
+
+def _search_postgres(queryset, words, query):
+    # Elk woord als prefix, zodat er tijdens het typen al resultaten zijn
+    tsquery = SearchQuery(
+        " & ".join(f"{word}:*" for word in words),
+        search_type="raw",
+        config=SEARCH_CONFIG,
+    )
+    vector = search_vector("search_document__")
+    # `search=tsquery` wordt `vector @@ tsquery` (GIN-index), icontains op de
+    # titel wordt `UPPER(title) LIKE ...` (trigram-index)
+    return queryset.annotate(
+        search=vector,
+        search_rank=_stable_rank(SearchRank(vector, tsquery)),
+    ).filter(
+        Q(search=tsquery) | Q(search_document__title__icontains=query.strip())
+    )
+
+
+def _search_sqlite_fts(queryset, words):
+    # Elk woord als prefix-term; aanhalingstekens voorkomen FTS5-syntaxfouten
+    match = " ".join(f'"{word}"*' for word in words)
+    table = connection.ops.quote_name(InstrumentSubmission._meta.db_table)
+    weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+    matching_ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+    # bm25 is lager voor betere treffers; omdraaien zodat hoger beter is (zoals ts_rank)
+    rank = RawSQL(
+        f"(SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id)",
+        (match,),
+        output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=matching_ids).annotate(search_rank=_stable_rank(rank))
+
+
+def _search_fallback(queryset, words):
+    condition = Q()
+    for word in words:
+        condition &= (
+            Q(search_document__title__icontains=word)
+            | Q(search_document__body__icontains=word)
+            | Q(search_document__notes__icontains=word)
+        )
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_submissions(queryset, query):
+    """
+    Filter een queryset van submissions op een zoekterm en annoteer elk
+    resultaat met `search_rank` (hoger is relevanter). De volgorde wordt niet
+    aangepast; gebruik `order_by(F("search_rank").desc(), ...)` voor relevantie.
+    """
+    words = _words(query)
+    if not words:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    if connection.vendor == "postgresql":
+        return _search_postgres(queryset, words, query)
+    if _fts_available():
+        return _search_sqlite_fts(queryset, words)
+    return _search_fallback(queryset, words)
+
+
+def order_by_rank(queryset):
+    """Sorteer zoekresultaten op relevantie, daarna op laatst bewerkt."""
+    return queryset.order_by(*keyset_order_by(RANK_ORDERING))
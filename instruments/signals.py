@@ -0,0 +1,65 @@
+"""
+Module: instruments/signals.py
+Beschrijving: Houdt de gedeelde cache en de zoekdocumenten coherent. Bij elke
+wijziging van een submission, indiener of versie worden de namespaces van het
+object, het model en de bijbehorende submission ongeldig gemaakt, en bij
+submissions en indieners ook de facettellingen van de eigenaar. Wijzigingen
+aan submissions, indieners en notities plannen daarnaast het bijwerken van het
+zoekdocument (zie instruments/search.py).
+
+Let op: QuerySet.update() en bulk_create() versturen geen signals; code die
+deze gebruikt moet zelf instrument_generator.cache.invalidate en
+instruments.search.schedule_refresh aanroepen (of `rebuild_search_index`).
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from instrument_generator import cache
+from instruments.facets import facet_namespace
+from instruments.models import InstrumentSubmission, InstrumentVersion, Note, Submitter
+from instruments.search import schedule_refresh
+
+
+@receiver([post_save, post_delete], sender=InstrumentSubmission)
+def invalidate_submission_cache(sender, instance, **kwargs):
+    cache.invalidate_instance(instance)
+    cache.invalidate(facet_namespace(instance.owner_id))
+
+
+@receiver([post_save, post_delete], sender=Submitter)
+@receiver([post_save, post_delete], sender=InstrumentVersion)
+def invalidate_submission_child_cache(sender, instance, **kwargs):
+    cache.invalidate_instance(instance)
+    # Previews en exports van de submission hangen af van haar indieners/versies
+    cache.invalidate(
+        cache.namespace_for(InstrumentSubmission, instance.submission_id),
+        cache.namespace_for(InstrumentSubmission),
+    )
+
+
+@receiver([post_save, post_delete], sender=Submitter)
+def invalidate_submitter_facets(sender, instance, **kwargs):
+    # De partijtellingen komen uit de indieners
+    owner_id = (
+        InstrumentSubmission.objects.filter(pk=instance.submission_id)
+        .values_list("owner_id", flat=True)
+        .first()
+    )
+    if owner_id is not None:
+        cache.invalidate(facet_namespace(owner_id))
+
+
+@receiver(post_save, sender=InstrumentSubmission)
+def refresh_submission_search_document(sender, instance, raw=False, **kwargs):
+    # Bij verwijderen ruimt de cascade het zoekdocument zelf op
+    if not raw:
+        schedule_refresh(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Submitter)
+@receiver([post_save, post_delete], sender=Note)
+def refresh_child_search_document(sender, instance, raw=False, **kwargs):
+    # Na de herberekening worden ook de facetten van de eigenaar ongeldig (zie search.py)
+    if not raw:
+        schedule_refresh(instance.submission_id)
@@ -3,8 +3,9 @@ document.addEventListener('DOMContentLoaded', function() {
   var shareBtn = document.getElementById('shareButton');
   if (shareBtn && navigator.share) {
     var offcanvas = document.getElementById('offcanvasPreview');
-    var shareText = offcanvas ? offcanvas.querySelector('pre').textContent.trim() : '';
     shareBtn.addEventListener('click', function() {
+      // Lees de preview pas bij het klikken; de live preview kan hem intussen hebben bijgewerkt
+      var shareText = offcanvas ? offcanvas.querySelector('pre').textContent.trim() : '';
       navigator.share({
         title: document.title,
         text: shareText
@@ -102,6 +103,61 @@ document.addEventListener('DOMContentLoaded', function() {
   }
   var csrftoken = getCookie('csrftoken');
 
+  // Live preview: na een korte pauze in het typen de preview opnieuw laten renderen
+  var submissionForm = document.getElementById('submission-form');
+  var previewPre = document.querySelector('#offcanvasPreview pre');
+  if (submissionForm && previewPre && submissionForm.dataset.previewUrl) {
+    var previewTimer = null;
+    var previewController = null;
+    function refreshPreview() {
+      // Een nieuwere aanvraag maakt de vorige overbodig
+      if (previewController) previewController.abort();
+      previewController = new AbortController();
+      var data = new FormData(submissionForm);
+      data.append('format', 'txt');
+      fetch(submissionForm.dataset.previewUrl, {
+        method: 'POST',
+        headers: {'X-Requested-With': 'XMLHttpRequest', 'X-CSRFToken': csrftoken},
+        body: data,
+        signal: previewController.signal
+      })
+      .then(res => res.json())
+      .then(json => {
+        if (typeof json.preview === 'string') previewPre.textContent = json.preview;
+      })
+      .catch(function(error) {
+        if (error.name !== 'AbortError') console.error(error);
+      });
+    }
+    function schedulePreview() {
+      clearTimeout(previewTimer);
+      previewTimer = setTimeout(refreshPreview, 300);
+    }
+    submissionForm.addEventListener('input', schedulePreview);
+    submissionForm.addEventListener('change', schedulePreview);
+    // Nieuwe of verwijderde indieners veranderen de preview ook
+    var submittersContainer = document.getElementById('submitters-container');
+    if (submittersContainer) {
+      new MutationObserver(schedulePreview).observe(submittersContainer, {childList: true});
+    }
+  }
+
+  // Notes: de endpoints geven alleen het fragment van één notitie terug
+  var notesList = document.getElementById('notes-list');
+  function notesItems() {
+    return notesList ? notesList.querySelector('#notes-items') : null;
+  }
+  function htmlToElements(html) {
+    var template = document.createElement('template');
+    template.innerHTML = html.trim();
+    return Array.from(template.content.children);
+  }
+  function updateNotesEmptyState() {
+    var empty = notesList ? notesList.querySelector('.js-notes-empty') : null;
+    var items = notesItems();
+    if (empty && items) empty.hidden = items.children.length > 0;
+  }
+
   // Add note via AJAX
   var noteForm = document.getElementById('note-form');
   if (noteForm) {
@@ -114,8 +170,10 @@ document.addEventListener('DOMContentLoaded', function() {
       })
       .then(response => response.json())
       .then(json => {
-        if (json.notes_html) {
-          document.getElementById('notes-list').innerHTML = json.notes_html;
+        var items = notesItems();
+        if (json.note_html && items) {
+          items.prepend(...htmlToElements(json.note_html));
+          updateNotesEmptyState();
           noteForm.reset();
         }
       })
@@ -123,10 +181,32 @@ document.addEventListener('DOMContentLoaded', function() {
     });
   }
 
-  // Delete and edit notes
-  var notesList = document.getElementById('notes-list');
+  // Delete, edit and load more notes
   if (notesList) {
     notesList.addEventListener('click', function(e) {
+      var moreBtn = e.target.closest('.js-more-notes');
+      if (moreBtn) {
+        e.preventDefault();
+        moreBtn.disabled = true;
+        fetch(moreBtn.dataset.url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+        .then(res => res.json())
+        .then(json => {
+          var items = notesItems();
+          htmlToElements(json.notes_html || '').forEach(function(el) {
+            // Sla notities over die na het laden van de pagina al zijn toegevoegd
+            if (!items.querySelector('[data-note-id="' + el.dataset.noteId + '"]')) items.append(el);
+          });
+          if (json.next_url) {
+            moreBtn.dataset.url = json.next_url;
+            moreBtn.disabled = false;
+          } else {
+            moreBtn.remove();
+          }
+          updateNotesEmptyState();
+        })
+        .catch(console.error);
+        return;
+      }
       var deleteBtn = e.target.closest('.js-delete-note');
       if (deleteBtn) {
         e.preventDefault();
@@ -137,7 +217,11 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(res => res.json())
         .then(json => {
-          if (json.notes_html) notesList.innerHTML = json.notes_html;
+          if (json.deleted) {
+            var item = notesList.querySelector('[data-note-id="' + json.deleted + '"]');
+            if (item) item.remove();
+            updateNotesEmptyState();
+          }
         })
         .catch(console.error);
         return;
@@ -152,7 +236,7 @@ document.addEventListener('DOMContentLoaded', function() {
         textarea.className = 'form-control form-control-sm mb-2';
         textarea.value = originalText;
         textElem.replaceWith(textarea);
-        var actionBtns = noteItem.querySelector('.text-nowrap');
+        var actionBtns = noteItem.querySelector('.btn-group');
         if (actionBtns) actionBtns.style.display = 'none';
         var saveBtn = document.createElement('button');
         saveBtn.type = 'button';
@@ -181,7 +265,7 @@ document.addEventListener('DOMContentLoaded', function() {
           })
           .then(res => res.json())
           .then(json => {
-            if (json.notes_html) notesList.innerHTML = json.notes_html;
+            if (json.note_html) noteItem.replaceWith(...htmlToElements(json.note_html));
           })
           .catch(console.error);
         });
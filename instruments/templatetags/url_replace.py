@@ -13,8 +13,10 @@ def url_replace(request, field, value):
         dict_.pop(field, None)
     else:
         dict_[field] = value
-        # Reset page number when changing sort or filters
-        if field != 'page':
-            dict_.pop('page', None)
+    # Reset page number / cursor when changing sort or filters;
+    # a cursor only makes sense for the ordering it was created with
+    if field not in ('page', 'cursor'):
+        dict_.pop('page', None)
+        dict_.pop('cursor', None)
 
-    return dict_.urlencode()
\ No newline at end of file
+    return dict_.urlencode()
@@ -1,7 +1,11 @@
+import json
+import os
+
 import pytest
 from django.contrib.auth import get_user_model
 from instruments.models import InstrumentSubmission, Note
 from datetime import date
+from django.db import connection
 from django.utils import timezone
 
 User = get_user_model()
@@ -50,3 +54,545 @@ def test_note_str():
     # __str__ bevat "Notitie door <user> op <YYYY-MM-DD>"
     txt = str(note)
     assert "Notitie door Note Tester, None (notetester@example.com) op " in txt
+
+
+@pytest.mark.django_db
+def test_preview_cache_invalidated_by_submitter_changes():
+    from instruments.models import Submitter
+    from instruments.previews import render_preview
+
+    user = User.objects.create_user(
+        email="cache@example.com",
+        password="secret",
+        initials="C.",
+        last_name="Cache"
+    )
+    sub = InstrumentSubmission.objects.create(
+        owner=user,
+        instrument="Motie",
+        subject="Cache test",
+        date=date(2025, 4, 19),
+    )
+    Submitter.objects.create(submission=sub, initials="A.", lastname="Jansen", party="D66")
+    first = render_preview(sub)
+    assert "Jansen (D66)" in first
+    # Tweede aanroep komt uit de cache en is identiek
+    assert render_preview(sub) == first
+
+    Submitter.objects.create(submission=sub, initials="B.", lastname="de Vries", party="PvdA")
+    assert "De Vries (PvdA)" in render_preview(sub)
+
+
+@pytest.mark.django_db
+def test_renderer_revision_is_part_of_preview_and_export_keys(monkeypatch):
+    from django.core.cache import caches
+    from instruments import previews
+    from instruments.exports import generators
+
+    user = User.objects.create(email="revisie@example.com", initials="R.", last_name="Revisie")
+    sub = InstrumentSubmission.objects.create(owner=user, instrument="Motie", subject="Revisie", date=date(2025, 4, 19))
+    old_preview = previews.render_preview(sub)
+    def export(content):
+        return lambda submission, export_type: ("x.txt", content, "text/plain")
+
+    monkeypatch.setattr(generators, "_render_export_file", export(b"OUDE-EXPORT"))
+    assert generators.generate_export_file(sub, "txt")[1] == b"OUDE-EXPORT"
+    # Binaire exports alleen in de gedeelde laag, niet in het geheugen van elk proces
+    assert not any(b"OUDE-EXPORT" in value for value in caches["local"]._cache.values())
+
+    # Na een deploy met andere templates: niets meer uit de cache van de vorige revisie
+    monkeypatch.setattr(previews, "_renderer_revision", lambda: "nieuwe-revisie")
+    monkeypatch.setattr(generators, "_export_revision", lambda: "nieuwe-revisie")
+    monkeypatch.setattr(previews, "render_preview_content", lambda inputs, template_name: "NIEUWE PREVIEW")
+    monkeypatch.setattr(generators, "_render_export_file", export(b"NIEUW"))
+    assert old_preview != "NIEUWE PREVIEW"
+    assert previews.render_preview(sub) == "NIEUWE PREVIEW"
+    assert generators.generate_export_file(sub, "txt")[1] == b"NIEUW"
+
+
+@pytest.mark.django_db
+def test_version_previews_rendered_once_at_creation(monkeypatch):
+    from instruments import previews
+    from instruments.models import InstrumentVersion, Submitter
+
+    user = User.objects.create(email="versie@example.com", initials="V.", last_name="Versie")
+    sub = InstrumentSubmission.objects.create(
+        owner=user, instrument="Motie", subject="Versie test", date=date(2025, 4, 19),
+    )
+    Submitter.objects.create(submission=sub, initials="A.", lastname="Jansen", party="D66")
+    version = InstrumentVersion.create_from_submission(sub)
+    assert version.preview_text == previews.render_preview(sub)
+    assert "Jansen" in version.preview_html
+    assert version.preview_data["subject"] == "Versie test"
+
+    # Latere wijzigingen aan de submission raken de versie niet, en lezen rendert niets
+    sub.subject = "Gewijzigd"
+    sub.save()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("versiepreview opnieuw gerenderd")
+
+    monkeypatch.setattr(previews, "render_preview_content", fail)
+    stored = InstrumentVersion.objects.get(pk=version.pk)
+    assert previews.version_preview(stored) == version.preview_text
+    assert "Versie test" in stored.preview_text
+
+
+@pytest.mark.django_db
+def test_versions_are_deduplicated_and_stored_as_deltas(django_assert_num_queries):
+    from instruments.models import InstrumentVersion
+
+    user = User.objects.create(email="delta@example.com", initials="D.", last_name="Delta")
+    considerations = "".join(f"Overweging {i} met een flinke zin erachter.\n" for i in range(50))
+    sub = InstrumentSubmission.objects.create(
+        owner=user, instrument="Motie", subject="Delta", date=date(2025, 4, 19),
+        considerations=considerations, requests="Verzoek",
+    )
+    first = InstrumentVersion.create_from_submission(sub)
+    # Ongewijzigde inhoud: dezelfde versie
+    assert InstrumentVersion.create_from_submission(sub) == first
+
+    sub.considerations = considerations.replace("Overweging 7 ", "Overweging zeven ")
+    sub.save()
+    second = InstrumentVersion.create_from_submission(sub)
+    assert second != first
+    assert second.base == first
+    assert second.stored_considerations == ""
+    assert second.stored_requests == "Verzoek"  # korte tekst: delta loont niet
+
+    stored = InstrumentVersion.objects.get(pk=second.pk)
+    with django_assert_num_queries(1):
+        # Eén query voor de basisversie
+        assert stored.considerations == sub.considerations
+    assert stored.compute_content_hash() == stored.content_hash
+
+    # Basis en delta's verdwijnen samen met de submission
+    sub.delete()
+    assert not InstrumentVersion.objects.exists()
+
+
+def test_cache_namespace_invalidation():
+    from instrument_generator import cache
+
+    cache.set_cached("tests.model:1", "key", "waarde")
+    cache.set_cached("tests.model:2", "key", "andere waarde")
+    assert cache.get_cached("tests.model:1", "key") == "waarde"
+
+    cache.invalidate("tests.model:1")
+    assert cache.get_cached("tests.model:1", "key") is None
+    assert cache.get_cached("tests.model:2", "key") == "andere waarde"
+
+
+def test_cache_local_hit_skips_the_shared_tier(monkeypatch):
+    from django.core.cache import caches
+    from instrument_generator import cache
+
+    cache.set_cached("tests.model:3", "key", "waarde")
+    shared = caches[cache.SHARED_ALIAS]
+
+    def no_shared_access(*args, **kwargs):
+        raise AssertionError("gedeelde laag geraadpleegd")
+
+    with monkeypatch.context() as patch:
+        for method in ("get", "get_many", "add"):
+            patch.setattr(shared, method, no_shared_access)
+        assert cache.get_cached("tests.model:3", "key") == "waarde"
+
+    # Een ander proces hoogt de versie op; hier zichtbaar zodra de lokale versie verloopt
+    shared.incr(cache._version_key("tests.model:3"))
+    assert cache.get_cached("tests.model:3", "key") == "waarde"
+    caches[cache.LOCAL_ALIAS].delete(cache._version_key("tests.model:3"))
+    assert cache.get_cached("tests.model:3", "key") is None
+
+
+@pytest.mark.django_db
+def test_cache_invalidated_again_after_commit(django_capture_on_commit_callbacks):
+    from instrument_generator import cache
+
+    with django_capture_on_commit_callbacks(execute=True):
+        cache.invalidate("tests.model:1")
+        # Een gelijktijdige lezer cachet vóór de commit nog de oude rijen
+        cache.set_cached("tests.model:1", "key", "oude waarde")
+        cache.invalidate("tests.model:1")
+    assert cache.get_cached("tests.model:1", "key") is None
+
+
+def test_mmap_cache_shared_between_instances(tmp_path):
+    from instrument_generator.mmap_cache import MmapCache
+
+    params = {"OPTIONS": {"SLOTS": 16, "SLOT_SIZE": 1024}}
+    writer = MmapCache(str(tmp_path / "segment"), params)
+    reader = MmapCache(str(tmp_path / "segment"), params)
+
+    writer.set("preview:abc", "Motie van het lid Jansen (D66)")
+    assert reader.get("preview:abc") == "Motie van het lid Jansen (D66)"
+    assert reader.add("preview:abc", "anders") is False
+
+    # Waarden groter dan één slot worden niet opgeslagen
+    writer.set("preview:groot", "x" * 5000 + "".join(chr(i) for i in range(2000)))
+    assert reader.get("preview:groot") is None
+
+    assert writer.delete("preview:abc") is True
+    assert reader.get("preview:abc") is None
+
+
+def test_mmap_cache_geometry_change_replaces_the_file(tmp_path):
+    from instrument_generator.mmap_cache import MmapCache
+
+    path = str(tmp_path / "segment")
+    old = MmapCache(path, {"OPTIONS": {"SLOTS": 16, "SLOT_SIZE": 1024}})
+    old.set("preview:abc", "oud")
+    old_inode = os.stat(path).st_ino
+
+    new = MmapCache(path, {"OPTIONS": {"SLOTS": 32, "SLOT_SIZE": 512}})
+    assert new.get("preview:abc") is None
+    assert os.stat(path).st_ino != old_inode
+    # Het oude segment is niet verkleind: wie het nog gemapt heeft leest gewoon verder
+    assert old.get("preview:abc") == "oud"
+    assert new.add("preview:abc", "nieuw") is True
+    assert new.add("preview:abc", "anders") is False
+
+
+@pytest.mark.django_db
+def test_paginate_notes_loads_authors_in_same_query(django_assert_num_queries):
+    from accounts.models import Party
+    from instruments.views import NOTES_PER_PAGE, paginate_notes
+
+    user = User.objects.create_user(
+        email="notes@example.com",
+        password="secret",
+        initials="N.",
+        last_name="Notes",
+        party=Party.objects.create(name="D66"),
+    )
+    sub = InstrumentSubmission.objects.create(
+        owner=user,
+        instrument="Motie",
+        subject="Notities",
+        date=date(2025, 4, 19),
+    )
+    for i in range(NOTES_PER_PAGE + 5):
+        Note.objects.create(submission=sub, user=user, text=f"Notitie {i}")
+
+    # Eén count-query en één query voor notities inclusief auteur en partij
+    with django_assert_num_queries(2):
+        page = paginate_notes(sub)
+        parties = {note.user.party.name for note in page}
+    assert parties == {"D66"}
+    assert len(page) == NOTES_PER_PAGE and page.has_next()
+    assert len(paginate_notes(sub, 2)) == 5
+
+
+@pytest.mark.django_db
+def test_live_preview_matches_saved_preview(rf):
+    from instruments.exports import compose_text
+    from instruments.models import Submitter
+    from instruments.previews import render_preview
+    from instruments.views import SubmissionLivePreviewView
+
+    user = User.objects.create_user(
+        email="live@example.com",
+        password="secret",
+        initials="L.",
+        last_name="Live"
+    )
+    sub = InstrumentSubmission.objects.create(
+        owner=user,
+        instrument="Motie",
+        subject="Live preview",
+        date=date(2025, 4, 19),
+        considerations="Overweging een\nOverweging twee",
+        requests="Verzoek",
+    )
+    Submitter.objects.create(submission=sub, initials="A.", lastname="Jansen", party="D66")
+    draft = {
+        "instrument": "Motie",
+        "subject": "Live preview",
+        "date": "2025-04-19",
+        "considerations": "Overweging een\nOverweging twee",
+        "requests": "Verzoek",
+        "submitters-TOTAL_FORMS": "2",
+        "submitters-0-initials": "A.",
+        "submitters-0-lastname": "Jansen",
+        "submitters-0-party": "D66",
+        "submitters-1-initials": "B.",
+        "submitters-1-lastname": "Weg",
+        "submitters-1-party": "PvdA",
+        "submitters-1-DELETE": "on",
+    }
+    response = SubmissionLivePreviewView.as_view()(rf.post("/", draft))
+    assert response.status_code == 200
+    assert json.loads(response.content)["preview"] == render_preview(sub)
+
+    # Alleen de gewijzigde sectie wordt opnieuw opgebouwd
+    misses = compose_text._submitter_section.cache_info().misses
+    SubmissionLivePreviewView.as_view()(rf.post("/", {**draft, "requests": "Ander verzoek"}))
+    assert compose_text._submitter_section.cache_info().misses == misses
+
+
+@pytest.mark.django_db
+def test_search_submissions_ranks_and_covers_notes(django_capture_on_commit_callbacks):
+    from instruments.models import Submitter
+    from instruments.search import order_by_rank, search_submissions
+
+    user = User.objects.create_user(
+        email="zoek@example.com",
+        password="secret",
+        initials="Z.",
+        last_name="Zoeker"
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        in_subject = InstrumentSubmission.objects.create(
+            owner=user, instrument="Motie", subject="Fietsparkeren Zuidas", date=date(2025, 4, 19),
+        )
+        in_body = InstrumentSubmission.objects.create(
+            owner=user, instrument="Motie", subject="Groen", date=date(2025, 4, 19),
+            considerations="overwegende dat fietsparkeren schaars is;",
+        )
+        other = InstrumentSubmission.objects.create(
+            owner=user, instrument="Motie", subject="Bomen", date=date(2025, 4, 19),
+        )
+        Submitter.objects.create(submission=other, initials="A.", lastname="Jansen", party="D66")
+        Note.objects.create(submission=other, user=user, text="Afstemmen met de wethouder")
+
+    base = InstrumentSubmission.objects.filter(owner=user)
+    assert list(order_by_rank(search_submissions(base, "fietspark"))) == [in_subject, in_body]
+    assert list(search_submissions(base, "jans")) == [other]
+    assert list(search_submissions(base, "wethouder")) == [other]
+
+    # Een gewijzigde notitie werkt het zoekdocument bij
+    with django_capture_on_commit_callbacks(execute=True):
+        Note.objects.filter(submission=other).first().delete()
+    assert not search_submissions(base, "wethouder").exists()
+
+
+@pytest.mark.django_db
+def test_search_pagination_with_tied_ranks(django_capture_on_commit_callbacks):
+    from instrument_generator.pagination import paginate_keyset
+    from instruments.search import RANK_ORDERING, search_submissions
+
+    user = User.objects.create_user(email="gelijk@example.com", password="secret", initials="G.", last_name="Gelijk")
+    with django_capture_on_commit_callbacks(execute=True):
+        # Identieke documenten: allemaal dezelfde rang
+        for _ in range(7):
+            InstrumentSubmission.objects.create(
+                owner=user, instrument="Motie", subject="Fietsparkeren", date=date(2025, 4, 19),
+            )
+    results = search_submissions(InstrumentSubmission.objects.filter(owner=user), "fietspark")
+    assert len({row.search_rank for row in results}) == 1
+
+    seen, cursor = [], None
+    while True:
+        page = paginate_keyset(results, RANK_ORDERING, cursor, per_page=3)
+        seen += [row.pk for row in page]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(results.values_list("pk", flat=True))
+
+    # En terug vanaf de laatste pagina
+    back, cursor = [], "last"
+    while cursor:
+        page = paginate_keyset(results, RANK_ORDERING, cursor, per_page=3)
+        back = [row.pk for row in page] + back
+        cursor = page.previous_cursor
+    assert back == seen
+
+
+@pytest.mark.django_db
+def test_keyset_pagination_walks_all_rows_without_offset(django_assert_num_queries):
+    from instrument_generator.pagination import paginate_keyset
+
+    user = User.objects.create_user(
+        email="pages@example.com",
+        password="secret",
+        initials="P.",
+        last_name="Pages"
+    )
+    # Veel gelijke datums, zodat de pk als tiebreaker nodig is
+    for i in range(23):
+        InstrumentSubmission.objects.create(
+            owner=user, instrument="Motie", subject=f"Motie {i:02d}", date=date(2025, 1, 1 + i % 3),
+        )
+    queryset = InstrumentSubmission.objects.filter(owner=user)
+    ordering = [("date", True), ("pk", True)]
+    expected = list(queryset.order_by("-date", "-pk"))
+
+    seen, cursor, numbers = [], None, []
+    while True:
+        # Eén query per pagina, zonder COUNT
+        with django_assert_num_queries(1) as ctx:
+            page = paginate_keyset(queryset, ordering, cursor, per_page=5)
+        assert "OFFSET" not in ctx.captured_queries[0]["sql"].upper()
+        seen.extend(page)
+        numbers.append(page.number)
+        if not page.has_next():
+            break
+        cursor = page.next_cursor
+    assert seen == expected
+    assert numbers == [1, 2, 3, 4, 5]
+
+    # Terugbladeren geeft dezelfde pagina's in dezelfde volgorde
+    previous = paginate_keyset(queryset, ordering, page.previous_cursor, per_page=5)
+    assert list(previous) == expected[15:20] and previous.number == 4
+    last = paginate_keyset(queryset, ordering, "last", per_page=5)
+    # De laatste pagina is altijd vol: de laatste vijf rijen
+    assert list(last) == expected[-5:] and last.has_previous() and not last.has_next()
+    # Een ongeldige cursor valt terug op de eerste pagina
+    assert list(paginate_keyset(queryset, ordering, "bogus", per_page=5)) == expected[:5]
+    assert page.count == 23
+
+
+@pytest.fixture
+def seeded_submissions(db):
+    """Een paar honderd submissions en notities verdeeld over meerdere eigenaren."""
+    users = [
+        User.objects.create_user(
+            email=f"plan{i}@example.com", password="secret", initials="P.", last_name=f"Plan {i}"
+        )
+        for i in range(4)
+    ]
+    InstrumentSubmission.objects.bulk_create(
+        InstrumentSubmission(
+            owner=users[i % len(users)],
+            instrument=("Motie", "Amendement", "Mondelinge vragen")[i % 3],
+            subject=f"Onderwerp {i:03d}",
+            date=date(2025, 1 + i % 12, 1 + i % 28),
+        )
+        for i in range(400)
+    )
+    submission = InstrumentSubmission.objects.filter(owner=users[0]).first()
+    Note.objects.bulk_create(
+        Note(submission_id=sub_id, user=users[0], text=f"Notitie {i}")
+        for i, sub_id in enumerate(InstrumentSubmission.objects.values_list("pk", flat=True))
+    )
+    # Verse statistieken, zoals in productie na autovacuum
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return users[0], submission
+
+
+@pytest.mark.parametrize("sort", ["updated_at_desc", "date_desc", "subject", "instrument"])
+def test_list_queries_use_owner_indexes(seeded_submissions, sort):
+    from instrument_generator.pagination import keyset_filter, order_by
+    from instrument_generator.testing import assert_no_seq_scan, assert_no_sort
+
+    user, submission = seeded_submissions
+    field = sort.replace("_desc", "")
+    ordering = [(field, sort.endswith("_desc")), ("pk", sort.endswith("_desc"))]
+    queryset = InstrumentSubmission.objects.filter(owner=user).order_by(*order_by(ordering))
+
+    # Eerste pagina en een volgende pagina (keyset-voorwaarde) volgen de index
+    for page in (queryset, queryset.filter(keyset_filter(ordering, [getattr(submission, field), submission.pk]))):
+        assert_no_seq_scan(page[:11])
+        assert_no_sort(page[:11])
+
+
+def test_notes_query_uses_submission_index(seeded_submissions):
+    from instrument_generator.testing import assert_no_seq_scan, assert_no_sort
+
+    _user, submission = seeded_submissions
+    notes = Note.objects.filter(submission=submission).select_related("user").order_by("-created_at", "-pk")
+    assert_no_seq_scan(notes[:20])
+    assert_no_sort(notes[:20])
+    # Controle van de controle: een filter zonder index wordt wel opgemerkt
+    with pytest.raises(AssertionError):
+        assert_no_seq_scan(Note.objects.filter(text="Notitie 1"))
+
+
+@pytest.mark.django_db
+def test_facet_counts_single_query_and_cached(django_assert_num_queries):
+    from instruments.facets import cached_facet_counts, facet_counts, selected_facets
+    from instruments.models import Submitter
+
+    user = User.objects.create_user(
+        email="facets@example.com",
+        password="secret",
+        initials="F.",
+        last_name="Facets"
+    )
+    for i, (instrument, party) in enumerate([("Motie", "D66"), ("Motie", "PvdA"), ("Amendement", "D66")]):
+        sub = InstrumentSubmission.objects.create(
+            owner=user, instrument=instrument, subject=f"Facet {i}", date=date(2025, 3 + i // 2, 1),
+        )
+        Submitter.objects.create(submission=sub, initials="A.", lastname="Jansen", party=party)
+        # Twee indieners van dezelfde partij tellen als één submission
+        Submitter.objects.create(submission=sub, initials="B.", lastname="de Vries", party=party)
+    base = InstrumentSubmission.objects.filter(owner=user)
+
+    with django_assert_num_queries(1):
+        counts = facet_counts(base, {})
+    assert counts == {
+        "instrument": [("Amendement", 1), ("Motie", 2)],
+        "month": [("2025-04", 1), ("2025-03", 2)],
+        "party": [("D66", 2), ("PvdA", 1)],
+    }
+
+    # Een facet telt zonder zijn eigen filter, wel met de andere
+    selected = selected_facets({"instrument": "Motie", "month": "2025-13"})
+    assert selected == {"instrument": "Motie"}
+    counts = facet_counts(base, selected)
+    assert counts["instrument"] == [("Amendement", 1), ("Motie", 2)]
+    assert counts["party"] == [("D66", 1), ("PvdA", 1)]
+
+    # Gecachet per gebruiker; een nieuwe submission maakt de cache ongeldig
+    cached_facet_counts(user, base, {}, {})
+    with django_assert_num_queries(0):
+        cached_facet_counts(user, base, {}, {})
+    InstrumentSubmission.objects.create(owner=user, instrument="Motie", subject="Nieuw", date=date(2025, 3, 2))
+    assert dict(cached_facet_counts(user, base, {}, {})["instrument"])["Motie"] == 3
+
+
+@pytest.mark.django_db
+def test_note_change_invalidates_search_facets(django_capture_on_commit_callbacks):
+    from instruments.facets import cached_facet_counts
+    from instruments.search import search_submissions
+
+    user = User.objects.create_user(
+        email="notefacets@example.com",
+        password="secret",
+        initials="N.",
+        last_name="Notities"
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        sub = InstrumentSubmission.objects.create(
+            owner=user, instrument="Motie", subject="Zonder trefwoord", date=date(2025, 3, 1),
+        )
+    params = {"q": "windmolenpark"}
+
+    def counts():
+        base = search_submissions(InstrumentSubmission.objects.filter(owner=user), params["q"])
+        return cached_facet_counts(user, base, {}, params)["instrument"]
+
+    assert counts() == []
+    # De notitie maakt de submission vindbaar; de gecachte tellingen vervallen na de commit
+    with django_capture_on_commit_callbacks(execute=True):
+        Note.objects.create(submission=sub, user=user, text="Over het windmolenpark")
+    assert counts() == [("Motie", 1)]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url_name", ["instrument_submission_create", "instrument_submission_edit"])
+def test_invalid_form_keeps_posted_submitters(client, url_name):
+    from django.urls import reverse
+
+    user = User.objects.create(
+        email="formset@example.com", initials="F.", last_name="Formset", is_active=True, is_approved=True,
+    )
+    sub = InstrumentSubmission.objects.create(owner=user, instrument="Motie", subject="Bestaand", date=date(2025, 1, 1))
+    client.force_login(user)
+    kwargs = {"pk": sub.pk} if url_name == "instrument_submission_edit" else {}
+    response = client.post(reverse(url_name, kwargs=kwargs), {
+        "instrument": "Motie",
+        "subject": "Ongeldig",
+        "date": "geen datum",
+        "submitters-TOTAL_FORMS": "1",
+        "submitters-INITIAL_FORMS": "0",
+        "submitters-MIN_NUM_FORMS": "0",
+        "submitters-MAX_NUM_FORMS": "1000",
+        "submitters-0-initials": "U.",
+        "submitters-0-lastname": "Uniekenaam",
+        "submitters-0-party": "D66",
+    })
+    assert response.status_code == 200
+    assert "Uniekenaam" in response.content.decode()
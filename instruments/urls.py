@@ -12,11 +12,13 @@ urlpatterns = [
     path("submissions/", views.InstrumentSubmissionListView.as_view(), name="instrument_submission_list"),
     path("submissions/new/", views.InstrumentSubmissionCreateView.as_view(), name="instrument_submission_create"),
     path("submissions/<int:pk>/", views.InstrumentSubmissionDetailView.as_view(), name="instrument_submission_detail"),
+    path("submissions/preview/", views.SubmissionLivePreviewView.as_view(), name="instrument_submission_live_preview"),
     path("submissions/edit/<int:pk>/", views.InstrumentSubmissionUpdateView.as_view(), name="instrument_submission_edit"),
     path("submissions/delete/<int:pk>/", views.InstrumentSubmissionDeleteView.as_view(), name="instrument_submission_delete"),
     path("submissions/export/", export_and_email_views.export_submissions_csv, name="instrument_submission_export"),
     path("submissions/export-pdf/", export_and_email_views.export_submissions_pdf, name="instrument_submission_export_pdf"),
     path("submissions/<int:pk>/download-preview/", export_and_email_views.export_submission_pdf, name="submission_preview_pdf"),
+    path("submissions/<int:pk>/notes/", views.SubmissionNotesView.as_view(), name="submission_notes"),
     path("notes/<int:pk>/edit/", views.NoteUpdateView.as_view(), name="note_edit"),
     path("notes/<int:pk>/delete/", views.NoteDeleteView.as_view(), name="note_delete"),
     path("submissions/<int:pk>/export-docx/", export_and_email_views.export_submission_docx, name="instrument_submission_export_docx"),
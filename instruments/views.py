@@ -6,8 +6,9 @@ Export- en e-mailfuncties zijn verplaatst naar export_and_email_views.py.
 """
 
 import csv
+import time
 from django.core.mail import EmailMessage
-from django.db.models import Q
+from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.views.generic import CreateView, UpdateView, DetailView, DeleteView, ListView
@@ -17,10 +18,22 @@ from django.urls import reverse_lazy
 from django.template.loader import render_to_string
 from django.http import HttpResponse, JsonResponse, HttpResponseForbidden, Http404
 from django.contrib import messages
+from django.apps import apps
+from django.db.models import OuterRef, Subquery
 
 from instruments.models import InstrumentSubmission, Note
+from instruments.search import RANK_ORDERING, search_submissions
+from instruments.facets import apply_facets, cached_facet_counts, facet_choices, selected_facets
+from instrument_generator.pagination import order_by as keyset_order_by, paginate_keyset
 from instruments.forms import InstrumentSubmissionForm, SubmitterFormSet, NoteForm
 from instruments.exports.compose_text import process_gui_data
+from instruments.previews import (
+    PREVIEW_HTML_TEMPLATE,
+    PREVIEW_TXT_TEMPLATE,
+    draft_preview_inputs,
+    get_preview_data,
+    render_preview,
+)
 
 # Definieer de e-mail export opties die je wilt aanbieden
 EMAIL_OPTIONS = [
@@ -41,6 +54,33 @@ DOWNLOAD_OPTIONS = [
     # Voeg hier andere downloadopties toe als je die hebt
 ]
 
+# Aantal notities per pagina; volgende pagina's laadt de pagina via AJAX bij
+NOTES_PER_PAGE = 20
+
+
+def paginate_notes(submission, page_number=1):
+    """Geef één pagina notities van een submission, met auteur en partij in dezelfde query."""
+    notes = (
+        Note.objects.filter(submission=submission)
+        .select_related('user', 'user__party')
+        .order_by('-created_at', '-pk')
+    )
+    return Paginator(notes, NOTES_PER_PAGE).get_page(page_number)
+
+
+def render_note(request, note):
+    """Render het HTML-fragment van één notitie."""
+    return render_to_string(
+        'instruments/partials/note_item.html',
+        {'note': note, 'user': request.user},
+        request=request,
+    )
+
+
+def is_ajax(request):
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+
 class InstrumentSubmissionCreateView(CreateView):
     """
     View voor het aanmaken van een nieuwe instrument submission.
@@ -52,12 +92,14 @@ class InstrumentSubmissionCreateView(CreateView):
     template_name = "instruments/submission_form.html"
 
     def get_context_data(self, **kwargs):
-        # Voeg de submitter formset toe aan de context
+        # Voeg de submitter formset toe aan de context (bij een ongeldige formset al gebonden)
         context = super().get_context_data(**kwargs)
-        if self.request.method == 'POST':
-            context['submitter_formset'] = SubmitterFormSet(self.request.POST, instance=self.object)
-        else:
-            context['submitter_formset'] = SubmitterFormSet(instance=self.object)
+        if 'submitter_formset' not in context:
+            if self.request.method == 'POST':
+                # Ongeldig hoofdformulier: de geposte indieners opnieuw tonen
+                context['submitter_formset'] = SubmitterFormSet(self.request.POST, instance=self.object)
+            else:
+                context['submitter_formset'] = SubmitterFormSet(instance=self.object)
         # Voeg export- en e-mail opties toe voor download/email modals
         context['download_export_options'] = DOWNLOAD_OPTIONS
         context['email_export_options'] = EMAIL_OPTIONS
@@ -68,9 +110,9 @@ class InstrumentSubmissionCreateView(CreateView):
     def form_valid(self, form):
         # Stel de eigenaar van de submission in op de huidige gebruiker
         form.instance.owner = self.request.user
-        context = self.get_context_data()
-        submitter_formset = context['submitter_formset']
-        if submitter_formset.is_valid() and form.is_valid():
+        # Formset direct bouwen; get_context_data is pas nodig als we het formulier opnieuw tonen
+        submitter_formset = SubmitterFormSet(self.request.POST, instance=form.instance)
+        if submitter_formset.is_valid():
             self.object = form.save()
             submitter_formset.instance = self.object
             submitter_formset.save()
@@ -79,7 +121,9 @@ class InstrumentSubmissionCreateView(CreateView):
             if action == "save_stay":
                 return redirect("instrument_submission_edit", pk=self.object.pk)
             return redirect("instrument_submission_detail", pk=self.object.pk)
-        return self.form_invalid(form)
+        return self.render_to_response(
+            self.get_context_data(form=form, submitter_formset=submitter_formset)
+        )
 
 
 class InstrumentSubmissionUpdateView(UpdateView):
@@ -97,36 +141,29 @@ class InstrumentSubmissionUpdateView(UpdateView):
         return qs.filter(owner=self.request.user)
 
     def get_context_data(self, **kwargs):
-        # Voeg de submitter formset toe aan de context
+        # Voeg de submitter formset toe aan de context (bij een ongeldige formset al gebonden)
         context = super().get_context_data(**kwargs)
-        if self.request.method == 'POST':
-            context['submitter_formset'] = SubmitterFormSet(self.request.POST, instance=self.object)
-        else:
-            context['submitter_formset'] = SubmitterFormSet(instance=self.object)
+        if 'submitter_formset' not in context:
+            if self.request.method == 'POST':
+                # Ongeldig hoofdformulier: de geposte indieners opnieuw tonen
+                context['submitter_formset'] = SubmitterFormSet(self.request.POST, instance=self.object)
+            else:
+                context['submitter_formset'] = SubmitterFormSet(instance=self.object)
         # Add notes and note form for the submission_form template
-        context['notes'] = Note.objects.filter(submission=self.object).order_by('-created_at')
+        context['notes'] = paginate_notes(self.object)
         context['note_form'] = NoteForm()
         # Voeg export- en e-mail opties toe voor download/email modals
         context['download_export_options'] = DOWNLOAD_OPTIONS
         context['email_export_options'] = EMAIL_OPTIONS
         # Voeg preview toe voor share-button (zelfde als detailview)
-        submission = self.object
-        table_data = [[s.initials, s.lastname, s.party] for s in submission.submitters.all()]
-        preview_data = process_gui_data(
-            table_data=table_data,
-            instrument=submission.instrument,
-            subject=submission.subject,
-            date_str=str(submission.date),
-            considerations=submission.considerations,
-            requests=submission.requests
-        )
-        context['preview'] = render_to_string("instruments/previews/template.txt", preview_data)
+        context['preview'] = render_preview(self.object)
         return context
 
     def form_valid(self, form):
-        context = self.get_context_data()
-        submitter_formset = context['submitter_formset']
-        if submitter_formset.is_valid() and form.is_valid():
+        # Alleen opslaan: geen preview, notities of exportopties renderen.
+        # Notities gaan via SubmissionNotesView.
+        submitter_formset = SubmitterFormSet(self.request.POST, instance=self.object)
+        if submitter_formset.is_valid():
             self.object = form.save()
             submitter_formset.instance = self.object
             submitter_formset.save()
@@ -135,28 +172,29 @@ class InstrumentSubmissionUpdateView(UpdateView):
             if action == "save_stay":
                 return redirect("instrument_submission_edit", pk=self.object.pk)
             return redirect("instrument_submission_detail", pk=self.object.pk)
-        return self.form_invalid(form)
+        return self.render_to_response(
+            self.get_context_data(form=form, submitter_formset=submitter_formset)
+        )
+
+class SubmissionLivePreviewView(View):
+    """
+    Live preview tijdens het bewerken: rendert de preview uit de (niet
+    opgeslagen) formulierdata zonder iets in de database of cache te schrijven.
+    De secties uit compose_text zijn los gememoïseerd, zodat bij elke
+    toetsaanslag alleen het gewijzigde deel opnieuw wordt opgebouwd.
+    """
+    templates = {'txt': PREVIEW_TXT_TEMPLATE, 'html': PREVIEW_HTML_TEMPLATE}
 
     def post(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        # Detecteer AJAX-aanvraag voor notitie
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest' and 'text' in request.POST:
-            note_form = NoteForm(request.POST)
-            if note_form.is_valid():
-                note = note_form.save(commit=False)
-                note.submission = self.object
-                note.user = request.user
-                note.save()
-                # Render alleen de bijgewerkte lijst-notities
-                notes = Note.objects.filter(submission=self.object).order_by('-created_at')
-                html = render_to_string('instruments/partials/notes_list.html', {
-                    'notes': notes,
-                    'user': request.user
-                }, request=request)
-                return JsonResponse({'notes_html': html})
-            return JsonResponse({'errors': note_form.errors}, status=400)
-        # Valideer geen AJAX? Laat de standaard UpdateView doorlopen
-        return super().post(request, *args, **kwargs)
+        started = time.perf_counter()
+        template_name = self.templates.get(request.POST.get('format', 'txt'))
+        if template_name is None:
+            return JsonResponse({'error': 'Onbekend formaat'}, status=400)
+        data = process_gui_data(**draft_preview_inputs(request.POST))
+        response = JsonResponse({'preview': render_to_string(template_name, data)})
+        response['Server-Timing'] = f"preview;dur={(time.perf_counter() - started) * 1000:.1f}"
+        return response
+
 
 class InstrumentSubmissionDeleteView(DeleteView):
     """
@@ -173,6 +211,36 @@ class InstrumentSubmissionDeleteView(DeleteView):
         return qs.filter(owner=self.request.user)
 
 
+def attach_latest_approvals(submissions):
+    """
+    Zet per submission `latest_approval`: het nieuwste goedkeuringsverzoek of
+    None. Eén query voor alle submissions samen in plaats van twee per rij.
+    """
+    for submission in submissions:
+        submission.latest_approval = None
+    if not submissions or not apps.is_installed("approvals"):
+        return
+    ApprovalRequest = apps.get_model("approvals", "ApprovalRequest")
+    latest_pk = ApprovalRequest.objects.filter(
+        submission=OuterRef("submission")
+    ).order_by("-created_at", "-pk").values("pk")[:1]
+    latest = ApprovalRequest.objects.filter(
+        submission__in=submissions, pk=Subquery(latest_pk)
+    )
+    by_submission = {request.submission_id: request for request in latest}
+    for submission in submissions:
+        submission.latest_approval = by_submission.get(submission.pk)
+
+
+def approval_history(submission):
+    """Goedkeuringsverzoeken van een submission, nieuwste eerst, met aanvrager en beoordelaar."""
+    if not apps.is_installed("approvals"):
+        return []
+    return list(
+        submission.approval_requests.select_related("requester", "reviewer").order_by("-created_at", "-pk")
+    )
+
+
 class InstrumentSubmissionListView(ListView):
     """
     View voor het tonen van een lijst met instrument submissions met filter- en sorteermogelijkheden.
@@ -183,21 +251,14 @@ class InstrumentSubmissionListView(ListView):
     context_object_name = "submissions"
     paginate_by = 10
 
-    def get_queryset(self):
+    def filtered_queryset(self):
+        """De submissions van de gebruiker met zoekterm en datumbereik, nog zonder facetfilters."""
         # Begin met alleen de submissions van de ingelogde gebruiker
-        queryset = super().get_queryset().filter(owner=self.request.user).prefetch_related("submitters")
+        queryset = InstrumentSubmission.objects.filter(owner=self.request.user)
         q = self.request.GET.get("q", "").strip()
         if q:
-            queryset = queryset.filter(
-                Q(subject__icontains=q) |
-                Q(submitters__lastname__icontains=q) |
-                Q(submitters__initials__icontains=q) |
-                Q(instrument__icontains=q)
-            ).distinct()
-
-        instrument_filter = self.request.GET.get("instrument", "")
-        if instrument_filter:
-            queryset = queryset.filter(instrument__iexact=instrument_filter)
+            # Zoekt via de zoekdocumenten (full-text index), zie instruments/search.py
+            queryset = search_submissions(queryset, q)
 
         date_from = self.request.GET.get("date_from", "")
         date_to = self.request.GET.get("date_to", "")
@@ -205,60 +266,58 @@ class InstrumentSubmissionListView(ListView):
             queryset = queryset.filter(date__gte=date_from)
         if date_to:
             queryset = queryset.filter(date__lte=date_to)
+        return queryset
 
+    def get_queryset(self):
+        q = self.request.GET.get("q", "").strip()
+        # Instrument, maand en partij; zie instruments/facets.py
+        self.selected_facets = selected_facets(self.request.GET)
+        queryset = apply_facets(self.filtered_queryset(), self.selected_facets).prefetch_related("submitters")
+
+        # Keyset-paginering: de volgorde eindigt altijd op pk, zodat elke rij een vaste plek heeft
+        self.keyset_ordering = [("updated_at", True), ("pk", True)]  # default op laatst bewerkt
         sort = self.request.GET.get("sort")
         if sort:
-            # Implementeer hier je sorteerlogica (bv. met een helper functie of direct)
             # Zorg ervoor dat de sorteervelden veilig zijn
             allowed_sort_fields = ['subject', 'instrument', 'date', 'updated_at']
             sort_field = sort.replace('_desc', '')
-            direction = '-' if sort.endswith('_desc') else ''
+            descending = sort.endswith('_desc')
 
             if sort_field in allowed_sort_fields:
-                 queryset = queryset.order_by(f"{direction}{sort_field}")
-            # else: negeer ongeldige sorteerparameter of gebruik default
+                self.keyset_ordering = [(sort_field, descending), ("pk", descending)]
+            # else: negeer ongeldige sorteerparameter en gebruik default
 
-        # Default sortering als er geen geldige sort is opgegeven
-        elif not queryset.query.order_by:
-             queryset = queryset.order_by('-updated_at') # Bijvoorbeeld default op laatst bewerkt
+        # Bij een zoekopdracht zonder sortering: meest relevante eerst
+        elif q:
+            self.keyset_ordering = RANK_ORDERING
 
-        return queryset
+        return queryset.order_by(*keyset_order_by(self.keyset_ordering))
+
+    def paginate_queryset(self, queryset, page_size):
+        # Geen OFFSET en geen COUNT(*): de cursor bevat de sorteerwaarden van de vorige pagina
+        page = paginate_keyset(queryset, self.keyset_ordering, self.request.GET.get("cursor"), page_size)
+        attach_latest_approvals(page.object_list)
+        return None, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         # Voeg extra contextinformatie toe
         context = super().get_context_data(**kwargs)
         context["request"] = self.request # Nodig voor url_replace tag
 
-        # Haal unieke instrumentsoorten voor de filter dropdown
-        context["instrument_choices"] = (
-            InstrumentSubmission.objects.filter(owner=self.request.user)
-            .order_by("instrument")
-            .values_list("instrument", flat=True)
-            .distinct()
+        # Facetten met aantallen voor de filters: één (gecachte) query
+        counts = cached_facet_counts(
+            self.request.user, self.filtered_queryset(), self.selected_facets, self.request.GET
         )
+        context["facets"] = facet_choices(counts)
+        context["selected_facets"] = self.selected_facets
 
         context['email_export_options'] = EMAIL_OPTIONS
         context['download_export_options'] = DOWNLOAD_OPTIONS
 
         # context['submissions'] is een Paginator Page of lijst van submissions
         for submission in context['submissions']:
-            table_data = [
-                [s.initials, s.lastname, s.party]
-                for s in submission.submitters.all()
-            ]
-            preview_data = process_gui_data(
-                table_data=table_data,
-                instrument=submission.instrument,
-                subject=submission.subject,
-                date_str=str(submission.date),
-                considerations=submission.considerations,
-                requests=submission.requests,
-            )
-            # render_to_string haalt hetzelfde template als in detailview
-            submission.preview = render_to_string(
-                "instruments/previews/template.txt",
-                preview_data
-            )
+            # Zelfde (gecachte) preview als in de detailview
+            submission.preview = render_preview(submission)
 
         return context
 
@@ -293,20 +352,12 @@ class SubmissionDisplayView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         submission = self.object
-        # Bouw data op uit de submitters om een preview te genereren
-        table_data = [[s.initials, s.lastname, s.party] for s in submission.submitters.all()]
-        preview_data = process_gui_data(
-            table_data=table_data,
-            instrument=submission.instrument,
-            subject=submission.subject,
-            date_str=str(submission.date),
-            considerations=submission.considerations,
-            requests=submission.requests
-        )
-        context["preview"] = render_to_string("instruments/previews/template.txt", preview_data)
-        context["preview_data"] = preview_data
+        # Preview (en de onderliggende data) komen uit de cache
+        context["preview"] = render_preview(submission)
+        context["preview_data"] = get_preview_data(submission)
         context["note_form"] = NoteForm()
-        context["notes"] = submission.notes.order_by("-created_at")
+        context["notes"] = paginate_notes(submission)
+        context["approval_requests"] = approval_history(submission)
         context['download_export_options'] = DOWNLOAD_OPTIONS
         context['email_export_options'] = EMAIL_OPTIONS
         return context
@@ -333,7 +384,65 @@ class SubmissionNotePostView(SingleObjectMixin, View):
         return redirect("instrument_submission_detail", pk=self.object.pk)
     
 
-class NoteUpdateView(UpdateView):
+class SubmissionNotesView(SingleObjectMixin, View):
+    """
+    Lichte notitie-endpoint van een submission.
+    GET geeft een volgende pagina notities als fragment, POST voegt één notitie
+    toe en geeft alleen het fragment van die notitie terug.
+    """
+    model = InstrumentSubmission
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        return qs.filter(owner=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        page = paginate_notes(self.object, request.GET.get('page', 1))
+        html = ''.join(render_note(request, note) for note in page)
+        next_url = None
+        if page.has_next():
+            next_url = f"{request.path}?page={page.next_page_number()}"
+        return JsonResponse({'notes_html': html, 'next_url': next_url})
+
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        form = NoteForm(request.POST)
+        if not form.is_valid():
+            if is_ajax(request):
+                return JsonResponse({'errors': form.errors}, status=400)
+            return redirect("instrument_submission_detail", pk=self.object.pk)
+        note = form.save(commit=False)
+        note.submission = self.object
+        note.user = request.user
+        note.save()
+        if is_ajax(request):
+            return JsonResponse({'note_id': note.pk, 'note_html': render_note(request, note)})
+        return redirect("instrument_submission_detail", pk=self.object.pk)
+
+
+class NoteOwnerMixin:
+    """
+    Laadt de notitie één keer per request en staat alleen de auteur toe.
+    """
+    forbidden_message = "Je mag alleen je eigen notities bewerken."
+
+    def get_queryset(self):
+        return Note.objects.select_related('user', 'user__party')
+
+    def get_object(self, queryset=None):
+        if getattr(self, '_note', None) is None:
+            self._note = super().get_object(queryset)
+        return self._note
+
+    def dispatch(self, request, *args, **kwargs):
+        note = self.get_object()
+        if note.user_id != request.user.pk:
+            return HttpResponseForbidden(self.forbidden_message)
+        return super().dispatch(request, *args, **kwargs)
+
+
+class NoteUpdateView(NoteOwnerMixin, UpdateView):
     """
     View voor het aanpassen van een notitie die gekoppeld is aan een instrument submission.
     Alleen de eigenaar van de notitie mag deze bewerken.
@@ -343,63 +452,41 @@ class NoteUpdateView(UpdateView):
     template_name = "instruments/note_form.html"
 
     def get_success_url(self):
-        return reverse_lazy("instrument_submission_detail", kwargs={"pk": self.object.submission.pk})
-
-    def dispatch(self, request, *args, **kwargs):
-        note = self.get_object()
-        if note.user != request.user:
-            return HttpResponseForbidden("Je mag alleen je eigen notities bewerken.")
-        return super().dispatch(request, *args, **kwargs)
+        return reverse_lazy("instrument_submission_detail", kwargs={"pk": self.object.submission_id})
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
-        # Handle inline AJAX edit
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest' and 'text' in request.POST:
-            # Update note text
-            self.object.text = request.POST['text']
-            self.object.save()
-            # Re-render notes list partial
-            notes = Note.objects.filter(submission=self.object.submission).order_by('-created_at')
-            html = render_to_string(
-                'instruments/partials/notes_list.html',
-                {'notes': notes, 'user': request.user},
-                request=request
-            )
-            return JsonResponse({'notes_html': html})
+        # Handle inline AJAX edit: geef alleen de bijgewerkte notitie terug
+        if is_ajax(request):
+            form = NoteForm(request.POST, instance=self.object)
+            if not form.is_valid():
+                return JsonResponse({'errors': form.errors}, status=400)
+            note = form.save()
+            return JsonResponse({'note_id': note.pk, 'note_html': render_note(request, note)})
         # Fallback to normal UpdateView handling
         return super().post(request, *args, **kwargs)
 
 
-class NoteDeleteView(DeleteView):
+class NoteDeleteView(NoteOwnerMixin, DeleteView):
     """
     View voor het verwijderen van een notitie.
     Alleen de eigenaar mag zijn notitie verwijderen.
     """
     model = Note
     template_name = "instruments/note_confirm_delete.html"
+    forbidden_message = "Je mag alleen je eigen notities verwijderen."
 
     def get_success_url(self):
-        return reverse_lazy("instrument_submission_detail", kwargs={"pk": self.object.submission.pk})
-
-    def dispatch(self, request, *args, **kwargs):
-        note = self.get_object()
-        if note.user != request.user:
-            return HttpResponseForbidden("Je mag alleen je eigen notities verwijderen.")
-        return super().dispatch(request, *args, **kwargs)
+        return reverse_lazy("instrument_submission_detail", kwargs={"pk": self.object.submission_id})
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
-        submission = self.object.submission
+        note_id = self.object.pk
+        submission_id = self.object.submission_id
         # Delete the note
         self.object.delete()
-        # If AJAX request, return updated notes_list partial
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            notes = Note.objects.filter(submission=submission).order_by('-created_at')
-            html = render_to_string(
-                'instruments/partials/notes_list.html',
-                {'notes': notes, 'user': request.user},
-                request=request
-            )
-            return JsonResponse({'notes_html': html})
+        # If AJAX request, de client haalt alleen dit element weg
+        if is_ajax(request):
+            return JsonResponse({'deleted': note_id})
         # Fallback: redirect back to the edit form
-        return redirect('instrument_submission_edit', pk=submission.pk)
+        return redirect('instrument_submission_edit', pk=submission_id)
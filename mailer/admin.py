@@ -1,8 +1,34 @@
 from django.contrib import admin
-from .models import SentEmail
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import OutboxEmail, SentEmail
 
 @admin.register(SentEmail)
 class SentEmailAdmin(admin.ModelAdmin):
     list_display = ("subject", "to", "sent_at", "user")
-    search_fields = ("subject", "to", "html_message")
-    ordering = ("-sent_at",)
\ No newline at end of file
+    # De inhoud is gecomprimeerd en daardoor niet doorzoekbaar
+    search_fields = ("subject", "to")
+    ordering = ("-sent_at",)
+    fields = ("subject", "to", "sent_at", "user", "message")
+    readonly_fields = ("sent_at", "message")
+    list_select_related = ("user",)
+
+    @admin.display(description="Bericht")
+    def message(self, obj):
+        return format_html('<pre style="white-space: pre-wrap">{}</pre>', obj.html_message)
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "to", "status", "attempts", "next_attempt_at", "created_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "to")
+    ordering = ("-created_at",)
+    readonly_fields = ("attempts", "last_error", "created_at", "sent_at")
+    actions = ["retry_now"]
+
+    @admin.action(description="Nu opnieuw proberen")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status="SENT").update(
+            status="PENDING", attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} e-mail(s) opnieuw ingepland.")
@@ -0,0 +1,86 @@
+"""
+Module: mailer/connection.py
+Beschrijving: Eén langlevende verbinding met de mailserver voor de dispatcher.
+
+Zonder gedeelde verbinding opent elke mail een eigen SSL-sessie met
+EMAIL_HOST. MailConnection houdt de backend van get_connection() open over
+alle mails van een batch en, in een draaiende dispatcher, over batches heen.
+Na KEEPALIVE_AFTER seconden stilte wordt de sessie met een NOOP gecontroleerd
+en na MAX_IDLE seconden preventief gesloten (mailservers verbreken stille
+sessies zelf ook). Valt de verbinding tijdens het versturen weg, dan wordt
+eenmaal opnieuw verbonden en dezelfde mail nogmaals geprobeerd.
+
+Backends zonder SMTP-sessie (locmem, console) werken ongewijzigd.
+"""
+
+import logging
+import smtplib
+import time
+
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_AFTER = 30
+MAX_IDLE = 240
+
+# Fouten die op een verbroken sessie wijzen, niet op een probleem met de mail zelf
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class MailConnection:
+    """Een (her)bruikbare verbinding met de mailserver; zie de moduledocumentatie."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_connection()
+        self.last_used = None
+
+    def _session(self):
+        # Alleen de SMTP-backend heeft een onderliggende smtplib-sessie
+        return getattr(self.backend, 'connection', None)
+
+    def _alive(self):
+        session = self._session()
+        if session is None:
+            return True
+        try:
+            return session.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def open(self):
+        """Open de sessie, of controleer en hergebruik een bestaande."""
+        if self.last_used is not None:
+            idle = time.monotonic() - self.last_used
+            if idle > MAX_IDLE or (idle > KEEPALIVE_AFTER and not self._alive()):
+                self.close()
+        if self.last_used is None:
+            self.backend.open()
+            self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.backend.close()
+        except (smtplib.SMTPException, OSError):
+            # Een half verbroken sessie kan niet netjes worden afgesloten
+            pass
+        self.last_used = None
+
+    def send(self, message):
+        """Verstuur één bericht over de gedeelde sessie, met één herverbinding bij een verbroken sessie."""
+        self.open()
+        message.connection = self.backend
+        try:
+            message.send()
+        except CONNECTION_ERRORS as exc:
+            logger.info("Verbinding met de mailserver verbroken (%s); opnieuw verbinden", exc)
+            self.close()
+            self.open()
+            message.send()
+        self.last_used = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
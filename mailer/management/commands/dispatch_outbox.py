@@ -0,0 +1,58 @@
+"""
+Management command die de e-mailoutbox leegt (zie mailer/outbox.py). Verstuurt
+de wachtende mails die aan de beurt zijn in batches; mislukte mails worden met
+oplopende wachttijd opnieuw ingepland en na MAX_ATTEMPTS pogingen opgegeven.
+
+Zonder --loop worden alle mails die nu aan de beurt zijn verstuurd, waarna de
+command stopt (geschikt voor cron). Met --loop blijft hij draaien als aparte
+worker naast de webserver en kijkt hij elke --interval seconden opnieuw; de
+verbinding met de mailserver blijft dan tussen de batches open.
+
+Gebruik:
+python manage.py dispatch_outbox [--batch-size 100] [--loop] [--interval 5]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from mailer.connection import MailConnection
+from mailer.outbox import BATCH_SIZE, dispatch
+
+
+class Command(BaseCommand):
+    help = "Verstuurt de wachtende e-mails uit de outbox, met herhaalpogingen."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE,
+            help=f"Aantal mails per transactie (default {BATCH_SIZE}).",
+        )
+        parser.add_argument("--loop", action="store_true", help="Blijven draaien en periodiek opnieuw kijken.")
+        parser.add_argument(
+            "--interval", type=float, default=5,
+            help="Seconden wachten als de outbox leeg is, met --loop (default 5).",
+        )
+
+    def handle(self, *args, **options):
+        # Eén sessie met de mailserver voor alle batches, zolang hij in leven blijft
+        with MailConnection() as connection:
+            while True:
+                totals = self.drain(options["batch_size"], connection)
+                if any(totals):
+                    self.stdout.write(
+                        self.style.SUCCESS("{} verzonden, {} opnieuw ingepland, {} opgegeven.".format(*totals))
+                    )
+                if not options["loop"]:
+                    return
+                time.sleep(options["interval"])
+
+    def drain(self, batch_size, connection):
+        """Batches versturen tot er geen mail meer aan de beurt is."""
+        totals = [0, 0, 0]
+        while True:
+            counts = dispatch(batch_size, connection)
+            for index, count in enumerate(counts):
+                totals[index] += count
+            if sum(counts) < batch_size:
+                return totals
@@ -0,0 +1,38 @@
+"""
+Management command die het e-mailarchief opschoont (zie mailer/retention.py):
+verstuurde mails ouder dan de bewaartermijn, afgehandelde outbox-mails en
+inhoud waar niets meer naar verwijst. Bedoeld om dagelijks via cron te draaien.
+
+Gebruik:
+python manage.py prune_sent_emails [--days 365] [--batch-size 1000]
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from mailer.retention import BATCH_SIZE, RETENTION_DAYS, prune
+
+
+class Command(BaseCommand):
+    help = "Verwijdert verstuurde e-mails ouder dan de bewaartermijn, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=RETENTION_DAYS,
+            help=f"Bewaartermijn in dagen (default {RETENTION_DAYS}).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE,
+            help=f"Aantal rijen per DELETE (default {BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--days en --batch-size moeten minstens 1 zijn.")
+        now = timezone.now()
+        sent, outbox, bodies = prune(now - timedelta(days=options["days"]), now, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{sent} verstuurde mails, {outbox} outbox-mails en {bodies} berichtinhouden verwijderd."
+        ))
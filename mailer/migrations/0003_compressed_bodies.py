@@ -0,0 +1,59 @@
+import hashlib
+import zlib
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def move_bodies(apps, schema_editor):
+    """Bestaande html_message-teksten comprimeren en ontdubbelen."""
+    SentEmail = apps.get_model('mailer', 'SentEmail')
+    EmailBody = apps.get_model('mailer', 'EmailBody')
+    bodies = {}
+    batch = []
+
+    def flush():
+        SentEmail.objects.bulk_update(batch, ['body'])
+        batch.clear()
+
+    for email in SentEmail.objects.only('pk', 'html_message', 'sent_at').order_by('pk').iterator(chunk_size=500):
+        digest = hashlib.sha256(email.html_message.encode()).hexdigest()
+        body_id = bodies.get(digest)
+        if body_id is None:
+            body_id = bodies[digest] = EmailBody.objects.create(
+                sha256=digest,
+                data=zlib.compress(email.html_message.encode()),
+                size=len(email.html_message),
+            ).pk
+        email.body_id = body_id
+        batch.append(email)
+        if len(batch) >= 500:
+            flush()
+    flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailer', '0002_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailBody',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField(help_text='Lengte van de ongecomprimeerde inhoud')),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sentemail',
+            name='body',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sent_emails', to='mailer.emailbody'),
+        ),
+        migrations.RunPython(move_bodies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Apart van 0003: PostgreSQL staat geen ALTER TABLE toe na de data-update in dezelfde transactie
+
+    dependencies = [
+        ('mailer', '0003_compressed_bodies'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='sentemail',
+            name='html_message',
+        ),
+        migrations.AlterField(
+            model_name='sentemail',
+            name='body',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sent_emails', to='mailer.emailbody'),
+        ),
+        migrations.AlterField(
+            model_name='sentemail',
+            name='sent_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
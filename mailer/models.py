@@ -1,12 +1,111 @@
+import hashlib
+import zlib
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+class EmailBody(models.Model):
+    """
+    De inhoud van een verstuurde mail, zlib-gecomprimeerd en één keer
+    opgeslagen per unieke inhoud (sha256). Zie SentEmail en mailer/retention.py.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField(help_text="Lengte van de ongecomprimeerde inhoud")
+    # Bijgewerkt bij elk hergebruik, zodat opschonen nooit een zojuist gevonden inhoud weggooit
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @property
+    def text(self):
+        return zlib.decompress(self.data).decode()
+
+    @classmethod
+    def for_texts(cls, texts):
+        """
+        De EmailBody per inhoud, als {tekst: EmailBody}; ontbrekende worden
+        in één insert aangemaakt.
+        """
+        by_digest = {cls.digest(text): text for text in texts}
+        if not by_digest:
+            return {}
+        bodies = {
+            body.sha256: body
+            for body in cls.objects.filter(sha256__in=by_digest).only('pk', 'sha256')
+        }
+        now = timezone.now()
+        if bodies:
+            cls.objects.filter(pk__in=[body.pk for body in bodies.values()]).update(last_used_at=now)
+        missing = [digest for digest in by_digest if digest not in bodies]
+        if missing:
+            # ignore_conflicts: een gelijktijdige dispatcher kan dezelfde inhoud net hebben opgeslagen
+            cls.objects.bulk_create(
+                [
+                    cls(sha256=digest, data=zlib.compress(by_digest[digest].encode()),
+                        size=len(by_digest[digest]), last_used_at=now)
+                    for digest in missing
+                ],
+                ignore_conflicts=True,
+            )
+            bodies.update((body.sha256, body) for body in cls.objects.filter(sha256__in=missing).only('pk', 'sha256'))
+        return {text: bodies[digest] for digest, text in by_digest.items()}
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} tekens)"
 
 class SentEmail(models.Model):
     to = models.EmailField()
     subject = models.CharField(max_length=255)
-    html_message = models.TextField()
-    sent_at = models.DateTimeField(auto_now_add=True)
+    body = models.ForeignKey(EmailBody, on_delete=models.PROTECT, related_name="sent_emails")
+    sent_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    @property
+    def html_message(self):
+        return self.body.text
+
+    def __str__(self):
+        return f"Mail aan {self.to} op {self.sent_at.strftime('%Y-%m-%d %H:%M')}"
+
+class OutboxEmail(models.Model):
+    """
+    Een e-mail die nog verstuurd moet worden. Wordt binnen de transactie van
+    het request aangemaakt en door de management command dispatch_outbox
+    verstuurd (zie mailer/outbox.py).
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Wachtend'),
+        ('SENT', 'Verzonden'),
+        ('DEAD', 'Opgegeven'),
+    ]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_message = models.TextField(blank=True)
+    # Lijst van {"filename", "mimetype", "content" (base64)}
+    attachments = models.JSONField(default=list, blank=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # De dispatcher leest alleen wachtende mails die aan de beurt zijn
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='PENDING'),
+                name='outbox_due_idx',
+            ),
+        ]
 
     def __str__(self):
-        return f"Mail aan {self.to} op {self.sent_at.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"Mail aan {self.to} ({self.get_status_display().lower()})"
@@ -0,0 +1,193 @@
+"""
+Module: mailer/outbox.py
+Beschrijving: Transactionele outbox voor uitgaande e-mail.
+
+De send_*-functies in mailer/utils.py versturen niet zelf, maar schrijven een
+OutboxEmail binnen de lopende transactie. Een mail bestaat dus alleen als de
+wijziging waar hij over gaat ook is vastgelegd, en een request wacht nooit op
+(of faalt door) de mailserver.
+
+`dispatch` verstuurt de mails die aan de beurt zijn en legt ze vast als
+SentEmail. Alle mails van een batch gaan over één sessie met de mailserver
+(zie mailer/connection.py). Mislukt het versturen, dan volgt een nieuwe
+poging met exponentieel oplopende wachttijd; na MAX_ATTEMPTS pogingen wordt de
+mail opgegeven (status DEAD) en blijft hij met de laatste fout in de admin
+staan.
+Zie de management command dispatch_outbox.
+
+Binnen `suppressed()` zet enqueue niets in de outbox, bijvoorbeeld tijdens een
+benchmark die de gewone views aanroept maar geen echte gebruikers mag mailen.
+"""
+
+import base64
+import logging
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+
+from mailer.connection import CONNECTION_ERRORS, MailConnection
+from mailer.models import EmailBody, OutboxEmail, SentEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+# Wachttijd na de eerste mislukte poging; verdubbelt per poging tot RETRY_MAX_DELAY
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=6)
+
+BATCH_SIZE = 100
+
+# Aantal geneste suppressed()-blokken; geldt voor het hele proces, dus ook
+# voor andere threads
+_suppressed = 0
+
+
+def _encode_attachments(attachments):
+    encoded = []
+    for filename, content, mimetype in attachments or ():
+        if isinstance(content, str):
+            content = content.encode()
+        encoded.append({
+            'filename': filename,
+            'mimetype': mimetype,
+            'content': base64.b64encode(content).decode('ascii'),
+        })
+    return encoded
+
+
+def outbox_email(subject, to, body, html_message='', user=None, attachments=None):
+    """Een (nog niet opgeslagen) OutboxEmail."""
+    return OutboxEmail(
+        subject=subject,
+        to=to,
+        body=body,
+        html_message=html_message,
+        user=user,
+        attachments=_encode_attachments(attachments),
+    )
+
+
+@contextmanager
+def suppressed():
+    """Zet binnen dit blok (in alle threads) geen mail in de outbox."""
+    global _suppressed
+    _suppressed += 1
+    try:
+        yield
+    finally:
+        _suppressed -= 1
+
+
+def enqueue(subject, to, body, html_message='', user=None, attachments=None):
+    """Zet één mail in de outbox (niet opgeslagen binnen suppressed())."""
+    email = outbox_email(subject, to, body, html_message, user, attachments)
+    if not _suppressed:
+        email.save()
+    return email
+
+
+def enqueue_many(emails):
+    """Zet een reeks OutboxEmail-objecten met één insert in de outbox (niet binnen suppressed())."""
+    if _suppressed:
+        return list(emails)
+    return OutboxEmail.objects.bulk_create(emails)
+
+
+def build_message(email):
+    """Het EmailMultiAlternatives-bericht voor een OutboxEmail."""
+    msg = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email.to],
+    )
+    if email.html_message:
+        msg.attach_alternative(email.html_message, "text/html")
+    for attachment in email.attachments:
+        msg.attach(attachment['filename'], base64.b64decode(attachment['content']), attachment['mimetype'])
+    return msg
+
+
+def archive(emails):
+    """Leg verzonden mails vast als SentEmail, met gedeelde gecomprimeerde inhoud."""
+    bodies = EmailBody.for_texts(email.html_message or email.body for email in emails)
+    SentEmail.objects.bulk_create(
+        SentEmail(
+            subject=email.subject,
+            to=email.to,
+            body=bodies[email.html_message or email.body],
+            user_id=email.user_id,
+        )
+        for email in emails
+    )
+
+
+def retry_delay(attempts):
+    """Wachttijd voor de volgende poging na `attempts` mislukte pogingen."""
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def dispatch(batch_size=BATCH_SIZE, connection=None):
+    """
+    Verstuur de wachtende mails die aan de beurt zijn, hooguit `batch_size`,
+    over één sessie met de mailserver (`connection`, een MailConnection die de
+    aanroeper open mag houden; anders een nieuwe voor deze batch).
+    Geeft (verzonden, opnieuw ingepland, opgegeven) terug.
+    """
+    now = timezone.now()
+    sent = retried = dead = 0
+    with transaction.atomic():
+        # skip_locked: gelijktijdige dispatchers pakken elk een eigen batch
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True).filter(
+                status='PENDING', next_attempt_at__lte=now
+            ).order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        if not emails:
+            return sent, retried, dead
+
+        own_connection = connection is None
+        if own_connection:
+            connection = MailConnection()
+        processed = []
+        archived = []
+        try:
+            for email in emails:
+                processed.append(email)
+                email.attempts += 1
+                try:
+                    connection.send(build_message(email))
+                except Exception as exc:  # noqa: BLE001 - elke fout is een mislukte poging
+                    email.last_error = f"{type(exc).__name__}: {exc}"
+                    if email.attempts >= MAX_ATTEMPTS:
+                        email.status = 'DEAD'
+                        dead += 1
+                        logger.error("Mail %s aan %s opgegeven: %s", email.pk, email.to, email.last_error)
+                    else:
+                        email.next_attempt_at = now + retry_delay(email.attempts)
+                        retried += 1
+                        logger.warning("Mail %s aan %s mislukt: %s", email.pk, email.to, email.last_error)
+                    if isinstance(exc, CONNECTION_ERRORS):
+                        # Ook na opnieuw verbinden geen sessie: de rest van de batch
+                        # blijft onaangeroerd staan voor de volgende ronde
+                        connection.close()
+                        break
+                    continue
+                email.status = 'SENT'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                archived.append(email)
+                sent += 1
+        finally:
+            if own_connection:
+                connection.close()
+
+        OutboxEmail.objects.bulk_update(
+            processed, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+        )
+        archive(archived)
+    return sent, retried, dead
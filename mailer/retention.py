@@ -0,0 +1,54 @@
+"""
+Module: mailer/retention.py
+Beschrijving: Opschonen van het e-mailarchief.
+
+Verwijdert SentEmail-rijen ouder dan de bewaartermijn, verzonden mails uit de
+outbox (die al in het archief staan) na OUTBOX_RETENTION, opgegeven mails na
+de bewaartermijn, en daarna de EmailBody-rijen waar geen mail meer naar
+verwijst. Alles gaat in batches van `batch_size` rijen, elk met een eigen
+korte DELETE, zodat de tabellen niet lang vergrendeld zijn. Zie de management
+command prune_sent_emails.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef, Q
+
+from mailer.models import EmailBody, OutboxEmail, SentEmail
+
+RETENTION_DAYS = 365
+OUTBOX_RETENTION = timedelta(days=7)
+BATCH_SIZE = 1000
+
+
+def _delete_in_batches(queryset, batch_size):
+    deleted = 0
+    while True:
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        queryset.model.objects.filter(pk__in=pks).delete()
+        deleted += len(pks)
+
+
+def prune(before, now, batch_size=BATCH_SIZE):
+    """
+    Schoon het archief op: mails verstuurd vóór `before`, en verzonden
+    outbox-mails ouder dan OUTBOX_RETENTION (gerekend vanaf `now`).
+    Geeft (archief, outbox, inhoud) verwijderde aantallen terug.
+    """
+    sent = _delete_in_batches(SentEmail.objects.filter(sent_at__lt=before), batch_size)
+    outbox = _delete_in_batches(
+        OutboxEmail.objects.filter(
+            Q(status='SENT', sent_at__lt=now - OUTBOX_RETENTION) | Q(status='DEAD', created_at__lt=before)
+        ),
+        batch_size,
+    )
+    # Alleen inhoud die ook zelf lang niet is hergebruikt
+    bodies = _delete_in_batches(
+        EmailBody.objects.filter(last_used_at__lt=before).filter(
+            ~Exists(SentEmail.objects.filter(body=OuterRef('pk')))
+        ),
+        batch_size,
+    )
+    return sent, outbox, bodies
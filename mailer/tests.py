@@ -1,3 +1,178 @@
-from django.test import TestCase
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
 
-# Create your tests here.
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from mailer.models import EmailBody, OutboxEmail, SentEmail
+from mailer.outbox import MAX_ATTEMPTS, RETRY_BASE_DELAY, dispatch
+from mailer.retention import OUTBOX_RETENTION, prune
+from mailer import utils
+from mailer.utils import send_html_email, send_html_fanout, send_plain_email
+
+
+class SessionBackend(locmem.EmailBackend):
+    """Locmem-backend die sessies telt en de verbinding een aantal keer kan laten wegvallen."""
+    opens = 0
+    disconnects = 0
+
+    def open(self):
+        SessionBackend.opens += 1
+        return True
+
+    def send_messages(self, messages):
+        if SessionBackend.disconnects:
+            SessionBackend.disconnects -= 1
+            raise SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+class FailingBackend(BaseEmailBackend):
+    """Backend die elke verzending laat mislukken, als een onbereikbare mailserver."""
+
+    def send_messages(self, email_messages):
+        raise SMTPServerDisconnected("Connection unexpectedly closed")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_outbox_follows_the_transaction(mailoutbox):
+    with transaction.atomic():
+        send_plain_email("Welkom", "alice@example.com", "Hallo Alice")
+    with pytest.raises(RuntimeError), transaction.atomic():
+        send_plain_email("Teruggedraaid", "bob@example.com", "Hallo Bob")
+        raise RuntimeError
+
+    # Niets verstuurd tijdens het request, en de teruggedraaide mail bestaat niet
+    assert mailoutbox == []
+    assert list(OutboxEmail.objects.values_list("to", flat=True)) == ["alice@example.com"]
+
+    assert dispatch() == (1, 0, 0)
+    assert [message.to for message in mailoutbox] == [["alice@example.com"]]
+    assert OutboxEmail.objects.get().status == "SENT"
+    assert SentEmail.objects.get().html_message == "Hallo Alice"
+    # Al verstuurd: een tweede ronde doet niets
+    assert dispatch() == (0, 0, 0)
+
+
+@pytest.mark.django_db
+def test_outbox_keeps_html_and_attachments(mailoutbox):
+    send_html_email(
+        "Export", "alice@example.com", "emails/export_email_body.html",
+        context={"user": get_user_model()(first_name="Alice", last_name="Jansen"), "body": "Zie bijlage"},
+        attachments=[("motie.pdf", b"%PDF-1.4\xff", "application/pdf")],
+    )
+    dispatch()
+    [message] = mailoutbox
+    assert message.alternatives[0].mimetype == "text/html"
+    assert message.attachments == [("motie.pdf", b"%PDF-1.4\xff", "application/pdf")]
+
+
+@pytest.mark.django_db
+def test_outbox_retries_with_backoff_and_gives_up(settings, mailoutbox):
+    settings.EMAIL_BACKEND = "mailer.tests.FailingBackend"
+    send_plain_email("Welkom", "alice@example.com", "Hallo Alice")
+    email = OutboxEmail.objects.get()
+
+    assert dispatch() == (0, 1, 0)
+    email.refresh_from_db()
+    assert email.attempts == 1
+    assert "SMTPServerDisconnected" in email.last_error
+    assert email.next_attempt_at - timezone.now() > RETRY_BASE_DELAY - timedelta(seconds=5)
+    # Nog niet aan de beurt
+    assert dispatch() == (0, 0, 0)
+
+    OutboxEmail.objects.update(attempts=MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+    assert dispatch() == (0, 0, 1)
+    assert OutboxEmail.objects.get().status == "DEAD"
+    assert not SentEmail.objects.exists()
+
+
+@pytest.fixture
+def sessions(settings):
+    settings.EMAIL_BACKEND = "mailer.tests.SessionBackend"
+    SessionBackend.opens = SessionBackend.disconnects = 0
+    return SessionBackend
+
+
+@pytest.mark.django_db
+def test_outbox_batch_uses_one_session(sessions, mailoutbox):
+    for name in ("alice", "bob", "carol"):
+        send_plain_email("Welkom", f"{name}@example.com", "Hallo")
+    assert dispatch() == (3, 0, 0)
+    assert sessions.opens == 1
+    assert len(mailoutbox) == 3
+
+
+@pytest.mark.django_db
+def test_outbox_reconnects_after_a_dropped_session(sessions, mailoutbox):
+    for name in ("alice", "bob", "carol"):
+        send_plain_email("Welkom", f"{name}@example.com", "Hallo")
+
+    # Eén keer weggevallen: opnieuw verbinden en gewoon doorgaan
+    sessions.disconnects = 1
+    assert dispatch() == (3, 0, 0)
+    assert sessions.opens == 2
+
+    # Blijvend onbereikbaar: één mislukte poging, de rest blijft onaangeroerd staan
+    for name in ("dave", "erin"):
+        send_plain_email("Welkom", f"{name}@example.com", "Hallo")
+    sessions.disconnects = 2
+    assert dispatch() == (0, 1, 0)
+    assert sorted(OutboxEmail.objects.filter(status="PENDING").values_list("attempts", flat=True)) == [0, 1]
+
+
+@pytest.mark.django_db
+def test_fanout_renders_once_and_fills_in_per_recipient(monkeypatch, mailoutbox):
+    renders = []
+
+    def counting_render(template_name, context=None):
+        renders.append(template_name)
+        return render_to_string(template_name, context)
+
+    monkeypatch.setattr(utils, "render_to_string", counting_render)
+    recipients = [
+        (f"reviewer{i}@example.com", None, {"reviewer_name": f"Jansen & Zn. {i}"}) for i in range(200)
+    ]
+    send_html_fanout(
+        "3 nieuwe goedkeuringsverzoeken", "emails/new_approval_requests.html", {"requests": []}, recipients,
+    )
+    assert renders == ["emails/new_approval_requests.html"]
+
+    assert dispatch() == (100, 0, 0)
+    assert dispatch() == (100, 0, 0)
+    assert len(mailoutbox) == 200
+    html = mailoutbox[7].alternatives[0].content
+    assert "Beste Jansen &amp; Zn. 7," in html
+    assert "[[" not in html
+
+
+@pytest.mark.django_db
+def test_archive_shares_compressed_bodies_and_prunes_in_batches(mailoutbox):
+    body = "Er is een nieuwe versie beschikbaar.\n" * 50
+    for i in range(5):
+        send_plain_email("Nieuwe versie", f"user{i}@example.com", body)
+    send_plain_email("Welkom", "alice@example.com", "Hallo Alice")
+    assert dispatch() == (6, 0, 0)
+
+    # Vijf identieke berichten delen één gecomprimeerde inhoud
+    assert EmailBody.objects.count() == 2
+    shared = EmailBody.objects.get(size__gt=1000)
+    assert len(shared.data) < shared.size / 10
+    assert shared.sent_emails.count() == 5
+    assert SentEmail.objects.filter(to="user0@example.com").get().html_message == body
+
+    now = timezone.now()
+    old = now - timedelta(days=400)
+    SentEmail.objects.exclude(to="alice@example.com").update(sent_at=old)
+    EmailBody.objects.update(last_used_at=old)
+    OutboxEmail.objects.update(sent_at=now - OUTBOX_RETENTION - timedelta(days=1))
+
+    assert prune(now - timedelta(days=365), now, batch_size=2) == (5, 6, 1)
+    assert list(SentEmail.objects.values_list("to", flat=True)) == ["alice@example.com"]
+    # De inhoud van de overgebleven mail blijft staan
+    assert SentEmail.objects.get().html_message == "Hallo Alice"
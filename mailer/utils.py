@@ -1,56 +1,73 @@
-from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+import uuid
+
 from django.template.loader import render_to_string
-from mailer.models import SentEmail
-from pathlib import Path
+from django.utils.html import conditional_escape
+from mailer.outbox import enqueue, enqueue_many, outbox_email
 
-def send_html_email(subject, to, template_name, context=None, user=None, attachments=None, text_template_name=None):
-    context = context or {}
+def _render_bodies(template_name, context, text_template_name=None):
     html_body = render_to_string(template_name, context)
-    
     if text_template_name:
         plain_body = render_to_string(text_template_name, context)
     else:
         plain_body = "Deze e-mail ondersteunt geen HTML."
+    return html_body, plain_body
 
-    msg = EmailMultiAlternatives(
-        subject=subject,
-        body=plain_body,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[to],
-    )
-    msg.attach_alternative(html_body, "text/html")
-
-    if attachments:
-        for attachment in attachments:
-            filename, content, mimetype = attachment
-            msg.attach(filename, content, mimetype)
-
-    msg.send()
-
-    SentEmail.objects.create(
+def send_html_email(subject, to, template_name, context=None, user=None, attachments=None, text_template_name=None):
+    """
+    Zet een HTML-mail in de outbox (zie mailer/outbox.py); de mail wordt
+    verstuurd zodra de transactie is vastgelegd en de dispatcher langskomt.
+    """
+    html_body, plain_body = _render_bodies(template_name, context or {}, text_template_name)
+    enqueue(
         subject=subject,
         to=to,
+        body=plain_body,
         html_message=html_body,
         user=user,
+        attachments=attachments,
     )
 
-def send_plain_email(subject, to, plain_body, user=None):
-    msg = EmailMultiAlternatives(
-        subject=subject,
-        body=plain_body,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[to],
-    )
+def send_html_emails(subject, template_name, recipients, text_template_name=None):
+    """
+    Eén HTML-mail per ontvanger, met één insert in de outbox gezet.
+    `recipients` is een lijst van (to, context, user).
+    """
+    emails = []
+    for to, context, user in recipients:
+        html_body, plain_body = _render_bodies(template_name, context, text_template_name)
+        emails.append(outbox_email(subject, to, plain_body, html_message=html_body, user=user))
+    if emails:
+        enqueue_many(emails)
 
-    msg.send()
+def send_html_fanout(subject, template_name, context, recipients, text_template_name=None):
+    """
+    Dezelfde HTML-mail aan veel ontvangers, met één insert in de outbox gezet.
+    Het sjabloon wordt één keer gerenderd; per ontvanger worden alleen
+    eenvoudige waarden ingevuld. `recipients` is een lijst van
+    (to, user, values), waarbij elke sleutel van `values` in het sjabloon als
+    `{{ sleutel }}` staat, zonder filters.
+    """
+    keys = sorted({key for _to, _user, values in recipients for key in values})
+    # Een unieke markering per aanroep, zodat de inhoud er nooit per ongeluk op lijkt
+    marker = uuid.uuid4().hex
+    placeholders = {key: f"[[{marker}:{key}]]" for key in keys}
+    html_body, plain_body = _render_bodies(template_name, {**context, **placeholders}, text_template_name)
 
-    SentEmail.objects.create(
-        subject=subject,
-        to=to,
-        html_message=plain_body,
-        user=user,
-    )
+    emails = []
+    for to, user, values in recipients:
+        html, plain = html_body, plain_body
+        for key, placeholder in placeholders.items():
+            # Zoals de template engine het zou doen (autoescape)
+            value = conditional_escape(values.get(key, ''))
+            html = html.replace(placeholder, value)
+            plain = plain.replace(placeholder, value)
+        emails.append(outbox_email(subject, to, plain, html_message=html, user=user))
+    if emails:
+        enqueue_many(emails)
+
+def send_plain_email(subject, to, plain_body, user=None):
+    """Zet een platte-tekstmail in de outbox."""
+    enqueue(subject=subject, to=to, body=plain_body, user=user)
 
 def send_instrument_export_email(user, submission, export_type, attachment_filename, attachment_content, attachment_mimetype, body=None):
     context = {